@@ -0,0 +1,214 @@
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import stat
+import urllib.request
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+
+# CLEAN CODE:
+# - SRP: Este módulo construye y sirve los archivos estáticos (CSS, JS y fuentes) desde el propio servidor.
+# - Sin CDNs: Bootstrap, Font Awesome y las fuentes de Google se descargan al construir (`python -m app.activos`),
+#   así la primera pintura no depende de tres dominios externos.
+# - Huella digital: Cada archivo se publica como `nombre.<hash>.ext`; al cambiar su contenido cambia la URL, por
+#   eso se puede cachear como `immutable` durante un año.
+# - Precompresión: Se guardan `.gz` y `.br` junto a cada archivo al construir; al servir no se comprime nada.
+# - Degradación: Sin construir (o si falta algún archivo) las plantillas vuelven a las URLs del CDN.
+
+DIRECTORIO_ESTATICOS = os.path.join(os.path.dirname(__file__), "..", "static")
+DIRECTORIO_DIST = os.path.join(DIRECTORIO_ESTATICOS, "dist")
+MANIFIESTO = os.path.join(DIRECTORIO_DIST, "manifest.json")
+PREFIJO_URL = "/static/"
+
+# Nombre lógico -> (URL de origen, integridad SRI esperada). La integridad se verifica al descargar.
+VENDOR: Dict[str, Tuple[str, Optional[str]]] = {
+    "bootstrap.css": (
+        "https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css",
+        "sha384-T3c6CoIi6uLrA9TneNEoa7RxnatzjcDSCmG1MXxSR1GAsXEV/Dwwykc2MPK8M2HN",
+    ),
+    "bootstrap.js": (
+        "https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js",
+        "sha384-C6RzsynM9kWDrMNeT87bh95OGNyZPhcTNXj1NW7RuBCsyN/o0jlpcV8Qyq46cDfL",
+    ),
+    "fontawesome.css": ("https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css", None),
+    "fuentes.css": ("https://fonts.googleapis.com/css2?family=Lora:wght@400;700&family=Montserrat:wght@400;500&display=swap", None),
+}
+# Nombre lógico -> ruta dentro de `static/` de los archivos propios.
+PROPIOS: Dict[str, str] = {
+    "biblioteca.css": "css/biblioteca.css",
+}
+
+# woff2/woff/png ya vienen comprimidos: comprimirlos otra vez solo gasta CPU y disco.
+EXTENSIONES_COMPRIMIBLES = (".css", ".js", ".svg", ".ttf", ".eot", ".json", ".txt")
+MIN_BYTES_COMPRESION = 512
+# Google Fonts decide el formato según el navegador; con este User-Agent entrega woff2.
+AGENTE = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+_URL_CSS = re.compile(rb"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+mimetypes.add_type("font/woff2", ".woff2")
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# --- Construcción ---
+
+def _descargar(url: str) -> bytes:
+    peticion = urllib.request.Request(url, headers={"User-Agent": AGENTE})
+    with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+        return respuesta.read()
+
+
+def _verificar_integridad(contenido: bytes, integridad: str, url: str) -> None:
+    algoritmo, esperado = integridad.split("-", 1)
+    obtenido = base64.b64encode(hashlib.new(algoritmo, contenido).digest()).decode()
+    if obtenido != esperado:
+        raise ValueError(f"{url}: la integridad no coincide (esperada {integridad}, obtenida {algoritmo}-{obtenido}).")
+
+
+def _comprimir(ruta: str, contenido: bytes) -> None:
+    if not ruta.endswith(EXTENSIONES_COMPRIMIBLES) or len(contenido) < MIN_BYTES_COMPRESION:
+        return
+    # mtime=0: el .gz sale idéntico en cada construcción.
+    variantes = {".gz": gzip.compress(contenido, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes[".br"] = brotli.compress(contenido, quality=11)
+    for extension, comprimido in variantes.items():
+        if len(comprimido) < len(contenido):
+            with open(ruta + extension, "wb") as archivo:
+                archivo.write(comprimido)
+
+
+def _publicar(nombre: str, contenido: bytes, destino: str) -> str:
+    """Escribe `nombre.<hash>.ext` (y sus variantes comprimidas) y devuelve su ruta relativa a `static/`."""
+    base, extension = os.path.splitext(nombre)
+    final = f"{base}.{hashlib.sha256(contenido).hexdigest()[:12]}{extension}"
+    ruta = os.path.join(destino, final)
+    with open(ruta, "wb") as archivo:
+        archivo.write(contenido)
+    _comprimir(ruta, contenido)
+    return f"{os.path.basename(destino)}/{final}"
+
+
+def _reescribir_urls(css: bytes, url_css: str, destino: str, publicados: Dict[str, str]) -> bytes:
+    # Las fuentes e imágenes que cita el CSS se descargan también; como todo queda en `dist/`, basta el nombre final.
+    def reemplazar(coincidencia: "re.Match[bytes]") -> bytes:
+        referencia = coincidencia.group(2).decode().strip()
+        if referencia.startswith(("data:", "#")):
+            return coincidencia.group(0)
+        absoluta, _, fragmento = urljoin(url_css, referencia).partition("#")
+        if absoluta not in publicados:
+            nombre = os.path.basename(urlsplit(absoluta).path)
+            publicados[absoluta] = _publicar(nombre, _descargar(absoluta), destino)
+        final = os.path.basename(publicados[absoluta]) + (f"#{fragmento}" if fragmento else "")
+        return f'url("{final}")'.encode()
+
+    return _URL_CSS.sub(reemplazar, css)
+
+
+def construir(destino: str = DIRECTORIO_DIST) -> Dict[str, str]:
+    """Descarga, firma y precomprime todos los activos; escribe el manifiesto y lo devuelve."""
+    # `dist/` es solo salida de este proceso: se rehace entera para no acumular versiones viejas.
+    shutil.rmtree(destino, ignore_errors=True)
+    os.makedirs(destino)
+    if brotli is None:
+        print("brotli no está instalado; solo se generan variantes gzip.")
+    manifiesto: Dict[str, str] = {}
+    publicados: Dict[str, str] = {}
+
+    for nombre, (url, integridad) in VENDOR.items():
+        contenido = _descargar(url)
+        if integridad:
+            _verificar_integridad(contenido, integridad, url)
+        if nombre.endswith(".css"):
+            contenido = _reescribir_urls(contenido, url, destino, publicados)
+        manifiesto[nombre] = _publicar(nombre, contenido, destino)
+
+    for nombre, ruta in PROPIOS.items():
+        with open(os.path.join(DIRECTORIO_ESTATICOS, ruta), "rb") as archivo:
+            manifiesto[nombre] = _publicar(nombre, archivo.read(), destino)
+
+    with open(os.path.join(destino, "manifest.json"), "w", encoding="utf-8") as archivo:
+        json.dump(manifiesto, archivo, indent=2, sort_keys=True)
+    return manifiesto
+
+
+# --- Servicio ---
+
+class Activos:
+    # CLEAN CODE: Lo usan las plantillas (`activos.url('bootstrap.css')`) para no escribir rutas con hash a mano.
+
+    def __init__(self, manifiesto: Dict[str, str]):
+        self._manifiesto = manifiesto
+
+    @classmethod
+    def cargar(cls, ruta: str = MANIFIESTO) -> "Activos":
+        if not os.path.exists(ruta):
+            print("Activos estáticos sin construir (python -m app.activos); se usan los CDNs.")
+            return cls({})
+        with open(ruta, encoding="utf-8") as archivo:
+            return cls(json.load(archivo))
+
+    def es_local(self, nombre: str) -> bool:
+        return nombre in self._manifiesto
+
+    def url(self, nombre: str) -> str:
+        ruta = self._manifiesto.get(nombre)
+        if ruta:
+            return PREFIJO_URL + ruta
+        if nombre in VENDOR:
+            return VENDOR[nombre][0]
+        return PREFIJO_URL + PROPIOS[nombre]
+
+
+def codificaciones_aceptadas(accept_encoding: str) -> Set[str]:
+    aceptadas = set()
+    for parte in accept_encoding.lower().split(","):
+        codificacion, _, parametros = parte.partition(";")
+        if parametros.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        aceptadas.add(codificacion.strip())
+    return aceptadas
+
+
+class ArchivosEstaticos(StaticFiles):
+    """`StaticFiles` que entrega la variante `.br`/`.gz` precomprimida y marca como inmutables los archivos con hash."""
+
+    async def get_response(self, path: str, scope):
+        respuesta = None
+        encabezados = dict(scope["headers"])
+        aceptadas = codificaciones_aceptadas(encabezados.get(b"accept-encoding", b"").decode("latin-1"))
+        for codificacion, extension in (("br", ".br"), ("gzip", ".gz")):
+            if codificacion not in aceptadas:
+                continue
+            ruta, datos = await run_in_threadpool(self.lookup_path, path + extension)
+            if datos is not None and stat.S_ISREG(datos.st_mode):
+                tipo = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                respuesta = FileResponse(ruta, stat_result=datos, media_type=tipo, headers={"Content-Encoding": codificacion})
+                break
+        if respuesta is None:
+            respuesta = await super().get_response(path, scope)
+
+        respuesta.headers["Vary"] = "Accept-Encoding"
+        if path.startswith("dist/") and not path.endswith("manifest.json") and respuesta.status_code in (200, 304):
+            respuesta.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            respuesta.headers["Cache-Control"] = "no-cache"
+        return respuesta
+
+
+if __name__ == "__main__":
+    resultado = construir()
+    print(f"📦 {len(resultado)} activos construidos en {os.path.abspath(DIRECTORIO_DIST)}:")
+    for nombre, ruta in sorted(resultado.items()):
+        print(f"  {nombre} -> {PREFIJO_URL}{ruta}")
@@ -1,9 +1,17 @@
 from typing import Optional, Dict, Any
-from sqlalchemy import text
+from sqlalchemy import text, RowMapping
 from sqlmodel.ext.asyncio.session import AsyncSession
 from app.libro import Libro
 from app.usuario import Usuario
 from app.design_patterns import DesignPatterns
+from app.fragmento import Fragmentos
+from app.busqueda import IndiceLibros
+from app.recomendaciones import Recomendaciones
+from app.autocompletar import Autocompletar
+from app.catalogo import Catalogo
+from app.coalescencia import vuelo_libros
+from app.resiliencia import invalidar_libro
+from app.auditoria import datos_visibles, diferencias, registro_auditoria
 
 # CLEAN CODE:
 # - Nombres de clases y métodos: Se utilizan nombres descriptivos y claros (e.g., `Administrador`, `crear_usuario`).
@@ -11,8 +19,33 @@ from app.design_patterns import DesignPatterns
 # - Tipado estático: Se utiliza `typing` para mejorar la legibilidad y prevenir errores.
 # - DRY (Don't Repeat Yourself): Se evita la duplicación de código, como la verificación de roles.
 # - Consistencia: El estilo de codificación es consistente en toda la clase.
+# - Auditoría: Cada cambio confirmado se anota en `registro_auditoria` (en memoria; se escribe en lotes).
+
+
+# Columnas que un administrador puede cambiar; son las únicas que `_update_con_antes` interpola en el SQL.
+COLUMNAS_ACTUALIZABLES = {
+    "usuario": frozenset({"username", "email_usuario", "rol", "activo"}),
+    "libro": frozenset({"titulo", "autor", "categoria", "anio_publicacion", "sinopsis"}),
+}
+
+
+def _update_con_antes(tabla: str, clave: str, campos: Dict[str, Any]):
+    # CLEAN CODE: El UPDATE devuelve los valores anteriores (la subconsulta bloquea la fila) para la auditoría,
+    # sin una consulta aparte.
+    # CLEAN CODE: Fail-Fast: Las claves de `campos` vienen del cuerpo de la petición; solo se aceptan columnas conocidas.
+    desconocidas = campos.keys() - COLUMNAS_ACTUALIZABLES[tabla]
+    if desconocidas:
+        raise ValueError(f"Campos no actualizables en {tabla}: {', '.join(sorted(map(str, desconocidas)))}")
+    return text(
+        f"UPDATE {tabla} t SET {', '.join(f'{k} = :{k}' for k in campos)} "
+        f"FROM (SELECT {clave}, {', '.join(campos)} FROM {tabla} WHERE {clave} = :id FOR UPDATE) antes "
+        f"WHERE t.{clave} = antes.{clave} RETURNING {', '.join(f'antes.{k}' for k in campos)}"
+    )
+
 
 class Administrador:
+    __slots__ = ("id_admin", "username", "email", "password", "rol")
+
     def __init__(self, id_admin: int, username: str, email: str, password: str, rol: int):
         # CLEAN CODE: El constructor es simple y solo asigna valores.
         self.id_admin = id_admin
@@ -43,29 +76,34 @@ class Administrador:
         await session.commit()
         
         datos["id_usuario"] = new_id
+        registro_auditoria.registrar(self, "crear_usuario", "usuario", new_id, datos_visibles(datos))
         return Usuario(**datos)
 
-    async def consultar_usuario(self, session: AsyncSession, id_usuario: int) -> Optional[Usuario]:
-        # CLEAN CODE: El nombre del método es claro y conciso.
+    async def consultar_usuario_datos(self, session: AsyncSession, id_usuario: int) -> Optional[RowMapping]:
+        # CLEAN CODE: Devuelve la fila tal cual para que la API la serialice sin objetos intermedios.
         if self.rol != 0:
             print("Acceso denegado. Se requiere rol de administrador.")
             return None
-        
+
         query = text("SELECT id_usuario, rol, username, email_usuario, password, activo, mes_suscripcion FROM usuario WHERE id_usuario = :id")
         result = await session.execute(query, {"id": id_usuario})
-        row = result.first()
+        return result.mappings().first()
+
+    async def consultar_usuario(self, session: AsyncSession, id_usuario: int) -> Optional[Usuario]:
+        # CLEAN CODE: El nombre del método es claro y conciso.
+        row = await self.consultar_usuario_datos(session, id_usuario)
         
         if not row:
             return None
             
         return Usuario(
-            id_usuario=row.id_usuario,
-            rol=row.rol,
-            username=row.username,
-            email_usuario=row.email_usuario,
-            password=row.password,
-            activo=bool(row.activo),
-            mes_suscripcion=row.mes_suscripcion
+            id_usuario=row["id_usuario"],
+            rol=row["rol"],
+            username=row["username"],
+            email_usuario=row["email_usuario"],
+            password=row["password"],
+            activo=bool(row["activo"]),
+            mes_suscripcion=row["mes_suscripcion"]
         )
 
     async def actualizar_usuario(self, session: AsyncSession, id_usuario: int, campos: Dict[str, Any]) -> None:
@@ -74,14 +112,15 @@ class Administrador:
             print("Acceso denegado. Se requiere rol de administrador.")
             return
             
-        sets = [f"{k} = :{k}" for k, v in campos.items()]
-        if not sets:
+        if not campos:
             return
             
-        query = text(f"UPDATE usuario SET {', '.join(sets)} WHERE id_usuario = :id")
+        query = _update_con_antes("usuario", "id_usuario", campos)
         params = {"id": id_usuario, **campos}
-        await session.execute(query, params)
+        antes = (await session.execute(query, params)).mappings().first()
         await session.commit()
+        if antes:
+            registro_auditoria.registrar(self, "actualizar_usuario", "usuario", id_usuario, diferencias(antes, campos))
 
     async def eliminar_usuario(self, session: AsyncSession, id_usuario: int) -> bool:
         # CLEAN CODE: La lógica de negocio (crear memento) está separada de la lógica de base de datos.
@@ -101,6 +140,7 @@ class Administrador:
             await session.execute(query, {"id": id_usuario})
             await session.commit()
             print(f"Usuario {id_usuario} eliminado correctamente.")
+            registro_auditoria.registrar(self, "eliminar_usuario", "usuario", id_usuario)
             return True
         except Exception as e:
             await session.rollback()
@@ -113,7 +153,10 @@ class Administrador:
             print("Acceso denegado. Se requiere rol de administrador.")
             return False
         
-        return await DesignPatterns.restaurar_usuario_desde_memento(session, id_usuario)
+        restaurado = await DesignPatterns.restaurar_usuario_desde_memento(session, id_usuario)
+        if restaurado:
+            registro_auditoria.registrar(self, "restaurar_usuario", "usuario", id_usuario)
+        return restaurado
 
     async def gestionar_estado_usuario(self, session: AsyncSession, id_usuario: int, activo: bool) -> None:
         # CLEAN CODE: El nombre del método es específico y claro.
@@ -121,9 +164,11 @@ class Administrador:
             print("Acceso denegado. Se requiere rol de administrador.")
             return
             
-        query = text("UPDATE usuario SET activo = :activo WHERE id_usuario = :id")
-        await session.execute(query, {"id": id_usuario, "activo": activo})
+        campos = {"activo": activo}
+        antes = (await session.execute(_update_con_antes("usuario", "id_usuario", campos), {"id": id_usuario, **campos})).mappings().first()
         await session.commit()
+        if antes:
+            registro_auditoria.registrar(self, "gestionar_estado_usuario", "usuario", id_usuario, diferencias(antes, campos))
 
     # --- Métodos CRUD para Libro ---
 
@@ -137,28 +182,44 @@ class Administrador:
             "VALUES (:id_libro, :titulo, :autor, :categoria, :anio_publicacion, :sinopsis)"
         )
         await session.execute(query, datos)
+        await Catalogo.ajustar(session, altas=[(datos["categoria"], datos["anio_publicacion"])])
+        # CLEAN CODE: El fragmento gratuito se precalcula en la misma transacción que el libro.
+        await Fragmentos.guardar(session, datos["id_libro"], datos["titulo"], datos["autor"], datos["sinopsis"])
         await session.commit()
+        await IndiceLibros.sincronizar(session, datos["id_libro"])
+        await Recomendaciones.sincronizar(session, datos["id_libro"])
+        await Autocompletar.sincronizar(session, datos["id_libro"])
+        invalidar_libro(datos["id_libro"])
+        registro_auditoria.registrar(self, "crear_libro", "libro", datos["id_libro"], datos_visibles(datos))
         return Libro(**datos)
 
-    async def consultar_libro(self, session: AsyncSession, id_libro: int) -> Optional[Libro]:
+    async def consultar_libro_datos(self, session: AsyncSession, id_libro: int) -> Optional[RowMapping]:
+        # CLEAN CODE: Igual que `consultar_usuario_datos`: la fila se entrega directamente a la capa de respuesta.
         if self.rol != 0:
             print("Acceso denegado. Se requiere rol de administrador.")
             return None
-            
-        query = text("SELECT id_libro, titulo, autor, categoria, anio_publicacion, sinopsis FROM libro WHERE id_libro = :id")
-        result = await session.execute(query, {"id": id_libro})
-        row = result.first()
+
+        async def consultar() -> Optional[RowMapping]:
+            query = text("SELECT id_libro, titulo, autor, categoria, anio_publicacion, sinopsis FROM libro WHERE id_libro = :id")
+            result = await session.execute(query, {"id": id_libro})
+            return result.mappings().first()
+
+        # CLEAN CODE: Lecturas simultáneas del mismo libro comparten una sola consulta.
+        return await vuelo_libros.hacer(id_libro, consultar, session)
+
+    async def consultar_libro(self, session: AsyncSession, id_libro: int) -> Optional[Libro]:
+        row = await self.consultar_libro_datos(session, id_libro)
         
         if not row:
             return None
             
         return Libro(
-            id_libro=row.id_libro,
-            titulo=row.titulo,
-            autor=row.autor,
-            categoria=row.categoria,
-            anio_publicacion=int(row.anio_publicacion),
-            sinopsis=row.sinopsis
+            id_libro=row["id_libro"],
+            titulo=row["titulo"],
+            autor=row["autor"],
+            categoria=row["categoria"],
+            anio_publicacion=int(row["anio_publicacion"]),
+            sinopsis=row["sinopsis"]
         )
 
     async def actualizar_libro(self, session: AsyncSession, id_libro: int, campos: Dict[str, Any]) -> None:
@@ -166,20 +227,43 @@ class Administrador:
             print("Acceso denegado. Se requiere rol de administrador.")
             return
             
-        sets = [f"{k} = :{k}" for k, v in campos.items()]
-        if not sets:
+        if not campos:
             return
             
-        query = text(f"UPDATE libro SET {', '.join(sets)} WHERE id_libro = :id")
+        query = _update_con_antes("libro", "id_libro", campos)
         params = {"id": id_libro, **campos}
-        await session.execute(query, params)
+        if campos.keys() & {"categoria", "anio_publicacion"}:
+            # CLEAN CODE: El conteo de facetas pasa de la combinación anterior a la nueva en la misma transacción.
+            facetas_antes = await Catalogo.facetas_de(session, [id_libro])
+            antes = (await session.execute(query, params)).mappings().first()
+            await Catalogo.ajustar(session, altas=await Catalogo.facetas_de(session, [id_libro]), bajas=facetas_antes)
+        else:
+            antes = (await session.execute(query, params)).mappings().first()
+        if campos.keys() & {"titulo", "autor", "sinopsis"}:
+            await Fragmentos.regenerar(session, id_libro)
         await session.commit()
+        await IndiceLibros.sincronizar(session, id_libro)
+        if campos.keys() & {"autor", "categoria", "sinopsis"}:
+            await Recomendaciones.sincronizar(session, id_libro)
+        if campos.keys() & {"titulo", "autor"}:
+            await Autocompletar.sincronizar(session, id_libro)
+        invalidar_libro(id_libro)
+        if antes:
+            registro_auditoria.registrar(self, "actualizar_libro", "libro", id_libro, diferencias(antes, campos))
 
     async def eliminar_libro(self, session: AsyncSession, id_libro: int) -> None:
         if self.rol != 0:
             print("Acceso denegado. Se requiere rol de administrador.")
             return
             
-        query = text("DELETE FROM libro WHERE id_libro = :id")
-        await session.execute(query, {"id": id_libro})
+        query = text("DELETE FROM libro WHERE id_libro = :id RETURNING categoria, anio_publicacion, titulo")
+        borrados = (await session.execute(query, {"id": id_libro})).all()
+        await Catalogo.ajustar(session, bajas=[(fila.categoria, fila.anio_publicacion) for fila in borrados])
+        await Fragmentos.eliminar(session, id_libro)
         await session.commit()
+        IndiceLibros.indice().quitar(id_libro)
+        Recomendaciones.eliminar(id_libro)
+        Autocompletar.eliminar(id_libro)
+        invalidar_libro(id_libro)
+        if borrados:
+            registro_auditoria.registrar(self, "eliminar_libro", "libro", id_libro, {"titulo": borrados[0].titulo})
@@ -0,0 +1,198 @@
+import abc
+import math
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+# CLEAN CODE:
+# - SRP: Este módulo decide si una petición se admite, antes de que toque el pool de la BD.
+# - Strategy: `BackendLimites` abstrae dónde viven las cubetas de tokens (memoria local o Redis compartido).
+# - Fail-Fast: Ante sobrecarga se rechaza de inmediato con 429/503 y `Retry-After`, sin colas ilimitadas.
+
+# --- Clases de ruta ---
+
+SEARCH, READ, WRITE, ADMIN = "search", "read", "write", "admin"
+
+RUTAS_BUSQUEDA = ("/api/user/buscar_libro", "/api/user/buscar_contenido", "/api/user/libros_similares")
+_SEGMENTO_ID = re.compile(r"/\d+(?=/|$)")
+
+
+def clasificar_ruta(metodo: str, ruta: str) -> Optional[str]:
+    # Solo se controlan los endpoints de la API; las vistas HTML y los estáticos pasan siempre.
+    if not ruta.startswith("/api/"):
+        return None
+    if ruta.startswith("/api/admin/"):
+        return ADMIN
+    if ruta.startswith(RUTAS_BUSQUEDA):
+        return SEARCH
+    if metodo in ("GET", "HEAD"):
+        return READ
+    return WRITE
+
+
+def identidad_peticion(id_usuario: Optional[int], cliente: Optional[str]) -> str:
+    """Dueño de la cubeta por usuario: el usuario de la cookie de sesión o, sin sesión, la dirección del cliente."""
+    if id_usuario is not None:
+        return f"id:{id_usuario}"
+    return f"ip:{cliente or 'anonimo'}"
+
+
+# (capacidad, tokens por segundo) de la cubeta por usuario, y máximo de peticiones simultáneas por worker.
+LIMITES_USUARIO: Dict[str, Tuple[float, float]] = {
+    SEARCH: (20, 10),
+    READ: (100, 50),
+    WRITE: (10, 5),
+    ADMIN: (40, 20),
+}
+LIMITES_RUTA: Dict[str, Tuple[float, float]] = {
+    SEARCH: (400, 200),
+    READ: (2000, 1000),
+    WRITE: (400, 200),
+    ADMIN: (200, 100),
+}
+CONCURRENCIA: Dict[str, int] = {
+    SEARCH: 16,
+    READ: 64,
+    WRITE: 32,
+    ADMIN: 8,
+}
+
+
+class PeticionRechazada(Exception):
+    def __init__(self, status_code: int, detalle: str, reintentar_en: float):
+        super().__init__(detalle)
+        self.status_code = status_code
+        self.detalle = detalle
+        self.reintentar_en = max(1, math.ceil(reintentar_en))
+
+
+# --- Backends de cubetas de tokens ---
+
+class BackendLimites(abc.ABC):
+    @abc.abstractmethod
+    async def consumir(self, clave: str, capacidad: float, tasa: float, costo: float = 1.0) -> float:
+        """Consume `costo` tokens de la cubeta `clave`. Devuelve 0 si se admite o los segundos a esperar."""
+
+
+class BackendMemoria(BackendLimites):
+    # CLEAN CODE: Implementación local por proceso; también sirve de doble en pruebas (reloj inyectable).
+    MAX_CLAVES = 50_000
+
+    def __init__(self, reloj: Callable[[], float] = time.monotonic):
+        self._reloj = reloj
+        self._cubetas: Dict[str, Tuple[float, float]] = {}
+
+    async def consumir(self, clave: str, capacidad: float, tasa: float, costo: float = 1.0) -> float:
+        ahora = self._reloj()
+        tokens, ultimo = self._cubetas.get(clave, (capacidad, ahora))
+        tokens = min(capacidad, tokens + (ahora - ultimo) * tasa)
+        if tokens >= costo:
+            self._cubetas[clave] = (tokens - costo, ahora)
+            espera = 0.0
+        else:
+            self._cubetas[clave] = (tokens, ahora)
+            espera = (costo - tokens) / tasa
+        if len(self._cubetas) > self.MAX_CLAVES:
+            self._purgar(ahora)
+        return espera
+
+    def _purgar(self, ahora: float) -> None:
+        # Se descartan las cubetas inactivas más antiguas; al volver, empiezan llenas (mismo efecto).
+        for clave, _ in sorted(self._cubetas.items(), key=lambda c: c[1][1])[: len(self._cubetas) // 2]:
+            del self._cubetas[clave]
+
+
+class BackendRedis(BackendLimites):
+    """
+    Cubetas compartidas entre workers y máquinas. `redis` es una dependencia opcional:
+    solo se importa si se configura `ADMISION_BACKEND=redis://...`.
+    """
+
+    _SCRIPT = """
+    local cap = tonumber(ARGV[1])
+    local tasa = tonumber(ARGV[2])
+    local costo = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local ahora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local datos = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(datos[1]) or cap
+    local ts = tonumber(datos[2]) or ahora
+    tokens = math.min(cap, tokens + (ahora - ts) * tasa)
+    local espera = 0
+    if tokens >= costo then tokens = tokens - costo else espera = (costo - tokens) / tasa end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', ahora)
+    redis.call('EXPIRE', KEYS[1], math.ceil(cap / tasa) + 1)
+    return tostring(espera)
+    """
+
+    def __init__(self, url: str, prefijo: str = "admision:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(self._SCRIPT)
+        self._prefijo = prefijo
+
+    async def consumir(self, clave: str, capacidad: float, tasa: float, costo: float = 1.0) -> float:
+        return float(await self._script(keys=[self._prefijo + clave], args=[capacidad, tasa, costo]))
+
+
+def backend_desde_entorno() -> BackendLimites:
+    url = os.getenv("ADMISION_BACKEND", "")
+    if url.startswith(("redis://", "rediss://")):
+        return BackendRedis(url)
+    return BackendMemoria()
+
+
+# --- Control de admisión ---
+
+class ControlAdmision:
+    def __init__(
+        self,
+        backend: BackendLimites,
+        limites_usuario: Dict[str, Tuple[float, float]] = LIMITES_USUARIO,
+        limites_ruta: Dict[str, Tuple[float, float]] = LIMITES_RUTA,
+        concurrencia: Dict[str, int] = CONCURRENCIA,
+    ):
+        self.backend = backend
+        self.limites_usuario = limites_usuario
+        self.limites_ruta = limites_ruta
+        self.concurrencia = concurrencia
+        # El límite de concurrencia es por worker a propósito: protege el pool de conexiones de este proceso.
+        self._en_curso: Dict[str, int] = {clase: 0 for clase in concurrencia}
+        self.rechazos: Dict[str, int] = {"429": 0, "503": 0}
+
+    async def _verificar_tasas(self, clase: str, ruta: str, usuario: str) -> None:
+        capacidad, tasa = self.limites_usuario[clase]
+        espera = await self.backend.consumir(f"usuario:{usuario}:{clase}", capacidad, tasa)
+        if espera > 0:
+            self.rechazos["429"] += 1
+            raise PeticionRechazada(429, "Demasiadas peticiones. Intenta de nuevo en unos segundos.", espera)
+
+        # Los ids de la URL se normalizan para que `/consultar_libro/1` y `/consultar_libro/2` compartan cubeta.
+        capacidad, tasa = self.limites_ruta[clase]
+        espera = await self.backend.consumir(f"ruta:{_SEGMENTO_ID.sub('/{id}', ruta)}", capacidad, tasa)
+        if espera > 0:
+            self.rechazos["503"] += 1
+            raise PeticionRechazada(503, "Servicio saturado. Intenta de nuevo en unos segundos.", espera)
+
+    @asynccontextmanager
+    async def admitir(self, clase: str, ruta: str, usuario: str) -> AsyncIterator[None]:
+        """Lanza `PeticionRechazada` si la petición excede una tasa o la concurrencia de su clase."""
+        await self._verificar_tasas(clase, ruta, usuario)
+        if self._en_curso[clase] >= self.concurrencia[clase]:
+            self.rechazos["503"] += 1
+            raise PeticionRechazada(503, "Servicio saturado. Intenta de nuevo en unos segundos.", 1)
+        self._en_curso[clase] += 1
+        try:
+            yield
+        finally:
+            self._en_curso[clase] -= 1
+
+    def estado(self) -> Dict:
+        return {"en_curso": dict(self._en_curso), "limites": dict(self.concurrencia), "rechazos": dict(self.rechazos)}
+
+
+def admision_habilitada() -> bool:
+    return os.getenv("ADMISION_HABILITADA", "1").lower() in ("1", "true", "yes")
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+
+# CLEAN CODE:
+# - SRP: Este módulo cuenta las lecturas de libros y arma las listas "más leídos" y "en tendencia".
+# - Lectura sin escrituras: `registrar` solo suma en un contador del worker, por (libro, hora); la lectura de
+#   un fragmento o de un libro completo no agrega ninguna sentencia a la BD.
+# - Agregación: Cada `intervalo_s` los deltas acumulados van a `lectura_libro` en un único upsert. Con varios
+#   workers cada uno suma sus deltas, así que la tabla tiene el total de todos.
+# - Top-N precalculado: Las listas se recalculan cada `refresco_s` y la API las sirve desde memoria.
+# - Consistencia eventual: Un conteo tarda hasta `intervalo_s` + `refresco_s` en verse; si el worker muere sin
+#   volcar se pierden a lo sumo esos segundos de lecturas.
+
+UPSERT_LECTURAS = text(
+    "INSERT INTO lectura_libro (libro_id, hora, lecturas) VALUES (:libro_id, to_timestamp(:hora), :lecturas) "
+    "ON CONFLICT (libro_id, hora) DO UPDATE SET lecturas = lectura_libro.lecturas + EXCLUDED.lecturas"
+)
+LIMPIAR_LECTURAS = text("DELETE FROM lectura_libro WHERE hora < now() - make_interval(days => :dias)")
+
+# Se agrega y ordena sobre `lectura_libro` (acotada por ix_lectura_libro_hora) y solo los `top` se unen con `libro`.
+_TOP = (
+    "WITH agregado AS ("
+    "SELECT libro_id, SUM(lecturas) AS lecturas, {puntaje} AS puntaje FROM lectura_libro "
+    "WHERE hora >= now() - make_interval(secs => :ventana_s) "
+    "GROUP BY libro_id ORDER BY puntaje DESC, libro_id LIMIT :top) "
+    "SELECT l.id_libro, l.titulo, l.autor, a.lecturas, a.puntaje "
+    "FROM agregado a JOIN libro l ON l.id_libro = a.libro_id ORDER BY a.puntaje DESC, l.id_libro"
+)
+CONSULTAS_TOP = {
+    # Cada hora pesa la mitad cada `vida_media_s`: lo leído hoy pesa más que lo leído anteayer.
+    "tendencia": text(_TOP.format(puntaje="SUM(lecturas * power(0.5, extract(epoch FROM now() - hora) / :vida_media_s))")),
+    "mas_leidos": text(_TOP.format(puntaje="SUM(lecturas)::float")),
+}
+LISTAS = tuple(CONSULTAS_TOP)
+
+Clave = Tuple[int, int]  # (id_libro, inicio de la hora en segundos desde epoch)
+
+
+class ContadorLecturas:
+    def __init__(
+        self,
+        intervalo_s: float = 30.0,
+        cubeta_s: int = 3600,
+        max_claves: int = 100_000,
+        refresco_s: float = 60.0,
+        top: int = 50,
+        vida_media_h: float = 6.0,
+        ventana_tendencia_h: float = 48.0,
+        ventana_mas_leidos_dias: int = 30,
+        retencion_dias: int = 90,
+        reloj: Callable[[], float] = time.time,
+    ):
+        self.intervalo_s = intervalo_s
+        self.cubeta_s = cubeta_s
+        self.max_claves = max_claves
+        self.refresco_s = refresco_s
+        self.top = top
+        self.retencion_dias = retencion_dias
+        self._parametros = {
+            "tendencia": {"ventana_s": ventana_tendencia_h * 3600, "vida_media_s": vida_media_h * 3600, "top": top},
+            "mas_leidos": {"ventana_s": ventana_mas_leidos_dias * 86400, "top": top},
+        }
+        self._reloj = reloj
+        self._pendientes: "Counter[Clave]" = Counter()
+        self._fabrica_sesiones: Optional[Callable[[], Any]] = None
+        self._fabrica_lectura: Optional[Callable[[], Any]] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._listas: Dict[str, List[Dict[str, Any]]] = {lista: [] for lista in LISTAS}
+        self.calculado_en: Optional[float] = None
+        # Métricas acumuladas desde el arranque del worker.
+        self.registradas = 0
+        self.volcadas = 0
+        self.volcados = 0
+        self.fallos = 0
+        self.descartadas = 0
+
+    @classmethod
+    def desde_entorno(cls) -> "ContadorLecturas":
+        return cls(
+            intervalo_s=float(os.getenv("LECTURAS_INTERVALO_S", "30")),
+            max_claves=int(os.getenv("LECTURAS_MAX_CLAVES", "100000")),
+            refresco_s=float(os.getenv("TENDENCIAS_REFRESCO_S", "60")),
+            top=int(os.getenv("TENDENCIAS_TOP", "50")),
+            vida_media_h=float(os.getenv("TENDENCIAS_VIDA_MEDIA_H", "6")),
+            retencion_dias=int(os.getenv("LECTURAS_RETENCION_DIAS", "90")),
+        )
+
+    def registrar(self, id_libro: int) -> None:
+        """Suma una lectura en memoria. No hace I/O: se llama desde la ruta de lectura."""
+        clave = (id_libro, int(self._reloj()) // self.cubeta_s * self.cubeta_s)
+        if clave not in self._pendientes and len(self._pendientes) >= self.max_claves:
+            # Memoria acotada si la BD no acepta volcados durante mucho tiempo.
+            self.descartadas += 1
+            return
+        self._pendientes[clave] += 1
+        self.registradas += 1
+
+    def _reincorporar(self, lote: "Counter[Clave]") -> None:
+        for clave, n in lote.items():
+            if clave in self._pendientes or len(self._pendientes) < self.max_claves:
+                self._pendientes[clave] += n
+            else:
+                self.descartadas += n
+
+    async def volcar(self) -> int:
+        """Escribe los deltas pendientes; si falla, vuelven al contador para el próximo intento."""
+        if not self._pendientes or self._fabrica_sesiones is None:
+            return 0
+        lote, self._pendientes = self._pendientes, Counter()
+        # Orden fijo de filas: dos workers que vuelcan a la vez bloquean las mismas filas en el mismo orden.
+        filas = [{"libro_id": libro, "hora": hora, "lecturas": n} for (libro, hora), n in sorted(lote.items())]
+        try:
+            async with self._fabrica_sesiones() as session:
+                await session.execute(UPSERT_LECTURAS, filas)
+                await session.commit()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self.fallos += 1
+            self._reincorporar(lote)
+            raise
+        self.volcados += 1
+        self.volcadas += sum(lote.values())
+        return len(filas)
+
+    async def refrescar(self) -> None:
+        if self._fabrica_lectura is None:
+            return
+        async with self._fabrica_lectura() as session:
+            listas = {
+                lista: [dict(fila) for fila in (await session.execute(consulta, self._parametros[lista])).mappings()]
+                for lista, consulta in CONSULTAS_TOP.items()
+            }
+        self._listas = listas
+        self.calculado_en = time.time()
+
+    async def limpiar(self) -> None:
+        async with self._fabrica_sesiones() as session:
+            await session.execute(LIMPIAR_LECTURAS, {"dias": self.retencion_dias})
+            await session.commit()
+
+    def listar(self, lista: str, k: int) -> List[Dict[str, Any]]:
+        return self._listas[lista][:k]
+
+    def iniciar(self, fabrica_sesiones: Callable[[], Any], fabrica_lectura: Optional[Callable[[], Any]] = None) -> None:
+        self._fabrica_sesiones = fabrica_sesiones
+        self._fabrica_lectura = fabrica_lectura or fabrica_sesiones
+        self._tarea = asyncio.create_task(self._bucle(), name="contador-lecturas")
+
+    async def cerrar(self) -> None:
+        # CLEAN CODE: Lo contado desde el último volcado se escribe antes de apagar.
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        await asyncio.gather(self._tarea, return_exceptions=True)
+        self._tarea = None
+        try:
+            await self.volcar()
+        except Exception as e:
+            print(f"No se pudieron volcar {sum(self._pendientes.values())} lecturas al cerrar: {e}")
+
+    async def _paso(self, paso: Callable[[], Any]) -> None:
+        # Un fallo (p. ej. la BD caída) no detiene el bucle: lo pendiente se reintenta en la próxima vuelta.
+        try:
+            await paso()
+        except Exception as e:
+            print(f"Analítica de lecturas ({paso.__name__}): {e}")
+
+    async def _bucle(self) -> None:
+        ahora = time.monotonic()
+        proximo_refresco, proxima_limpieza = ahora, ahora + 3600
+        while True:
+            await self._paso(self.volcar)
+            if time.monotonic() >= proximo_refresco:
+                await self._paso(self.refrescar)
+                proximo_refresco = time.monotonic() + self.refresco_s
+            if time.monotonic() >= proxima_limpieza:
+                await self._paso(self.limpiar)
+                proxima_limpieza = time.monotonic() + 3600
+            await asyncio.sleep(self.intervalo_s)
+
+    def metricas(self) -> Dict[str, int]:
+        return {
+            "pendientes": sum(self._pendientes.values()),
+            "claves_pendientes": len(self._pendientes),
+            "registradas": self.registradas,
+            "volcadas": self.volcadas,
+            "volcados": self.volcados,
+            "fallos": self.fallos,
+            "descartadas": self.descartadas,
+        }
+
+
+contador_lecturas = ContadorLecturas.desde_entorno()
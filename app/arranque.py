@@ -0,0 +1,43 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+# CLEAN CODE:
+# - SRP: `ReporteArranque` solo mide y resume cuánto tarda cada fase del arranque de un worker.
+# - Nombres claros: `marcar` cierra una fase abierta desde la marca anterior; `fase` mide un bloque concreto.
+
+
+class ReporteArranque:
+    def __init__(self, inicio: Optional[float] = None):
+        self.inicio = inicio if inicio is not None else time.perf_counter()
+        self._marca = self.inicio
+        self.fases: List[Tuple[str, float]] = []
+
+    def marcar(self, nombre: str) -> None:
+        ahora = time.perf_counter()
+        self.fases.append((nombre, ahora - self._marca))
+        self._marca = ahora
+
+    @contextmanager
+    def fase(self, nombre: str) -> Iterator[None]:
+        comienzo = time.perf_counter()
+        try:
+            yield
+        finally:
+            ahora = time.perf_counter()
+            self.fases.append((nombre, ahora - comienzo))
+            self._marca = ahora
+
+    def total(self) -> float:
+        return self._marca - self.inicio
+
+    def como_dict(self) -> dict:
+        return {
+            "fases_ms": {nombre: round(duracion * 1000, 2) for nombre, duracion in self.fases},
+            "total_ms": round(self.total() * 1000, 2),
+        }
+
+    def resumen(self) -> str:
+        lineas = [f"  - {nombre}: {duracion * 1000:.1f} ms" for nombre, duracion in self.fases]
+        lineas.append(f"  = total: {self.total() * 1000:.1f} ms")
+        return "Tiempo de arranque por fase:\n" + "\n".join(lineas)
@@ -0,0 +1,317 @@
+import asyncio
+import base64
+import binascii
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.catalogo import CursorInvalido
+
+# CLEAN CODE:
+# - SRP: Este módulo registra y consulta lo que hace cada administrador (quién, qué, sobre qué y qué cambió).
+# - Sin ida y vuelta extra: `registrar` solo deja el evento en un buffer acotado del worker; un escritor en
+#   segundo plano lo inserta en lotes, fuera de la petición del administrador.
+# - Nunca bloquea: Con el buffer lleno el evento se descarta y se cuenta. El escritor deja constancia en la
+#   propia tabla (`auditoria_eventos_descartados`), así el hueco queda visible en el registro.
+# - Solo agregar: Un trigger por fila en `auditoria` (Postgres lo clona en cada partición) rechaza UPDATE y
+#   DELETE, también los dirigidos a una partición; cada partición lleva además su trigger de TRUNCATE, y al rol
+#   de la app se le revocan UPDATE, DELETE y TRUNCATE. Está particionada por mes: la retención se hace quitando
+#   particiones viejas (DROP/DETACH, que siguen permitidos al dueño), no borrando filas.
+# - Consistencia eventual: Un evento tarda hasta `intervalo_ms` en aparecer en la consulta; al apagar se vacía
+#   el buffer. Si el worker muere de golpe se pierde lo que no se había escrito.
+
+INSERT_EVENTO = text(
+    "INSERT INTO auditoria (ocurrido_en, actor_id, actor, accion, objetivo_tipo, objetivo_id, cambios) "
+    "VALUES (:ocurrido_en, :actor_id, :actor, :accion, :objetivo_tipo, :objetivo_id, CAST(:cambios AS jsonb))"
+)
+FUNCION_SOLO_AGREGAR = """
+CREATE OR REPLACE FUNCTION auditoria_solo_agregar() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    RAISE EXCEPTION 'auditoria es de solo agregar (% no permitido)', TG_OP;
+END $$
+"""
+# Campos que nunca se guardan en claro; los textos largos (sinopsis) se recortan.
+CAMPOS_OCULTOS = {"password"}
+OCULTO = "[oculto]"
+MAX_TEXTO = 200
+POR_PAGINA = 50
+MAX_POR_PAGINA = 200
+
+
+def _valor(campo: str, valor: Any) -> Any:
+    if campo in CAMPOS_OCULTOS:
+        return OCULTO
+    if isinstance(valor, str) and len(valor) > MAX_TEXTO:
+        return valor[:MAX_TEXTO] + "…"
+    return valor
+
+
+def datos_visibles(datos: Mapping[str, Any]) -> Dict[str, Any]:
+    return {campo: _valor(campo, valor) for campo, valor in datos.items()}
+
+
+def diferencias(antes: Mapping[str, Any], despues: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """{campo: {"antes", "despues"}} de los campos que cambiaron de verdad."""
+    return {
+        campo: {"antes": _valor(campo, antes.get(campo)), "despues": _valor(campo, valor)}
+        for campo, valor in despues.items()
+        if antes.get(campo) != valor
+    }
+
+
+def _mes(instante: datetime) -> Tuple[int, int]:
+    return instante.year, instante.month
+
+
+def _siguiente_mes(anio: int, mes: int) -> Tuple[int, int]:
+    return (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+async def _proteger(conn: AsyncConnection, tabla: str) -> None:
+    # Los triggers de sentencia de la tabla padre no corren con un TRUNCATE dirigido a una partición.
+    await conn.execute(text(f"DROP TRIGGER IF EXISTS auditoria_solo_agregar_truncate ON {tabla}"))
+    await conn.execute(text(
+        f"CREATE TRIGGER auditoria_solo_agregar_truncate BEFORE TRUNCATE ON {tabla} "
+        "FOR EACH STATEMENT EXECUTE FUNCTION auditoria_solo_agregar()"
+    ))
+    await conn.execute(text(f"REVOKE UPDATE, DELETE, TRUNCATE ON {tabla} FROM CURRENT_USER"))
+
+
+async def asegurar_particiones(conn: AsyncConnection, meses: Set[Tuple[int, int]]) -> None:
+    for anio, mes in sorted(meses):
+        nombre = f"auditoria_{anio}_{mes:02d}"
+        if (await conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": f"public.{nombre}"})).scalar_one():
+            continue
+        hasta = _siguiente_mes(anio, mes)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {nombre} PARTITION OF auditoria "
+            f"FOR VALUES FROM ('{anio}-{mes:02d}-01 00:00+00') TO ('{hasta[0]}-{hasta[1]:02d}-01 00:00+00')"
+        ))
+        await _proteger(conn, nombre)
+
+
+async def preparar_tabla(conn: AsyncConnection) -> None:
+    # Trigger de solo agregar, permisos y particiones del mes actual y el siguiente (las demás las crea el escritor).
+    # Idempotente: la migración v9 lo vuelve a aplicar sobre las tablas creadas por la v8.
+    await conn.execute(text(FUNCION_SOLO_AGREGAR))
+    await conn.execute(text("DROP TRIGGER IF EXISTS auditoria_solo_agregar ON auditoria"))
+    await conn.execute(text(
+        "CREATE TRIGGER auditoria_solo_agregar BEFORE UPDATE OR DELETE ON auditoria "
+        "FOR EACH ROW EXECUTE FUNCTION auditoria_solo_agregar()"
+    ))
+    particiones = (await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits h JOIN pg_class c ON c.oid = h.inhrelid WHERE h.inhparent = 'auditoria'::regclass"
+    ))).scalars().all()
+    for tabla in ("auditoria", *particiones):
+        await _proteger(conn, tabla)
+    ahora = _mes(datetime.now(timezone.utc))
+    await asegurar_particiones(conn, {ahora, _siguiente_mes(*ahora)})
+
+
+def codificar_cursor(ocurrido_en: datetime, id_evento: int) -> str:
+    return base64.urlsafe_b64encode(f"{ocurrido_en.isoformat()}|{id_evento}".encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        instante, id_evento = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split("|")
+        return datetime.fromisoformat(instante), int(id_evento)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise CursorInvalido("Cursor de página inválido.")
+
+
+class RegistroAuditoria:
+    _FIN = object()
+
+    def __init__(self, capacidad: int = 10_000, tamano_lote: int = 500, intervalo_ms: int = 200, reintentos: int = 3):
+        self.capacidad = capacidad
+        self.tamano_lote = tamano_lote
+        self.intervalo_s = intervalo_ms / 1000
+        self.reintentos = reintentos
+        self._cola: asyncio.Queue = asyncio.Queue(maxsize=capacidad)
+        self._fabrica_sesiones: Optional[Callable[[], Any]] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._meses: Set[Tuple[int, int]] = set()
+        self._ultimo_aviso = 0.0
+        # Métricas acumuladas desde el arranque del worker.
+        self.registrados = 0
+        self.escritos = 0
+        self.descartados = 0
+        self.descartados_informados = 0
+        self.perdidos = 0
+        self.descartados_por_accion: Counter = Counter()
+
+    @classmethod
+    def desde_entorno(cls) -> "RegistroAuditoria":
+        return cls(
+            capacidad=int(os.getenv("AUDITORIA_CAPACIDAD", "10000")),
+            tamano_lote=int(os.getenv("AUDITORIA_LOTE_TAMANO", "500")),
+            intervalo_ms=int(os.getenv("AUDITORIA_LOTE_MS", "200")),
+        )
+
+    def registrar(
+        self,
+        actor: Any,
+        accion: str,
+        objetivo_tipo: str,
+        objetivo_id: Optional[int],
+        cambios: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Deja el evento en el buffer; devuelve False si estaba lleno y se descartó. Nunca espera."""
+        evento = {
+            "ocurrido_en": datetime.now(timezone.utc),
+            "actor_id": getattr(actor, "id_admin", None),
+            "actor": getattr(actor, "username", ""),
+            "accion": accion,
+            "objetivo_tipo": objetivo_tipo,
+            "objetivo_id": objetivo_id,
+            "cambios": cambios or {},
+        }
+        try:
+            self._cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.descartados += 1
+            self.descartados_por_accion[accion] += 1
+            ahora = time.monotonic()
+            if ahora - self._ultimo_aviso >= 60:
+                self._ultimo_aviso = ahora
+                print(f"⚠️ Buffer de auditoría lleno: {self.descartados} eventos descartados desde el arranque.")
+            return False
+        self.registrados += 1
+        return True
+
+    def iniciar(self, fabrica_sesiones: Callable[[], Any]) -> None:
+        self._fabrica_sesiones = fabrica_sesiones
+        self._tarea = asyncio.create_task(self._bucle(), name="auditoria")
+
+    async def cerrar(self) -> None:
+        # CLEAN CODE: El marcador de fin entra detrás de lo pendiente, así el buffer se escribe entero antes de apagar.
+        if self._tarea is None:
+            return
+        await self._cola.put(self._FIN)
+        await self._tarea
+        self._tarea = None
+
+    async def _bucle(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            primero = await self._cola.get()
+            if primero is self._FIN:
+                return
+            lote: List[Dict[str, Any]] = [primero]
+            # Se junta lo que llegue durante `intervalo_s` (o hasta llenar el lote) en una sola escritura.
+            limite = loop.time() + self.intervalo_s
+            fin = False
+            while len(lote) < self.tamano_lote:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    evento = await asyncio.wait_for(self._cola.get(), timeout=restante)
+                except asyncio.TimeoutError:
+                    break
+                if evento is self._FIN:
+                    fin = True
+                    break
+                lote.append(evento)
+            await self._escribir(lote)
+            if fin:
+                return
+
+    def _aviso_descartados(self) -> Optional[Dict[str, Any]]:
+        nuevos = self.descartados - self.descartados_informados
+        if not nuevos:
+            return None
+        por_accion = dict(self.descartados_por_accion)
+        self.descartados_informados = self.descartados
+        self.descartados_por_accion.clear()
+        return {
+            "ocurrido_en": datetime.now(timezone.utc),
+            "actor_id": None,
+            "actor": "sistema",
+            "accion": "auditoria_eventos_descartados",
+            "objetivo_tipo": "auditoria",
+            "objetivo_id": None,
+            "cambios": {"eventos": nuevos, "por_accion": por_accion},
+        }
+
+    async def _escribir(self, lote: List[Dict[str, Any]]) -> None:
+        if not lote:
+            return
+        aviso = self._aviso_descartados()
+        if aviso:
+            lote.append(aviso)
+        filas = [{**evento, "cambios": orjson.dumps(evento["cambios"], default=str).decode()} for evento in lote]
+        meses = {_mes(evento["ocurrido_en"]) for evento in lote} - self._meses
+        for intento in range(self.reintentos + 1):
+            try:
+                async with self._fabrica_sesiones() as session:
+                    if meses:
+                        await asegurar_particiones(await session.connection(), meses)
+                    await session.execute(INSERT_EVENTO, filas)
+                    await session.commit()
+                self._meses |= meses
+                self.escritos += len(filas)
+                return
+            except Exception as e:
+                if intento == self.reintentos:
+                    self.perdidos += len(filas)
+                    print(f"No se pudieron escribir {len(filas)} eventos de auditoría: {e}")
+                    return
+                await asyncio.sleep(0.5 * 2 ** intento)
+
+    async def consultar(
+        self,
+        session: Any,
+        filtros: Dict[str, Any],
+        cursor: Optional[str] = None,
+        limite: int = POR_PAGINA,
+    ) -> Dict[str, Any]:
+        """Eventos del más reciente al más antiguo, por páginas keyset sobre (ocurrido_en, id_evento)."""
+        condiciones, parametros = [], {}
+        for campo in ("actor_id", "accion", "objetivo_tipo", "objetivo_id"):
+            if filtros.get(campo) is not None:
+                condiciones.append(f"{campo} = :{campo}")
+                parametros[campo] = filtros[campo]
+        # Con `desde`/`hasta` Postgres solo abre las particiones de esos meses.
+        if filtros.get("desde") is not None:
+            condiciones.append("ocurrido_en >= :desde")
+            parametros["desde"] = filtros["desde"]
+        if filtros.get("hasta") is not None:
+            condiciones.append("ocurrido_en < :hasta")
+            parametros["hasta"] = filtros["hasta"]
+        if cursor:
+            ocurrido_en, id_evento = decodificar_cursor(cursor)
+            condiciones.append("(ocurrido_en, id_evento) < (:cursor_en, :cursor_id)")
+            parametros.update(cursor_en=ocurrido_en, cursor_id=id_evento)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        query = text(
+            "SELECT id_evento, ocurrido_en, actor_id, actor, accion, objetivo_tipo, objetivo_id, cambios "
+            f"FROM auditoria {where} ORDER BY ocurrido_en DESC, id_evento DESC LIMIT :limite"
+        )
+        filas = (await session.execute(query, {**parametros, "limite": limite + 1})).mappings().all()
+        eventos = [
+            {**fila, "cambios": orjson.loads(fila["cambios"]) if isinstance(fila["cambios"], str) else fila["cambios"]}
+            for fila in filas[:limite]
+        ]
+        siguiente = None
+        if len(filas) > limite:
+            siguiente = codificar_cursor(eventos[-1]["ocurrido_en"], eventos[-1]["id_evento"])
+        return {"eventos": eventos, "siguiente": siguiente}
+
+    def metricas(self) -> Dict[str, int]:
+        return {
+            "en_buffer": self._cola.qsize(),
+            "capacidad": self.capacidad,
+            "registrados": self.registrados,
+            "escritos": self.escritos,
+            "descartados": self.descartados,
+            "perdidos": self.perdidos,
+        }
+
+
+registro_auditoria = RegistroAuditoria.desde_entorno()
@@ -0,0 +1,248 @@
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# CLEAN CODE:
+# - SRP: Este módulo solo sugiere títulos y autores a partir de un prefijo, mientras el usuario escribe.
+# - Rendimiento: Lista ordenada de claves + `bisect`: cada tecla es una búsqueda binaria en memoria, sin tocar la BD.
+# - Ranking: Entre las claves que empiezan con el prefijo gana la más popular (número de reviews del libro).
+#   Se puntúa todo el rango del prefijo y un heap acotado se queda con los `limite` mejores: cortar el rango
+#   antes dejaría fuera a los populares que caen lejos en el orden alfabético. Los prefijos de rango grande (los
+#   cortos) guardan ese ranking y lo recalculan solo cuando cambia un libro o la popularidad de uno que contienen.
+# - Escrituras baratas: Altas en una lista corta que se funde por lotes y bajas por versión (ver `IndicePrefijos`),
+#   en vez de desplazar la lista principal en cada libro.
+# - Popularidad: `libro_popularidad` lleva las reviews por libro, mantenida por triggers de sentencia sobre
+#   `review` (toda escritura la actualiza, también las de scripts). El arranque lee esa tabla en vez de agrupar
+#   `review` entera; después cada worker suma en memoria las reviews que recibe.
+# - Consistencia: Como el índice de búsqueda, es por proceso y se actualiza con las escrituras de libros.
+
+CAMPOS_AUTOCOMPLETAR = ("titulo", "autor")
+MIN_CARACTERES = 2
+MAX_SUGERENCIAS = 10
+LIMITE_MAX = 20
+
+# Un trigger por evento: Postgres no admite tablas de transición en un trigger de varios eventos. Con la tabla
+# de transición cada sentencia (p. ej. un lote de `ColaReviews`) hace un único upsert por libro, en orden de
+# libro_id para que dos lotes concurrentes bloqueen las filas en el mismo orden.
+FUNCIONES_POPULARIDAD = (
+    """
+CREATE OR REPLACE FUNCTION review_popularidad_alta() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO libro_popularidad (libro_id, reviews)
+    SELECT libro_id, COUNT(*) FROM nuevas GROUP BY libro_id ORDER BY libro_id
+    ON CONFLICT (libro_id) DO UPDATE SET reviews = libro_popularidad.reviews + EXCLUDED.reviews;
+    RETURN NULL;
+END $$
+""",
+    """
+CREATE OR REPLACE FUNCTION review_popularidad_baja() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE libro_popularidad p SET reviews = p.reviews - v.n
+    FROM (SELECT libro_id, COUNT(*) AS n FROM viejas GROUP BY libro_id ORDER BY libro_id) v
+    WHERE p.libro_id = v.libro_id;
+    RETURN NULL;
+END $$
+""",
+)
+
+
+def normalizar(texto: str) -> str:
+    # Sin tildes ni mayúsculas: "garcia" encuentra "García".
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).strip()
+
+
+def _claves(valor: str) -> List[str]:
+    # Una clave por cada palabra del valor, para completar también "soledad" en "Cien años de soledad".
+    palabras = normalizar(valor).split()
+    return [" ".join(palabras[i:]) for i in range(len(palabras))]
+
+
+class IndicePrefijos:
+    # Las altas van a una lista corta aparte (insort barato) que se funde con la principal cuando crece; las bajas
+    # solo retiran la versión del libro y sus entradas se descartan en la siguiente fusión.
+    MAX_RECIENTES = 1024
+    # Un prefijo cuyo rango supera estas entradas guarda su ranking hasta que cambie un libro que lo contiene.
+    RANGO_MEMORIZADO = 512
+    MAX_MEMORIZADOS = 10_000
+
+    def __init__(self):
+        # Entradas ordenadas (clave, campo, id_libro, versión); el valor a mostrar se guarda aparte.
+        self._entradas: List[Tuple[str, str, int, int]] = []
+        self._recientes: List[Tuple[str, str, int, int]] = []
+        self._muertas = 0
+        self._valores: Dict[Tuple[str, int], str] = {}
+        self._versiones: Dict[Tuple[str, int], int] = {}
+        self._ultima_version = 0
+        self._popularidad: Dict[int, int] = {}
+        self._memorizados: Dict[str, List[Dict]] = {}
+        self.cargado = False
+
+    def __len__(self) -> int:
+        return len(self._entradas) + len(self._recientes) - self._muertas
+
+    def _registrar(self, campo: str, id_libro: int, valor: str) -> List[Tuple[str, str, int, int]]:
+        self._ultima_version += 1
+        self._valores[(campo, id_libro)] = valor
+        self._versiones[(campo, id_libro)] = self._ultima_version
+        return [(clave, campo, id_libro, self._ultima_version) for clave in _claves(valor)]
+
+    def cargar(self, filas, popularidad: Dict[int, int]) -> None:
+        entradas = []
+        for fila in filas:
+            for campo in CAMPOS_AUTOCOMPLETAR:
+                entradas.extend(self._registrar(campo, fila["id_libro"], fila[campo]))
+        entradas.sort()
+        self._entradas = entradas
+        self._popularidad = dict(popularidad)
+        self._memorizados.clear()
+        self.cargado = True
+
+    def agregar(self, id_libro: int, titulo: str, autor: str) -> None:
+        self.quitar(id_libro)
+        for campo, valor in zip(CAMPOS_AUTOCOMPLETAR, (titulo, autor)):
+            for entrada in self._registrar(campo, id_libro, valor):
+                insort(self._recientes, entrada)
+            self._olvidar(valor)
+        if len(self._recientes) > self.MAX_RECIENTES:
+            self._fundir()
+
+    def quitar(self, id_libro: int) -> None:
+        for campo in CAMPOS_AUTOCOMPLETAR:
+            valor = self._valores.pop((campo, id_libro), None)
+            if valor is None:
+                continue
+            del self._versiones[(campo, id_libro)]
+            self._muertas += len(_claves(valor))
+            self._olvidar(valor)
+        if self._muertas > max(self.MAX_RECIENTES, len(self._entradas) // 2):
+            self._fundir()
+
+    def _fundir(self) -> None:
+        # Filtrar conserva el orden de cada lista: `sort` (timsort) funde los dos tramos en tiempo lineal.
+        vivas = [e for e in self._entradas + self._recientes if self._versiones.get((e[1], e[2])) == e[3]]
+        vivas.sort()
+        self._entradas = vivas
+        self._recientes = []
+        self._muertas = 0
+
+    def _olvidar(self, valor: str) -> None:
+        # Descarta los rankings memorizados de todos los prefijos de las claves de `valor`.
+        if not self._memorizados:
+            return
+        for clave in _claves(valor):
+            for largo in range(MIN_CARACTERES, len(clave) + 1):
+                self._memorizados.pop(clave[:largo], None)
+
+    def sumar_popularidad(self, id_libro: int, cantidad: int = 1) -> None:
+        self._popularidad[id_libro] = self._popularidad.get(id_libro, 0) + cantidad
+        for campo in CAMPOS_AUTOCOMPLETAR:
+            valor = self._valores.get((campo, id_libro))
+            if valor is not None:
+                self._olvidar(valor)
+
+    def sugerir(self, prefijo: str, limite: int = MAX_SUGERENCIAS) -> List[Dict]:
+        prefijo = normalizar(prefijo)
+        if len(prefijo) < MIN_CARACTERES:
+            return []
+        if limite <= LIMITE_MAX and prefijo in self._memorizados:
+            return self._memorizados[prefijo][:limite]
+
+        # Todas las claves con el prefijo, en las dos listas: de la primera >= prefijo a la primera que ya no lo lleva.
+        rangos = []
+        for entradas in (self._entradas, self._recientes):
+            inicio = bisect_left(entradas, (prefijo,))
+            rangos.append((entradas, inicio, bisect_left(entradas, (prefijo + "\U0010ffff",), inicio)))
+        vistos: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        contados = set()
+        for entradas, inicio, fin in rangos:
+            for indice in range(inicio, fin):
+                clave, campo, id_libro, version = entradas[indice]
+                # Entradas de una versión retirada, o un libro que ya contó una vez en este campo aunque el
+                # prefijo coincida con varias de sus palabras.
+                if self._versiones.get((campo, id_libro)) != version or (campo, id_libro) in contados:
+                    continue
+                contados.add((campo, id_libro))
+                valor = self._valores[(campo, id_libro)]
+                # Un autor con muchos libros aparece una sola vez, con la suma de su popularidad.
+                puntaje, id_referencia = vistos.get((campo, valor), (0, id_libro))
+                vistos[(campo, valor)] = (puntaje + self._popularidad.get(id_libro, 0), id_referencia)
+
+        def orden(item):
+            (campo, valor), (puntaje, _) = item
+            # Más popular primero; a igual popularidad, lo que empieza con el prefijo y luego lo más corto.
+            return puntaje, normalizar(valor).startswith(prefijo), -len(valor)
+
+        sugerencias = [
+            {"campo": campo, "valor": valor, "id_libro": id_libro if campo == "titulo" else None, "popularidad": puntaje}
+            for (campo, valor), (puntaje, id_libro) in heapq.nlargest(max(limite, LIMITE_MAX), vistos.items(), key=orden)
+        ]
+        # Los prefijos cortos recorren rangos enormes: su ranking se reutiliza hasta que cambie uno de sus libros.
+        if limite <= LIMITE_MAX and sum(fin - inicio for _, inicio, fin in rangos) > self.RANGO_MEMORIZADO:
+            if len(self._memorizados) >= self.MAX_MEMORIZADOS:
+                self._memorizados.clear()
+            self._memorizados[prefijo] = sugerencias
+        return sugerencias[:limite]
+
+
+indice_prefijos = IndicePrefijos()
+
+
+async def preparar_popularidad(conn: AsyncConnection) -> None:
+    """Funciones y triggers de `libro_popularidad` sobre la `review` actual (migración v10 e intercambio de particiones)."""
+    for funcion in FUNCIONES_POPULARIDAD:
+        await conn.execute(text(funcion))
+    for nombre, evento, transicion in (
+        ("review_popularidad_alta", "INSERT", "NEW TABLE AS nuevas"),
+        ("review_popularidad_baja", "DELETE", "OLD TABLE AS viejas"),
+    ):
+        await conn.execute(text(f"DROP TRIGGER IF EXISTS {nombre} ON review"))
+        await conn.execute(text(
+            f"CREATE TRIGGER {nombre} AFTER {evento} ON review REFERENCING {transicion} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {nombre}()"
+        ))
+
+
+class Autocompletar:
+    # CLEAN CODE: Fachada para el arranque, el `Administrador` y el endpoint de sugerencias.
+
+    @staticmethod
+    async def cargar(session: AsyncSession) -> int:
+        filas = (await session.execute(text("SELECT id_libro, titulo, autor FROM libro"))).mappings().all()
+        conteos = await session.execute(text("SELECT libro_id, reviews FROM libro_popularidad WHERE reviews > 0"))
+        nuevo = IndicePrefijos()
+        nuevo.cargar(filas, {fila.libro_id: fila.reviews for fila in conteos})
+        global indice_prefijos
+        indice_prefijos = nuevo
+        return len(filas)
+
+    @staticmethod
+    def activo() -> bool:
+        return indice_prefijos.cargado
+
+    @staticmethod
+    def sugerir(prefijo: str, limite: int = MAX_SUGERENCIAS) -> List[Dict]:
+        return indice_prefijos.sugerir(prefijo, limite)
+
+    @staticmethod
+    async def sincronizar(session: AsyncSession, id_libro: int) -> None:
+        if not indice_prefijos.cargado:
+            return
+        fila = (await session.execute(text("SELECT titulo, autor FROM libro WHERE id_libro = :id"), {"id": id_libro})).first()
+        if fila:
+            indice_prefijos.agregar(id_libro, fila.titulo, fila.autor)
+        else:
+            indice_prefijos.quitar(id_libro)
+
+    @staticmethod
+    def eliminar(id_libro: int) -> None:
+        indice_prefijos.quitar(id_libro)
+
+    @staticmethod
+    def registrar_review(id_libro: Optional[int]) -> None:
+        if id_libro is not None:
+            indice_prefijos.sumar_popularidad(id_libro)
@@ -0,0 +1,277 @@
+import heapq
+import os
+import re
+from array import array
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import text
+
+# CLEAN CODE:
+# - SRP: Este módulo implementa un índice invertido de trigramas en memoria para el catálogo.
+# - Paridad: `trigramas` y `similitud` replican la semántica de `similarity()` de pg_trgm,
+#   así la búsqueda en memoria devuelve el mismo libro que las consultas de `design_patterns.py`.
+# - Rendimiento: Las listas de postings son `array('I')` compactos y la búsqueda no toca la BD.
+# - Borrado perezoso: Quitar un libro no recorre sus postings (eso sería O(n) por trigrama); su entrada queda
+#   muerta y se ignora al buscar, y los postings se compactan cuando las entradas muertas superan a las vivas.
+# - Por proceso: Cada worker carga su índice al arrancar y solo ve las escrituras de libros que él atiende; no
+#   hay convergencia entre workers. Es correcto con el único worker de `app/servidor.py`; con varios, los demás
+#   siguen con su copia hasta reiniciar (el trabajo `recargar_indice_busqueda` recarga solo el que lo ejecuta).
+# - Opcional: Solo se activa con `BUSQUEDA_EN_MEMORIA=1`; si no, la cadena sigue consultando Postgres.
+# - Texto completo: `BusquedaContenido` busca dentro de la sinopsis con el `tsvector` indexado (GIN) de `libro`.
+
+CAMPOS_TEXTO = ("titulo", "autor", "categoria")
+UMBRAL_SIMILITUD = 0.1
+CONFIG_TEXTO = "spanish"
+OPCIONES_RESALTADO = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter= … "
+
+# pg_trgm considera "palabra" cualquier secuencia de caracteres alfanuméricos.
+_PALABRA = re.compile(r"[^\W_]+")
+
+
+def busqueda_en_memoria_habilitada() -> bool:
+    return os.getenv("BUSQUEDA_EN_MEMORIA", "0").lower() in ("1", "true", "yes")
+
+
+def trigramas(texto: str) -> FrozenSet[str]:
+    # Igual que pg_trgm: minúsculas, cada palabra se rellena con dos espacios delante y uno detrás.
+    resultado = set()
+    for palabra in _PALABRA.findall(texto.lower()):
+        relleno = f"  {palabra} "
+        for i in range(len(relleno) - 2):
+            resultado.add(relleno[i:i + 3])
+    return frozenset(resultado)
+
+
+def similitud(a: str, b: str) -> float:
+    ta, tb = trigramas(a), trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    comunes = len(ta & tb)
+    return comunes / (len(ta) + len(tb) - comunes)
+
+
+class _IndiceCampo:
+    # CLEAN CODE: Un índice por campo; los trigramas se internan como enteros para abaratar las postings.
+    # Las postings guardan "ranuras", no ids: cada `agregar` usa una ranura nueva, así una entrada muerta
+    # nunca se confunde con la versión actual del mismo libro.
+    COMPACTAR_DESDE = 1024
+
+    def __init__(self):
+        self._ids_trigrama: Dict[str, int] = {}
+        self._postings: Dict[int, array] = {}
+        self._ranura_doc: Dict[int, int] = {}
+        # Ranura viva -> (id_doc, número de trigramas del documento).
+        self._vivas: Dict[int, Tuple[int, int]] = {}
+        self._siguiente = 0
+        self._entradas = 0
+        self._muertas = 0
+
+    def __len__(self) -> int:
+        return len(self._ranura_doc)
+
+    def _interno(self, trigrama: str) -> int:
+        tid = self._ids_trigrama.get(trigrama)
+        if tid is None:
+            tid = self._ids_trigrama[trigrama] = len(self._ids_trigrama)
+        return tid
+
+    def agregar(self, id_doc: int, valor: str) -> None:
+        self.quitar(id_doc)
+        tids = {self._interno(t) for t in trigramas(valor or "")}
+        ranura, self._siguiente = self._siguiente, self._siguiente + 1
+        self._ranura_doc[id_doc] = ranura
+        self._vivas[ranura] = (id_doc, len(tids))
+        for tid in tids:
+            posting = self._postings.get(tid)
+            if posting is None:
+                posting = self._postings[tid] = array("I")
+            posting.append(ranura)
+        self._entradas += len(tids)
+
+    def quitar(self, id_doc: int) -> None:
+        ranura = self._ranura_doc.pop(id_doc, None)
+        if ranura is None:
+            return
+        _, n = self._vivas.pop(ranura)
+        self._muertas += n
+        if self._muertas >= self.COMPACTAR_DESDE and self._muertas * 2 > self._entradas:
+            self._compactar()
+
+    def _compactar(self) -> None:
+        # O(entradas), pero solo después de otras tantas bajas: amortizado O(1) por `quitar`.
+        vivas = self._vivas
+        for tid, posting in list(self._postings.items()):
+            filtrado = array("I", (ranura for ranura in posting if ranura in vivas))
+            if filtrado:
+                self._postings[tid] = filtrado
+            else:
+                del self._postings[tid]
+        self._entradas -= self._muertas
+        self._muertas = 0
+
+    def mejor(self, consulta: str) -> Optional[Tuple[int, float]]:
+        """
+        Devuelve (id_doc, similitud) del documento más parecido con similitud > `UMBRAL_SIMILITUD`.
+        Los empates se resuelven por el id más bajo para que el resultado sea determinista.
+        """
+        trigramas_consulta = trigramas(consulta)
+        if not trigramas_consulta:
+            return None
+        n_consulta = len(trigramas_consulta)
+        consulta_tids = [self._ids_trigrama[t] for t in trigramas_consulta if t in self._ids_trigrama]
+
+        comunes: Dict[int, int] = {}
+        for tid in consulta_tids:
+            for ranura in self._postings.get(tid, ()):
+                comunes[ranura] = comunes.get(ranura, 0) + 1
+
+        mejor_id, mejor_sim = None, UMBRAL_SIMILITUD
+        for ranura, c in comunes.items():
+            viva = self._vivas.get(ranura)
+            if viva is None:
+                continue
+            id_doc, n_doc = viva
+            sim = c / (n_consulta + n_doc - c)
+            if sim > mejor_sim or (sim == mejor_sim and mejor_id is not None and id_doc < mejor_id):
+                mejor_id, mejor_sim = id_doc, sim
+        if mejor_id is None:
+            return None
+        return mejor_id, mejor_sim
+
+
+class IndiceTrigramas:
+    """
+    Índice del catálogo por `titulo`, `autor` y `categoria`, más un mapa `anio_publicacion -> ids`.
+    Es por proceso: cada worker lo carga al arrancar y lo mantiene con las escrituras que él mismo hace.
+    """
+
+    def __init__(self):
+        self.campos: Dict[str, _IndiceCampo] = {campo: _IndiceCampo() for campo in CAMPOS_TEXTO}
+        self._por_anio: Dict[int, Set[int]] = {}
+        # Montículo por año para el id más bajo; las bajas se descartan al llegar a la cima.
+        self._minimos: Dict[int, List[int]] = {}
+        self._anio_doc: Dict[int, int] = {}
+        self.cargado = False
+
+    def __len__(self) -> int:
+        return len(self._anio_doc)
+
+    def agregar(self, id_libro: int, titulo: str, autor: str, categoria: str, anio_publicacion: int) -> None:
+        self.quitar(id_libro)
+        for campo, valor in zip(CAMPOS_TEXTO, (titulo, autor, categoria)):
+            self.campos[campo].agregar(id_libro, valor)
+        anio = int(anio_publicacion)
+        self._anio_doc[id_libro] = anio
+        ids = self._por_anio.setdefault(anio, set())
+        ids.add(id_libro)
+        minimos = self._minimos.setdefault(anio, [])
+        if len(minimos) > 2 * len(ids) + 16:
+            # Demasiadas bajas acumuladas en el montículo: se rehace con los ids vivos.
+            minimos[:] = sorted(ids)
+        else:
+            heapq.heappush(minimos, id_libro)
+
+    def quitar(self, id_libro: int) -> None:
+        for indice in self.campos.values():
+            indice.quitar(id_libro)
+        anio = self._anio_doc.pop(id_libro, None)
+        if anio is not None:
+            self._por_anio[anio].discard(id_libro)
+            if not self._por_anio[anio]:
+                del self._por_anio[anio]
+                del self._minimos[anio]
+
+    def cargar(self, filas: Iterable) -> None:
+        for fila in filas:
+            self.agregar(fila["id_libro"], fila["titulo"], fila["autor"], fila["categoria"], fila["anio_publicacion"])
+        self.cargado = True
+
+    def mejor_por_campo(self, campo: str, consulta: str) -> Optional[int]:
+        resultado = self.campos[campo].mejor(consulta)
+        return resultado[0] if resultado else None
+
+    def primero_por_anio(self, anio: int) -> Optional[int]:
+        ids = self._por_anio.get(anio)
+        if not ids:
+            return None
+        minimos = self._minimos[anio]
+        while minimos[0] not in ids:
+            heapq.heappop(minimos)
+        return minimos[0]
+
+
+indice_libros = IndiceTrigramas()
+
+
+class IndiceLibros:
+    # CLEAN CODE: Fachada con las operaciones que usan el arranque y el `Administrador`.
+
+    @staticmethod
+    async def cargar(session: AsyncSession) -> int:
+        query = text("SELECT id_libro, titulo, autor, categoria, anio_publicacion FROM libro")
+        filas = (await session.execute(query)).mappings().all()
+        nuevo = IndiceTrigramas()
+        nuevo.cargar(filas)
+        global indice_libros
+        indice_libros = nuevo
+        return len(nuevo)
+
+    @staticmethod
+    def activo() -> bool:
+        return indice_libros.cargado
+
+    @staticmethod
+    def indice() -> IndiceTrigramas:
+        return indice_libros
+
+    @staticmethod
+    async def sincronizar(session: AsyncSession, id_libro: int) -> None:
+        # CLEAN CODE: Relee el libro tras una escritura; si ya no existe, lo quita del índice.
+        if not indice_libros.cargado:
+            return
+        query = text("SELECT id_libro, titulo, autor, categoria, anio_publicacion FROM libro WHERE id_libro = :id")
+        fila = (await session.execute(query, {"id": id_libro})).mappings().first()
+        if fila:
+            indice_libros.agregar(fila["id_libro"], fila["titulo"], fila["autor"], fila["categoria"], fila["anio_publicacion"])
+        else:
+            indice_libros.quitar(id_libro)
+
+
+class BusquedaContenido:
+    # CLEAN CODE: Búsqueda por contenido ordenada por relevancia; complementa a la cadena de responsabilidad.
+
+    @staticmethod
+    async def buscar(session: AsyncSession, termino: str, pagina: int = 1, por_pagina: int = 10) -> Dict:
+        """
+        Devuelve una página de libros cuya sinopsis coincide con `termino` (sintaxis de buscador web),
+        ordenados por `ts_rank`, con fragmentos resaltados. Se pide una fila de más para saber si hay otra página.
+        """
+        pagina = max(1, pagina)
+        por_pagina = max(1, min(por_pagina, 50))
+        # `ts_headline` es costoso: solo se calcula para las filas de la página ya recortada.
+        query = text(f"""
+            SELECT p.id_libro, p.titulo, p.autor, p.rango,
+                   ts_headline('{CONFIG_TEXTO}', l.sinopsis, p.consulta, :opciones) AS fragmento
+            FROM (
+                SELECT id_libro, titulo, autor, consulta, ts_rank(sinopsis_tsv, consulta) AS rango
+                FROM libro, websearch_to_tsquery('{CONFIG_TEXTO}', :termino) AS consulta
+                WHERE sinopsis_tsv @@ consulta
+                ORDER BY rango DESC, id_libro
+                LIMIT :limite OFFSET :desplazamiento
+            ) AS p
+            JOIN libro l ON l.id_libro = p.id_libro
+            ORDER BY p.rango DESC, p.id_libro
+        """)
+        params = {
+            "termino": termino.strip(),
+            "opciones": OPCIONES_RESALTADO,
+            "limite": por_pagina + 1,
+            "desplazamiento": (pagina - 1) * por_pagina,
+        }
+        filas = (await session.execute(query, params)).mappings().all()
+        return {
+            "pagina": pagina,
+            "por_pagina": por_pagina,
+            "hay_mas": len(filas) > por_pagina,
+            "resultados": [dict(f) for f in filas[:por_pagina]],
+        }
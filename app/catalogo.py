@@ -0,0 +1,133 @@
+import base64
+import binascii
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# CLEAN CODE:
+# - SRP: Este módulo lista el catálogo filtrado por categoría, autor y año, con los conteos de cada faceta.
+# - Keyset: Las páginas avanzan con un cursor (año, id) del último libro entregado, sin OFFSET: cada página es
+#   un rango de un índice compuesto y la página mil cuesta lo mismo que la primera.
+# - Índices de cobertura: Las columnas del listado van en el INCLUDE de los índices (`database/esquema.py`),
+#   así Postgres responde con un Index Only Scan sin leer la tabla.
+# - Facetas: `libro_faceta` guarda cuántos libros hay por (categoría, año). El `Administrador` la ajusta en la
+#   misma transacción que cada escritura de `libro`; los conteos suman esa tabla pequeña en vez de agrupar `libro`.
+
+POR_PAGINA = 20
+MAX_POR_PAGINA = 100
+COLUMNAS_LISTADO = "id_libro, titulo, autor, categoria, anio_publicacion"
+
+Filtros = Dict[str, Any]
+Faceta = Tuple[str, int]
+
+
+class CursorInvalido(ValueError):
+    """El cursor de página no fue generado por este endpoint."""
+
+
+def codificar_cursor(anio_publicacion: int, id_libro: int) -> str:
+    return base64.urlsafe_b64encode(f"{anio_publicacion}:{id_libro}".encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        anio, id_libro = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return int(anio), int(id_libro)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise CursorInvalido("Cursor de página inválido.")
+
+
+def _condiciones(filtros: Filtros, excluir: Iterable[str] = ()) -> Tuple[str, Dict[str, Any]]:
+    # Cada faceta se cuenta sin su propio filtro: con "Novela" elegida, las demás categorías siguen visibles.
+    excluir = set(excluir)
+    condiciones, parametros = [], {}
+    for campo in ("categoria", "autor"):
+        if filtros.get(campo) is not None and campo not in excluir:
+            condiciones.append(f"{campo} = :{campo}")
+            parametros[campo] = filtros[campo]
+    if "anio_publicacion" not in excluir:
+        if filtros.get("anio_desde") is not None:
+            condiciones.append("anio_publicacion >= :anio_desde")
+            parametros["anio_desde"] = filtros["anio_desde"]
+        if filtros.get("anio_hasta") is not None:
+            condiciones.append("anio_publicacion <= :anio_hasta")
+            parametros["anio_hasta"] = filtros["anio_hasta"]
+    return (f"WHERE {' AND '.join(condiciones)}" if condiciones else ""), parametros
+
+
+class Catalogo:
+    # CLEAN CODE: Fachada para el endpoint de exploración y para las escrituras de libros.
+
+    @staticmethod
+    async def listar(session: AsyncSession, filtros: Filtros, cursor: Optional[str] = None, limite: int = POR_PAGINA) -> Dict[str, Any]:
+        """Página de libros, del más reciente al más antiguo; `siguiente` es el cursor de la próxima página."""
+        where, parametros = _condiciones(filtros)
+        if cursor:
+            anio, id_libro = decodificar_cursor(cursor)
+            # Comparación de filas: Postgres la resuelve como un rango del índice (anio_publicacion, id_libro).
+            where = f"{where} {'AND' if where else 'WHERE'} (anio_publicacion, id_libro) < (:cursor_anio, :cursor_id)"
+            parametros.update(cursor_anio=anio, cursor_id=id_libro)
+        query = text(
+            f"SELECT {COLUMNAS_LISTADO} FROM libro {where} "
+            "ORDER BY anio_publicacion DESC, id_libro DESC LIMIT :limite"
+        )
+        # Se pide una fila de más para saber si hay otra página sin contar el total.
+        filas = (await session.execute(query, {**parametros, "limite": limite + 1})).mappings().all()
+        libros = filas[:limite]
+        siguiente = None
+        if len(filas) > limite:
+            ultimo = libros[-1]
+            siguiente = codificar_cursor(ultimo["anio_publicacion"], ultimo["id_libro"])
+        return {"libros": libros, "siguiente": siguiente}
+
+    @staticmethod
+    async def facetas(session: AsyncSession, filtros: Filtros) -> Dict[str, Any]:
+        # Sin filtro de autor basta `libro_faceta`; con autor se agrupa `libro`, acotado por ix_libro_catalogo_autor.
+        if filtros.get("autor") is None:
+            fuente, cuenta = "libro_faceta", "SUM(total)"
+        else:
+            fuente, cuenta = "libro", "COUNT(*)"
+
+        async def contar(columna: str) -> List[Dict[str, Any]]:
+            where, parametros = _condiciones(filtros, excluir=(columna,))
+            query = text(
+                f"SELECT {columna} AS valor, {cuenta} AS total FROM {fuente} {where} "
+                f"GROUP BY {columna} HAVING {cuenta} > 0 ORDER BY total DESC, valor"
+            )
+            return (await session.execute(query, parametros)).mappings().all()
+
+        where, parametros = _condiciones(filtros)
+        total = (await session.execute(text(f"SELECT COALESCE({cuenta}, 0) FROM {fuente} {where}"), parametros)).scalar_one()
+        return {
+            "total": int(total),
+            "categoria": await contar("categoria"),
+            "anio_publicacion": await contar("anio_publicacion"),
+        }
+
+    @staticmethod
+    async def ajustar(session: AsyncSession, altas: Iterable[Faceta] = (), bajas: Iterable[Faceta] = ()) -> None:
+        """Suma las altas y resta las bajas en `libro_faceta`. No hace commit: va en la transacción del llamador."""
+        cambios = Counter(altas)
+        cambios.subtract(bajas)
+        # Orden fijo de filas: dos escrituras concurrentes bloquean las mismas facetas en el mismo orden (sin deadlock).
+        filas = [
+            {"categoria": categoria, "anio_publicacion": anio, "delta": delta}
+            for (categoria, anio), delta in sorted(cambios.items())
+            if delta
+        ]
+        if not filas:
+            return
+        query = text(
+            "INSERT INTO libro_faceta (categoria, anio_publicacion, total) VALUES (:categoria, :anio_publicacion, :delta) "
+            "ON CONFLICT (categoria, anio_publicacion) DO UPDATE SET total = libro_faceta.total + EXCLUDED.total"
+        )
+        await session.execute(query, filas)
+
+    @staticmethod
+    async def facetas_de(session: AsyncSession, ids: List[int]) -> List[Faceta]:
+        """(categoría, año) actuales de `ids`, con la fila bloqueada hasta el commit para que nadie los cambie antes."""
+        if not ids:
+            return []
+        query = text("SELECT categoria, anio_publicacion FROM libro WHERE id_libro = ANY(:ids) FOR UPDATE")
+        return [(fila.categoria, fila.anio_publicacion) for fila in await session.execute(query, {"ids": ids})]
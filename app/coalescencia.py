@@ -0,0 +1,107 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+# CLEAN CODE:
+# - SRP: Este módulo solo agrupa lecturas idénticas que ocurren a la vez ("single-flight").
+# - Rendimiento: Si cien peticiones piden el mismo libro al mismo tiempo, una consulta va a la BD
+#   y las otras noventa y nueve esperan su resultado, sin ocupar conexiones del pool.
+# - Errores por clave: Si la consulta falla, todos los que esperaban esa clave reciben el mismo error;
+#   las demás claves no se enteran. Nada se guarda después: no es una caché.
+# - Misma fuente: Solo se agrupan consultas contra el mismo motor (primario o réplica), y nunca una lectura
+#   pegajosa: quien acaba de escribir no puede recibir el resultado de una consulta que empezó antes de su commit.
+# - Acotado: La consulta del líder tiene su propio límite (`consulta_max_s`); si se pasa, él y los que esperaban
+#   reciben `EsperaAgotada` y la clave queda libre.
+
+T = TypeVar("T")
+
+ESPERA_MAX_S = float(os.getenv("COALESCENCIA_ESPERA_S", "5"))
+CONSULTA_MAX_S = float(os.getenv("COALESCENCIA_CONSULTA_S", "10"))
+
+
+class EsperaAgotada(Exception):
+    """Se esperó demasiado a una consulta idéntica en curso."""
+
+
+def _lectura_pegajosa() -> bool:
+    # Import diferido: `database.connection_db` arrastra SQLAlchemy y el motor, que este módulo no necesita.
+    from database.connection_db import lectura_pegajosa
+
+    return lectura_pegajosa()
+
+
+class UnSoloVuelo:
+    def __init__(
+        self,
+        nombre: str,
+        espera_max_s: float = ESPERA_MAX_S,
+        consulta_max_s: float = CONSULTA_MAX_S,
+        sin_agrupar: Callable[[], bool] = _lectura_pegajosa,
+    ):
+        self.nombre = nombre
+        self.espera_max_s = espera_max_s
+        self.consulta_max_s = consulta_max_s
+        self.sin_agrupar = sin_agrupar
+        self._en_vuelo: Dict[Hashable, asyncio.Future] = {}
+        self.consultas = 0
+        self.agrupadas = 0
+        self.directas = 0
+
+    async def _consultar(self, clave: Hashable, consulta: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await asyncio.wait_for(consulta(), timeout=self.consulta_max_s)
+        except asyncio.TimeoutError:
+            raise EsperaAgotada(f"{self.nombre}: la consulta para {clave!r} superó {self.consulta_max_s:g} s.")
+
+    async def hacer(self, clave: Hashable, consulta: Callable[[], Awaitable[T]], session: Optional[Any] = None) -> T:
+        """
+        Ejecuta `consulta` salvo que ya haya una en curso con la misma clave contra el mismo motor que `session`;
+        en ese caso espera su resultado.
+        """
+        if self.sin_agrupar():
+            self.directas += 1
+            return await self._consultar(clave, consulta)
+        clave = (id(getattr(session, "bind", None)), clave)
+
+        futuro = self._en_vuelo.get(clave)
+        if futuro is not None:
+            self.agrupadas += 1
+            try:
+                # `shield`: si este llamador se cancela o se agota su espera, la consulta sigue para los demás.
+                return await asyncio.wait_for(asyncio.shield(futuro), timeout=self.espera_max_s)
+            except asyncio.TimeoutError:
+                raise EsperaAgotada(f"{self.nombre}: la consulta en curso para {clave!r} no respondió a tiempo.")
+            except asyncio.CancelledError:
+                if not futuro.cancelled():
+                    raise
+                # Se canceló la petición que ejecutaba la consulta (no esta): se consulta por cuenta propia.
+                return await self._consultar(clave, consulta)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_vuelo[clave] = futuro
+        self.consultas += 1
+        try:
+            resultado = await self._consultar(clave, consulta)
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except BaseException as e:
+            futuro.set_exception(e)
+            # Marca la excepción como recuperada si nadie más la esperaba (evita el aviso de asyncio).
+            futuro.exception()
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            self._en_vuelo.pop(clave, None)
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "en_vuelo": len(self._en_vuelo), "consultas": self.consultas, "agrupadas": self.agrupadas, "directas": self.directas,
+        }
+
+
+vuelo_libros = UnSoloVuelo("libros")
+vuelo_reviews = UnSoloVuelo("reviews")
+vuelo_busquedas = UnSoloVuelo("busquedas")
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, IntegrityError
+from app.difusion import difusor_reviews
+from app.metricas import Histograma
+from app.resiliencia import invalidar_libro
+from app.review import Review
+
+# CLEAN CODE:
+# - SRP: `ColaReviews` solo acumula reviews en memoria y las escribe en lotes (write-behind).
+# - Rendimiento: Una transacción y un executemany por lote en lugar de una transacción por review.
+# - Contrapresión: La cola es acotada; si sigue llena tras `espera_max_s`, se rechaza con `ColaReviewsLlena`.
+# - Durabilidad: Al cliente ya se le dijo que la review se publicará, así que solo se descarta una fila que la
+#   BD rechaza por sus datos (IntegrityError/DataError). Ante la BD caída o el circuito abierto el lote se
+#   conserva y se reintenta con espera creciente; mientras tanto la cola se llena y frena a los clientes.
+# - Supervisión: Si el bucle muere por un error inesperado se reinicia y retoma el lote que tenía en curso.
+# - Cierre: `cerrar` deja de aceptar reviews y vacía la cola antes de terminar (hook `lifespan`); si la BD no
+#   vuelve en `espera_cierre_s`, lo que quede se cuenta en `reviews_perdidas`.
+
+# Reviews por lote; la latencia de volcado usa los buckets en segundos de `app/metricas.py`.
+BUCKETS_LOTE = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+INSERT_REVIEW = text("INSERT INTO review (usuario_id, libro_id, comentario) VALUES (:uid, :lid, :com)")
+ERRORES_DE_DATOS = (IntegrityError, DataError)
+
+
+def reviews_en_lote_habilitadas() -> bool:
+    return os.getenv("REVIEWS_EN_LOTE", "0").lower() in ("1", "true", "yes")
+
+
+class ColaReviewsLlena(Exception):
+    """La cola de reviews está llena (o cerrándose) y no admite más escrituras por ahora."""
+
+
+class ColaReviews:
+    _FIN = object()
+
+    def __init__(
+        self,
+        fabrica_sesiones: Callable[[], Any],
+        tamano_lote: int = 200,
+        intervalo_ms: int = 50,
+        capacidad: int = 10_000,
+        espera_max_s: float = 0.5,
+        reintento_inicial_s: float = 0.5,
+        reintento_max_s: float = 10.0,
+        espera_cierre_s: float = 20.0,
+    ):
+        self._fabrica_sesiones = fabrica_sesiones
+        self.tamano_lote = tamano_lote
+        self.intervalo_s = intervalo_ms / 1000
+        self.espera_max_s = espera_max_s
+        self.reintento_inicial_s = reintento_inicial_s
+        self.reintento_max_s = reintento_max_s
+        self.espera_cierre_s = espera_cierre_s
+        self._cola: asyncio.Queue = asyncio.Queue(maxsize=capacidad)
+        # Filas sacadas de la cola que aún no se escribieron ni descartaron (el lote en curso).
+        self._en_curso: Deque[Dict[str, Any]] = deque()
+        self._tarea: Optional[asyncio.Task] = None
+        self._cerrando = False
+        self._limite_cierre: Optional[float] = None
+        # Métricas acumuladas desde el arranque del worker.
+        self.lotes = 0
+        self.reviews_escritas = 0
+        self.reviews_fallidas = 0
+        self.reviews_perdidas = 0
+        self.reviews_rechazadas = 0
+        self.reintentos = 0
+        self.reinicios = 0
+        self.tamano_lote_max = 0
+        self.latencia_volcado_total_s = 0.0
+        self.latencia_volcado_max_s = 0.0
+        self.histograma_lote = Histograma(BUCKETS_LOTE)
+        self.histograma_volcado = Histograma()
+
+    @classmethod
+    def desde_entorno(cls, fabrica_sesiones: Callable[[], Any]) -> "ColaReviews":
+        return cls(
+            fabrica_sesiones,
+            tamano_lote=int(os.getenv("REVIEWS_LOTE_TAMANO", "200")),
+            intervalo_ms=int(os.getenv("REVIEWS_LOTE_MS", "50")),
+            capacidad=int(os.getenv("REVIEWS_COLA_CAPACIDAD", "10000")),
+            reintento_max_s=float(os.getenv("REVIEWS_REINTENTO_MAX_S", "10")),
+            espera_cierre_s=float(os.getenv("REVIEWS_ESPERA_CIERRE_S", "20")),
+        )
+
+    def iniciar(self) -> None:
+        self._tarea = asyncio.create_task(self._supervisar(), name="cola-reviews")
+
+    async def encolar(self, usuario_id: int, libro_id: int, comentario: str, username: str = "", rol: int = 1) -> None:
+        if self._cerrando:
+            raise ColaReviewsLlena("La cola de reviews se está cerrando.")
+        # `username` y `rol` no van al INSERT (text() ignora claves de más); solo sirven para publicar la review.
+        fila = {"uid": usuario_id, "lid": libro_id, "com": comentario, "username": username, "rol": rol}
+        try:
+            await asyncio.wait_for(self._cola.put(fila), timeout=self.espera_max_s)
+        except asyncio.TimeoutError:
+            self.reviews_rechazadas += 1
+            raise ColaReviewsLlena("La cola de reviews está llena.")
+
+    async def cerrar(self) -> None:
+        # CLEAN CODE: El marcador de fin entra a la cola detrás de lo pendiente, así nada queda sin escribir.
+        if self._tarea is None:
+            return
+        self._cerrando = True
+        self._limite_cierre = asyncio.get_running_loop().time() + self.espera_cierre_s
+        await self._cola.put(self._FIN)
+        await self._tarea
+        self._tarea = None
+
+    async def _supervisar(self) -> None:
+        while True:
+            try:
+                await self._bucle()
+                return
+            except Exception as e:
+                self.reinicios += 1
+                print(f"El bucle de la cola de reviews falló y se reinicia: {e!r}")
+                await asyncio.sleep(self.reintento_inicial_s)
+
+    async def _bucle(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Tras un reinicio, primero se termina el lote que quedó a medias.
+        if self._en_curso:
+            await self._volcar()
+        while True:
+            primero = await self._cola.get()
+            if primero is self._FIN:
+                return
+            self._en_curso.append(primero)
+            limite = loop.time() + self.intervalo_s
+            fin = False
+            while len(self._en_curso) < self.tamano_lote:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    fila = await asyncio.wait_for(self._cola.get(), timeout=restante)
+                except asyncio.TimeoutError:
+                    break
+                if fila is self._FIN:
+                    fin = True
+                    break
+                self._en_curso.append(fila)
+            await self._volcar()
+            if fin:
+                return
+
+    async def _volcar(self) -> None:
+        loop = asyncio.get_running_loop()
+        inicio = time.perf_counter()
+        tamano = len(self._en_curso)
+        espera = self.reintento_inicial_s
+        while self._en_curso:
+            try:
+                await self._escribir(self._en_curso)
+            except Exception as e:
+                # BD no disponible (caída, timeout, circuito abierto): las filas se quedan y se reintentan.
+                if self._cerrando and loop.time() >= self._limite_cierre:
+                    self.reviews_perdidas += len(self._en_curso)
+                    print(f"Se pierden {len(self._en_curso)} reviews: la BD no respondió antes del cierre ({e!r}).")
+                    self._en_curso.clear()
+                    break
+                self.reintentos += 1
+                print(f"No se pudo volcar un lote de {len(self._en_curso)} reviews, reintento en {espera:.1f} s: {e!r}")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, self.reintento_max_s)
+
+        duracion = time.perf_counter() - inicio
+        self.lotes += 1
+        self.tamano_lote_max = max(self.tamano_lote_max, tamano)
+        self.latencia_volcado_total_s += duracion
+        self.latencia_volcado_max_s = max(self.latencia_volcado_max_s, duracion)
+        self.histograma_lote.observar(tamano)
+        self.histograma_volcado.observar(duracion)
+
+    async def _escribir(self, filas: Deque[Dict[str, Any]]) -> None:
+        """Escribe y quita de `filas` lo que se guardó o se descartó; un error de disponibilidad sale como excepción."""
+        async with self._fabrica_sesiones() as session:
+            try:
+                # executemany: asyncpg ejecuta la sentencia preparada una vez por fila, en una sola transacción.
+                await session.execute(INSERT_REVIEW, list(filas))
+                await session.commit()
+            except ERRORES_DE_DATOS as e:
+                await session.rollback()
+                print(f"El lote de {len(filas)} reviews tiene filas inválidas, se reintenta fila por fila: {e}")
+                await self._escribir_fila_por_fila(session, filas)
+                return
+            self.reviews_escritas += len(filas)
+            while filas:
+                self._publicar(filas.popleft())
+
+    async def _escribir_fila_por_fila(self, session, filas: Deque[Dict[str, Any]]) -> None:
+        # CLEAN CODE: Aísla las filas inválidas para que una sola no haga perder todo el lote.
+        while filas:
+            fila = filas[0]
+            try:
+                await session.execute(INSERT_REVIEW, fila)
+                await session.commit()
+            except ERRORES_DE_DATOS as e:
+                await session.rollback()
+                filas.popleft()
+                self.reviews_fallidas += 1
+                print(f"Review descartada, la BD la rechazó: {e}")
+                continue
+            filas.popleft()
+            self.reviews_escritas += 1
+            self._publicar(fila)
+
+    @staticmethod
+    def _publicar(fila: Dict[str, Any]) -> None:
+        # Ya está en la BD: las lecturas guardadas del libro (y las búsquedas que lo incluyen) dejan de valer.
+        invalidar_libro(fila["lid"])
+        # El INSERT en lote no devuelve ids: la review se publica sin `id_review`.
+        review = Review(comentario=fila["com"], usuario_id=fila["uid"], libro_id=fila["lid"])
+        difusor_reviews.publicar_review(fila["lid"], review, fila["username"], fila["rol"])
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "en_cola": self._cola.qsize() + len(self._en_curso),
+            "lotes": self.lotes,
+            "reviews_escritas": self.reviews_escritas,
+            "reviews_fallidas": self.reviews_fallidas,
+            "reviews_perdidas": self.reviews_perdidas,
+            "reviews_rechazadas": self.reviews_rechazadas,
+            "reintentos": self.reintentos,
+            "reinicios": self.reinicios,
+            "tamano_lote_promedio": round(self.reviews_escritas / self.lotes, 2) if self.lotes else 0,
+            "tamano_lote_max": self.tamano_lote_max,
+            "latencia_volcado_promedio_ms": round(self.latencia_volcado_total_s / self.lotes * 1000, 3) if self.lotes else 0,
+            "latencia_volcado_max_ms": round(self.latencia_volcado_max_s * 1000, 3),
+        }
@@ -0,0 +1,85 @@
+import gzip
+import os
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.activos import brotli, codificaciones_aceptadas
+
+# CLEAN CODE:
+# - SRP: Este middleware solo comprime las respuestas dinámicas (HTML de plantillas, JSON de la API).
+# - Selectivo: Solo cuerpos de una sola parte, de tipo texto y desde `minimo_bytes`. Los streams (SSE) y lo que ya
+#   trae `Content-Encoding` (estáticos precomprimidos) pasan intactos.
+# - brotli opcional: Si el paquete está instalado y el cliente lo acepta se usa `br`; si no, gzip de la stdlib.
+# - Event loop: Los cuerpos grandes se comprimen en el threadpool para no frenar a las demás peticiones.
+
+TIPOS_COMPRIMIBLES = ("text/html", "text/plain", "text/css", "text/csv", "application/json", "application/javascript", "image/svg+xml")
+UMBRAL_HILO_BYTES = 256 * 1024
+MINIMO_BYTES = int(os.getenv("COMPRESION_MINIMO_BYTES", "1024"))
+
+
+class MiddlewareCompresion:
+    """Middleware ASGI puro: retiene el inicio de la respuesta hasta ver si el cuerpo conviene comprimirlo."""
+
+    def __init__(self, app, minimo_bytes: int = MINIMO_BYTES, nivel_gzip: int = 6, calidad_brotli: int = 4):
+        self.app = app
+        self.minimo_bytes = minimo_bytes
+        self.nivel_gzip = nivel_gzip
+        self.calidad_brotli = calidad_brotli
+
+    def _codificacion(self, scope) -> Optional[str]:
+        aceptadas = codificaciones_aceptadas(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in aceptadas:
+            return "br"
+        if "gzip" in aceptadas:
+            return "gzip"
+        return None
+
+    def _comprimir(self, codificacion: str, cuerpo: bytes) -> bytes:
+        if codificacion == "br":
+            return brotli.compress(cuerpo, quality=self.calidad_brotli)
+        return gzip.compress(cuerpo, compresslevel=self.nivel_gzip)
+
+    async def __call__(self, scope, receive, send):
+        codificacion = self._codificacion(scope) if scope["type"] == "http" else None
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+
+        async def send_comprimido(mensaje):
+            nonlocal inicio
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje
+                return
+            if inicio is None:
+                # Ya se decidió con el primer trozo del cuerpo; el resto pasa tal cual.
+                await send(mensaje)
+                return
+
+            pendiente, inicio = inicio, None
+            encabezados = MutableHeaders(raw=pendiente["headers"])
+            cuerpo = mensaje.get("body", b"")
+            if (
+                mensaje.get("more_body", False)
+                or "content-encoding" in encabezados
+                or not encabezados.get("content-type", "").startswith(TIPOS_COMPRIMIBLES)
+                or len(cuerpo) < self.minimo_bytes
+            ):
+                await send(pendiente)
+                await send(mensaje)
+                return
+
+            if len(cuerpo) >= UMBRAL_HILO_BYTES:
+                comprimido = await run_in_threadpool(self._comprimir, codificacion, cuerpo)
+            else:
+                comprimido = self._comprimir(codificacion, cuerpo)
+            encabezados["Content-Encoding"] = codificacion
+            encabezados["Content-Length"] = str(len(comprimido))
+            encabezados.add_vary_header("Accept-Encoding")
+            pendiente["headers"] = encabezados.raw
+            await send(pendiente)
+            await send({"type": "http.response.body", "body": comprimido, "more_body": False})
+
+        await self.app(scope, receive, send_comprimido)
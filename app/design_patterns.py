@@ -2,6 +2,8 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy import text
 from typing import Optional, List
 from app.libro import Libro
+from app.busqueda import IndiceLibros
+from app.coalescencia import vuelo_busquedas
 import abc
 
 # CLEAN CODE:
@@ -93,6 +95,38 @@ class AnioHandler(AbstractHandler):
                 return Libro(**row)
         return await super().handle(request, session)
 
+# --- CHAIN OF RESPONSIBILITY (ÍNDICE EN MEMORIA) ---
+
+async def _libro_por_id(session: AsyncSession, id_libro: int) -> Optional[Libro]:
+    query = text("SELECT id_libro, titulo, autor, categoria, anio_publicacion, sinopsis FROM libro WHERE id_libro = :id")
+    row = (await session.execute(query, {"id": id_libro})).mappings().first()
+    return Libro(**row) if row else None
+
+class CampoMemoriaHandler(AbstractHandler):
+    # CLEAN CODE: Un solo handler parametrizado reemplaza a Titulo/Autor/CategoriaHandler cuando el índice está cargado.
+    # La BD solo se consulta por clave primaria para traer el libro ganador.
+    def __init__(self, campo: str):
+        self.campo = campo
+
+    async def handle(self, request: str, session: AsyncSession) -> Optional[Libro]:
+        id_libro = IndiceLibros.indice().mejor_por_campo(self.campo, request.strip().lower())
+        if id_libro is not None:
+            libro = await _libro_por_id(session, id_libro)
+            if libro:
+                return libro
+        return await super().handle(request, session)
+
+class AnioMemoriaHandler(AbstractHandler):
+    async def handle(self, request: str, session: AsyncSession) -> Optional[Libro]:
+        search_term = request.strip()
+        if search_term.isdigit():
+            id_libro = IndiceLibros.indice().primero_por_anio(int(search_term))
+            if id_libro is not None:
+                libro = await _libro_por_id(session, id_libro)
+                if libro:
+                    return libro
+        return await super().handle(request, session)
+
 class DesignPatterns:
     # CLEAN CODE: Fachada simple que oculta la complejidad de la creación de los patrones.
 
@@ -148,7 +182,20 @@ class DesignPatterns:
     # --- CHAIN OF RESPONSIBILITY ---
     @staticmethod
     async def busqueda_cadena_de_responsabilidad(session: AsyncSession, search_term: str) -> Optional[Libro]:
+        # CLEAN CODE: Búsquedas simultáneas del mismo término (normalizado) recorren la cadena una sola vez.
+        return await vuelo_busquedas.hacer(
+            search_term.strip().lower(), lambda: DesignPatterns._recorrer_cadena(session, search_term), session
+        )
+
+    @staticmethod
+    async def _recorrer_cadena(session: AsyncSession, search_term: str) -> Optional[Libro]:
         # CLEAN CODE: Encapsula la creación y el orden de la cadena.
+        if IndiceLibros.activo():
+            # Mismo orden y misma semántica de similitud, resuelto con el índice de trigramas del worker.
+            titulo_memoria = CampoMemoriaHandler("titulo")
+            titulo_memoria.set_next(CampoMemoriaHandler("autor")).set_next(CampoMemoriaHandler("categoria")).set_next(AnioMemoriaHandler())
+            return await titulo_memoria.handle(search_term, session)
+
         titulo_handler = TituloHandler()
         autor_handler = AutorHandler()
         categoria_handler = CategoriaHandler()
@@ -160,13 +207,17 @@ class DesignPatterns:
 # --- DECORATOR IMPLEMENTATION ---
 
 class ReviewComponent(abc.ABC):
-    # CLEAN CODE: Componente base del decorador.
+    # CLEAN CODE: Componente base del decorador. Se crea uno por review listada, por eso todos usan `__slots__`.
+    __slots__ = ()
+
     @abc.abstractmethod
     def mostrar(self):
         pass
 
 class ReviewConcreto(ReviewComponent):
-    # CLEAN CODE: Objeto base que se va a decorar.
+    # CLEAN CODE: Objeto base que se va a decorar; basta con cualquier objeto con `comentario` (p. ej. una fila).
+    __slots__ = ("_review",)
+
     def __init__(self, review):
         self._review = review
 
@@ -175,6 +226,8 @@ class ReviewConcreto(ReviewComponent):
 
 class ReviewDecorator(ReviewComponent):
     # CLEAN CODE: Decorador base que sigue la misma interfaz que el componente.
+    __slots__ = ("_review_component",)
+
     def __init__(self, review_component):
         self._review_component = review_component
 
@@ -183,5 +236,7 @@ class ReviewDecorator(ReviewComponent):
 
 class ReviewVerificadaDecorator(ReviewDecorator):
     # CLEAN CODE: Decorador concreto que añade una funcionalidad específica.
+    __slots__ = ()
+
     def mostrar(self):
         return f"⭐ [Verificada] {super().mostrar()}"
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+import orjson
+
+# CLEAN CODE:
+# - SRP: Este módulo reparte las reviews nuevas a los clientes suscritos a un libro (Server-Sent Events).
+# - Observer: `Review.subir_review` y la cola de reviews publican después del commit; cada suscriptor tiene su cola.
+# - Costo: Un suscriptor inactivo es una cola vacía en memoria; no consulta la BD ni ocupa conexiones del pool.
+# - Contrapresión: Las colas son acotadas. Un cliente que no lee a tiempo se descarta (recibe `descartado` y se
+#   cierra) en lugar de frenar la publicación o hacer crecer la memoria.
+# - Alcance: El reparto es por worker; cada stream termina tras `duracion_max_s` y el navegador se reconecta,
+#   lo que además reparte las conexiones entre workers y no retiene un apagado ordenado.
+
+LATIDO = b": latido\n\n"
+
+
+class DemasiadosSuscriptores(Exception):
+    """El worker ya tiene el máximo de streams abiertos."""
+
+
+def _evento(tipo: str, datos: Dict, id_evento: Optional[int] = None) -> bytes:
+    encabezado = f"id: {id_evento}\n" if id_evento is not None else ""
+    return f"{encabezado}event: {tipo}\n".encode() + b"data: " + orjson.dumps(datos) + b"\n\n"
+
+
+class Suscriptor:
+    __slots__ = ("cola", "descartado")
+
+    def __init__(self, capacidad: int):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=capacidad)
+        self.descartado = False
+
+
+class DifusorReviews:
+    def __init__(
+        self,
+        capacidad_cola: int = 32,
+        max_suscriptores: int = 10_000,
+        latido_s: float = 15.0,
+        duracion_max_s: float = 300.0,
+        reintento_ms: int = 3000,
+    ):
+        self.capacidad_cola = capacidad_cola
+        self.max_suscriptores = max_suscriptores
+        self.latido_s = latido_s
+        self.duracion_max_s = duracion_max_s
+        self.reintento_ms = reintento_ms
+        self._por_libro: Dict[int, Set[Suscriptor]] = {}
+        self._total = 0
+        # Métricas acumuladas desde el arranque del worker.
+        self.publicados = 0
+        self.entregados = 0
+        self.descartados = 0
+
+    @classmethod
+    def desde_entorno(cls) -> "DifusorReviews":
+        return cls(
+            capacidad_cola=int(os.getenv("DIFUSION_CAPACIDAD_COLA", "32")),
+            max_suscriptores=int(os.getenv("DIFUSION_MAX_SUSCRIPTORES", "10000")),
+            latido_s=float(os.getenv("DIFUSION_LATIDO_S", "15")),
+            duracion_max_s=float(os.getenv("DIFUSION_DURACION_MAX_S", "300")),
+        )
+
+    def suscribir(self, id_libro: int) -> Suscriptor:
+        if self.lleno():
+            raise DemasiadosSuscriptores("Demasiados clientes escuchando reviews en este momento.")
+        suscriptor = Suscriptor(self.capacidad_cola)
+        self._por_libro.setdefault(id_libro, set()).add(suscriptor)
+        self._total += 1
+        return suscriptor
+
+    def desuscribir(self, id_libro: int, suscriptor: Suscriptor) -> None:
+        suscriptores = self._por_libro.get(id_libro)
+        if suscriptores is None or suscriptor not in suscriptores:
+            return
+        suscriptores.discard(suscriptor)
+        self._total -= 1
+        if not suscriptores:
+            del self._por_libro[id_libro]
+
+    def publicar(self, id_libro: int, datos: Dict, id_evento: Optional[int] = None) -> int:
+        """Encola la review para los suscriptores del libro; devuelve a cuántos se entregó. Nunca espera."""
+        suscriptores = self._por_libro.get(id_libro)
+        self.publicados += 1
+        if not suscriptores:
+            return 0
+        # El evento se serializa una sola vez y los mismos bytes van a todas las colas.
+        evento = _evento("review", datos, id_evento)
+        entregados = 0
+        for suscriptor in list(suscriptores):
+            try:
+                suscriptor.cola.put_nowait(evento)
+                entregados += 1
+            except asyncio.QueueFull:
+                suscriptor.descartado = True
+                self.descartados += 1
+                self.desuscribir(id_libro, suscriptor)
+        self.entregados += entregados
+        return entregados
+
+    def publicar_review(self, id_libro: int, review, username: str, rol: int) -> int:
+        # Mismo texto que `Libro.reviews_de_libro` (la verificada lleva el decorador); import diferido por ciclos.
+        from app.design_patterns import DesignPatterns
+
+        datos = {
+            "id_review": review.id_review,
+            "libro_id": id_libro,
+            "username": username,
+            "comentario": DesignPatterns.decorar_review(review, rol == 2).mostrar(),
+        }
+        return self.publicar(id_libro, datos, review.id_review)
+
+    def lleno(self) -> bool:
+        return self._total >= self.max_suscriptores
+
+    async def eventos(self, id_libro: int) -> AsyncIterator[bytes]:
+        """Cuerpo del stream SSE; se desuscribe al terminar o al cortarse el cliente."""
+        # La suscripción se crea al empezar a iterar: si el cliente se va antes, no queda nada registrado.
+        try:
+            suscriptor = self.suscribir(id_libro)
+        except DemasiadosSuscriptores as e:
+            yield _evento("descartado", {"motivo": str(e)})
+            return
+        fin = time.monotonic() + self.duracion_max_s
+        try:
+            yield f"retry: {self.reintento_ms}\n\n".encode()
+            while not suscriptor.descartado:
+                restante = fin - time.monotonic()
+                if restante <= 0:
+                    return
+                try:
+                    yield await asyncio.wait_for(suscriptor.cola.get(), timeout=min(self.latido_s, restante))
+                except asyncio.TimeoutError:
+                    # El comentario SSE mantiene viva la conexión en proxies y detecta clientes que se fueron.
+                    yield LATIDO
+            # Descartado por lento: se avisa para que vuelva a leer las reviews y se reconecte.
+            yield _evento("descartado", {"motivo": "El cliente no leyó los eventos a tiempo."})
+        finally:
+            self.desuscribir(id_libro, suscriptor)
+
+    def metricas(self) -> Dict[str, int]:
+        return {
+            "suscriptores": self._total,
+            "libros": len(self._por_libro),
+            "publicados": self.publicados,
+            "entregados": self.entregados,
+            "descartados": self.descartados,
+        }
+
+
+difusor_reviews = DifusorReviews.desde_entorno()
@@ -0,0 +1,107 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+from sqlmodel import Field, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import text
+
+# CLEAN CODE:
+# - SRP: Este módulo se encarga únicamente de generar, guardar y servir los fragmentos de lectura gratuita.
+# - Rendimiento: El fragmento se calcula una sola vez al crear o actualizar un libro, no en cada lectura.
+# - Encapsulación: La caché en memoria y la tabla `libro_fragmento` quedan ocultas detrás de `Fragmentos`.
+# - Lectura sin escrituras: `obtener` solo consulta (puede ir a la réplica). Un libro cargado sin fragmento se
+#   calcula desde `libro`, como antes, hasta que `python -m database.despliegue` (o el trabajo
+#   `regenerar_fragmentos`) guarde su fila.
+
+SUFIJO_FRAGMENTO = "... accede a premium para desbloquear el contenido completo."
+SIN_SINOPSIS = "Este libro no tiene sinopsis disponible."
+UPSERT_FRAGMENTO = text(
+    "INSERT INTO libro_fragmento (id_libro, titulo, autor, fragmento) "
+    "VALUES (:id_libro, :titulo, :autor, :fragmento) "
+    "ON CONFLICT (id_libro) DO UPDATE SET "
+    "titulo = EXCLUDED.titulo, autor = EXCLUDED.autor, fragmento = EXCLUDED.fragmento"
+)
+
+
+class LibroFragmento(SQLModel, table=True):
+    """
+    Vista previa precalculada de un libro para los usuarios gratuitos.
+    Se guarda aparte de `libro` para no tener que cargar la sinopsis completa.
+    """
+    __tablename__ = "libro_fragmento"
+
+    id_libro: int = Field(primary_key=True, foreign_key="libro.id_libro", ondelete="CASCADE")
+    titulo: str
+    autor: str
+    fragmento: str
+
+
+class Fragmentos:
+    # CLEAN CODE: Caché por proceso (id_libro -> respuesta ya armada) para servir los fragmentos sin ir a la BD.
+    # Acotada (LRU) y con vencimiento: una escritura hecha en otro worker se ve aquí a más tardar en `CACHE_TTL_S`.
+    CACHE_CAPACIDAD = int(os.getenv("FRAGMENTOS_CACHE_CAPACIDAD", "10000"))
+    CACHE_TTL_S = float(os.getenv("FRAGMENTOS_CACHE_TTL_S", "30"))
+    _cache: "OrderedDict[int, Tuple[Dict[str, str], float]]" = OrderedDict()
+
+    @staticmethod
+    def generar(sinopsis: Optional[str]) -> str:
+        # CLEAN CODE: Única fuente de la regla de negocio: la mitad de la sinopsis más el sufijo.
+        if not sinopsis:
+            return SIN_SINOPSIS
+        midpoint = len(sinopsis) // 2
+        return sinopsis[:midpoint] + SUFIJO_FRAGMENTO
+
+    @staticmethod
+    async def guardar(session: AsyncSession, id_libro: int, titulo: str, autor: str, sinopsis: Optional[str]) -> None:
+        # CLEAN CODE: No hace commit; se ejecuta dentro de la transacción de quien escribe el libro.
+        datos = {
+            "id_libro": id_libro,
+            "titulo": titulo,
+            "autor": autor,
+            "fragmento": Fragmentos.generar(sinopsis),
+        }
+        await session.execute(UPSERT_FRAGMENTO, datos)
+        Fragmentos._cache.pop(id_libro, None)
+
+    @staticmethod
+    async def regenerar(session: AsyncSession, id_libro: int) -> None:
+        # CLEAN CODE: Lee el libro ya actualizado (dentro de la misma transacción) y recalcula su fragmento.
+        query = text("SELECT titulo, autor, sinopsis FROM libro WHERE id_libro = :id")
+        row = (await session.execute(query, {"id": id_libro})).first()
+        if not row:
+            await Fragmentos.eliminar(session, id_libro)
+            return
+        await Fragmentos.guardar(session, id_libro, row.titulo, row.autor, row.sinopsis)
+
+    @staticmethod
+    async def eliminar(session: AsyncSession, id_libro: int) -> None:
+        await session.execute(text("DELETE FROM libro_fragmento WHERE id_libro = :id"), {"id": id_libro})
+        Fragmentos._cache.pop(id_libro, None)
+
+    @staticmethod
+    async def obtener(session: AsyncSession, id_libro: int) -> Optional[Dict[str, str]]:
+        # CLEAN CODE: Primero la caché, luego una consulta restringida a las columnas de la vista previa.
+        ahora = time.monotonic()
+        entrada = Fragmentos._cache.get(id_libro)
+        if entrada is not None and ahora - entrada[1] <= Fragmentos.CACHE_TTL_S:
+            Fragmentos._cache.move_to_end(id_libro)
+            return entrada[0]
+
+        query = text("SELECT titulo, autor, fragmento FROM libro_fragmento WHERE id_libro = :id")
+        row = (await session.execute(query, {"id": id_libro})).first()
+        if row:
+            fragmento = {"titulo": row.titulo, "autor": row.autor, "fragmento": row.fragmento}
+        else:
+            # Sin fila precalculada: la consulta restringida de antes, sobre `libro`.
+            query = text("SELECT titulo, autor, sinopsis FROM libro WHERE id_libro = :id")
+            row = (await session.execute(query, {"id": id_libro})).first()
+            if not row:
+                Fragmentos._cache.pop(id_libro, None)
+                return None
+            fragmento = {"titulo": row.titulo, "autor": row.autor, "fragmento": Fragmentos.generar(row.sinopsis)}
+        Fragmentos._cache[id_libro] = (fragmento, ahora)
+        Fragmentos._cache.move_to_end(id_libro)
+        while len(Fragmentos._cache) > Fragmentos.CACHE_CAPACIDAD:
+            Fragmentos._cache.popitem(last=False)
+        return fragmento
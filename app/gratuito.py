@@ -1,7 +1,9 @@
+from typing import Optional
 from sqlmodel.ext.asyncio.session import AsyncSession
 from app.usuario import Usuario
 from app.suscripcion import Suscripcion
-from app.libro import Libro
+from app.fragmento import Fragmentos
+from app.analitica import contador_lecturas
 
 # CLEAN CODE:
 # - Herencia: La clase `Gratuito` hereda de `Usuario`, lo que promueve la reutilización de código (DRY).
@@ -10,25 +12,20 @@ from app.libro import Libro
 # - Cohesión: Los métodos de la clase están relacionados y trabajan juntos en el contexto de un usuario gratuito.
 
 class Gratuito(Usuario):
-    def leer_fragmento_libro(self, libro: Libro) -> dict:
+    __slots__ = ()
+
+    async def leer_fragmento_libro(self, session: AsyncSession, id_libro: int) -> Optional[dict]:
         # CLEAN CODE: El método tiene una única responsabilidad: leer un fragmento de un libro.
         # CLEAN CODE: Fail-Fast: La validación de rol se realiza al principio.
         if self.rol not in [0, 1]:
             return {"error": "Acceso denegado."}
 
-        sinopsis = libro.sinopsis
-        if not sinopsis:
-            fragmento = "Este libro no tiene sinopsis disponible."
-        else:
-            # CLEAN CODE: La lógica para obtener el fragmento es clara y legible.
-            midpoint = len(sinopsis) // 2
-            fragmento = sinopsis[:midpoint] + "... accede a premium para desbloquear el contenido completo."
-
-        return {
-            "titulo": libro.titulo,
-            "autor": libro.autor,
-            "fragmento": fragmento
-        }
+        # CLEAN CODE: El fragmento ya viene precalculado; no se carga la sinopsis completa.
+        fragmento = await Fragmentos.obtener(session, id_libro)
+        if fragmento:
+            # Solo en memoria: la lectura no escribe en la BD (`app/analitica.py`).
+            contador_lecturas.registrar(id_libro)
+        return fragmento
 
     async def pasar_a_premium(self, session: AsyncSession, codigo: str) -> str:
         # CLEAN CODE: Delega la lógica de activación de la suscripción a la clase `Suscripcion` (SRP).
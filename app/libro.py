@@ -1,6 +1,6 @@
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy import text
-from app.review import Review
+from app.coalescencia import vuelo_reviews
 from typing import List, Dict, Any
 
 # CLEAN CODE:
@@ -10,6 +10,8 @@ from typing import List, Dict, Any
 # - Encapsulación: La lógica para mostrar las reviews está contenida dentro de la clase, ocultando la complejidad.
 
 class Libro:
+    __slots__ = ("id_libro", "titulo", "autor", "categoria", "anio_publicacion", "sinopsis")
+
     def __init__(self, id_libro: int, titulo: str, autor: str, categoria: str, anio_publicacion: int, sinopsis: str):
         # CLEAN CODE: El constructor es simple y se limita a la asignación de atributos.
         self.id_libro = id_libro
@@ -24,6 +26,11 @@ class Libro:
         return f"{self.titulo} de {self.autor} ({self.anio_publicacion}) - Categoría: {self.categoria}"
 
     async def get_reviews(self, session: AsyncSession) -> List[Dict[str, Any]]:
+        return await Libro.reviews_de_libro(session, self.id_libro)
+
+    @staticmethod
+    async def reviews_de_libro(session: AsyncSession, id_libro: int) -> List[Dict[str, Any]]:
+        # CLEAN CODE: Solo necesita el id, así la API no tiene que construir un `Libro` para listar reviews.
         from app.design_patterns import DesignPatterns
         
         query_reviews = text(
@@ -31,25 +38,17 @@ class Libro:
             "FROM review r JOIN usuario u ON r.usuario_id = u.id_usuario "
             "WHERE r.libro_id = :id_libro"
         )
-        result_reviews = await session.execute(query_reviews, {"id_libro": self.id_libro})
-        reviews_data = result_reviews.mappings().fetchall()
-
-        reviews_list = []
-        for review_data in reviews_data:
-            # FIX: Create the Review object with only the arguments it expects.
-            review = Review(
-                id_review=review_data['id_review'],
-                usuario_id=review_data['usuario_id'],
-                libro_id=review_data['libro_id'],
-                comentario=review_data['comentario']
-            )
-            es_premium = (review_data['rol'] == 2)
-            review_component = DesignPatterns.decorar_review(review, es_premium)
-            reviews_list.append({
-                "username": review_data['username'],
-                "comentario": review_component.mostrar()
-            })
-        return reviews_list
+
+        async def consultar() -> List[Dict[str, Any]]:
+            result_reviews = await session.execute(query_reviews, {"id_libro": id_libro})
+            # CLEAN CODE: La fila va directo al decorador y de ahí a la respuesta, sin un `Review` intermedio por fila.
+            return [
+                {"username": fila.username, "comentario": DesignPatterns.decorar_review(fila, fila.rol == 2).mostrar()}
+                for fila in result_reviews
+            ]
+
+        # Varias peticiones por las reviews del mismo libro esperan una sola consulta (la lista no se modifica).
+        return await vuelo_reviews.hacer(id_libro, consultar, session)
 
     async def mostrar_reviews(self, session: AsyncSession) -> str:
         reviews = await self.get_reviews(session)
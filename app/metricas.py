@@ -0,0 +1,198 @@
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from fastapi.responses import ORJSONResponse
+from fastapi.templating import Jinja2Templates
+
+# CLEAN CODE:
+# - SRP: Este módulo mide cada petición (conteo, latencia y su reparto BD / plantillas / serialización)
+#   y expone todo en formato de texto de Prometheus.
+# - Cardinalidad baja: las etiquetas son la plantilla de la ruta (no la URL), el método y la clase de estado (2xx...).
+# - Por worker: cada proceso tiene su propio registro, así que toda muestra lleva `worker` (su pid). Con varios
+#   workers detrás del mismo puerto cada scrape ve uno distinto; sin la etiqueta sus contadores se pisarían
+#   y parecerían reinicios. Los totales se obtienen con `sum without (worker)`.
+# - Sin dependencias: el formato de exposición se escribe a mano; no hace falta `prometheus_client`.
+
+BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMPONENTES = ("bd", "plantilla", "serializacion")
+
+
+class TiemposPeticion:
+    __slots__ = ("bd", "plantilla", "serializacion")
+
+    def __init__(self):
+        self.bd = 0.0
+        self.plantilla = 0.0
+        self.serializacion = 0.0
+
+
+# Acumulador mutable de la petición en curso; los middlewares internos comparten la misma instancia.
+tiempos_peticion: ContextVar[Optional[TiemposPeticion]] = ContextVar("tiempos_peticion", default=None)
+
+
+def sumar_tiempo(componente: str, segundos: float) -> None:
+    tiempos = tiempos_peticion.get()
+    if tiempos is not None:
+        setattr(tiempos, componente, getattr(tiempos, componente) + segundos)
+
+
+class Histograma:
+    __slots__ = ("limites", "conteos", "suma", "total")
+
+    def __init__(self, limites: Tuple[float, ...] = BUCKETS_S):
+        self.limites = limites
+        self.conteos = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        self.conteos[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self.peticiones: Dict[Tuple[str, str, str], int] = {}
+        self.latencias: Dict[Tuple[str, str], Histograma] = {}
+        self.componentes: Dict[Tuple[str, str, str], Histograma] = {}
+        self.en_curso = 0
+        # Colectores externos (pool, colas...) que devuelven (nombre, ayuda, tipo, [(etiquetas, valor)]); con tipo
+        # "histogram" cada valor es un `Histograma`.
+        self._colectores: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]] = []
+
+    def registrar_colector(self, colector: Callable) -> None:
+        self._colectores.append(colector)
+
+    def observar(self, ruta: str, metodo: str, estado: int, duracion: float, tiempos: TiemposPeticion) -> None:
+        clave = (ruta, metodo, f"{estado // 100}xx")
+        self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+        self.latencias.setdefault((ruta, metodo), Histograma()).observar(duracion)
+        for componente in COMPONENTES:
+            valor = getattr(tiempos, componente)
+            if valor:
+                self.componentes.setdefault((ruta, metodo, componente), Histograma()).observar(valor)
+
+    def exportar(self) -> str:
+        lineas: List[str] = []
+        # El pid se lee al exportar: el registro se crea antes del fork de los workers.
+        worker = f'worker="{os.getpid()}"'
+
+        lineas += ["# HELP http_requests_total Peticiones atendidas por ruta, método y clase de estado.",
+                   "# TYPE http_requests_total counter"]
+        for (ruta, metodo, estado), n in sorted(self.peticiones.items()):
+            lineas.append(f'http_requests_total{{route="{ruta}",method="{metodo}",status="{estado}",{worker}}} {n}')
+
+        lineas += ["# HELP http_request_duration_seconds Latencia total de la petición.",
+                   "# TYPE http_request_duration_seconds histogram"]
+        for (ruta, metodo), h in sorted(self.latencias.items()):
+            lineas += _lineas_histograma("http_request_duration_seconds", f'route="{ruta}",method="{metodo}",{worker}', h)
+
+        lineas += ["# HELP http_request_component_seconds Tiempo de la petición en BD, plantillas y serialización.",
+                   "# TYPE http_request_component_seconds histogram"]
+        for (ruta, metodo, componente), h in sorted(self.componentes.items()):
+            etiquetas = f'route="{ruta}",method="{metodo}",component="{componente}",{worker}'
+            lineas += _lineas_histograma("http_request_component_seconds", etiquetas, h)
+
+        lineas += ["# HELP http_requests_in_flight Peticiones en curso en este worker.",
+                   "# TYPE http_requests_in_flight gauge",
+                   f"http_requests_in_flight{{{worker}}} {self.en_curso}"]
+
+        for colector in self._colectores:
+            for nombre, ayuda, tipo, muestras in colector():
+                lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+                for etiquetas, valor in muestras:
+                    texto = ",".join([*(f'{k}="{v}"' for k, v in etiquetas.items()), worker])
+                    if tipo == "histogram":
+                        lineas += _lineas_histograma(nombre, texto, valor)
+                    else:
+                        lineas.append(f"{nombre}{{{texto}}} {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+def _lineas_histograma(nombre: str, etiquetas: str, h: Histograma) -> List[str]:
+    lineas, acumulado = [], 0
+    for limite, n in zip(h.limites, h.conteos):
+        acumulado += n
+        lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+    lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {h.total}')
+    lineas.append(f"{nombre}_sum{{{etiquetas}}} {h.suma:.6f}")
+    lineas.append(f"{nombre}_count{{{etiquetas}}} {h.total}")
+    return lineas
+
+
+registro = RegistroMetricas()
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro: no crea tareas extra ni envuelve el cuerpo de la respuesta."""
+
+    def __init__(self, app, rutas_excluidas: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.rutas_excluidas = rutas_excluidas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.rutas_excluidas:
+            await self.app(scope, receive, send)
+            return
+
+        estado = {"codigo": 500}
+
+        async def send_medido(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+            await send(mensaje)
+
+        tiempos = TiemposPeticion()
+        token = tiempos_peticion.set(tiempos)
+        registro.en_curso += 1
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_medido)
+        finally:
+            duracion = time.perf_counter() - inicio
+            registro.en_curso -= 1
+            tiempos_peticion.reset(token)
+            # El router deja la ruta resuelta en el scope; se usa su plantilla (`/api/.../{id_libro}`).
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            registro.observar(ruta, scope["method"], estado["codigo"], duracion, tiempos)
+
+
+class ORJSONMedida(ORJSONResponse):
+    # CLEAN CODE: Misma respuesta por defecto, midiendo el tiempo de serialización a JSON.
+    def render(self, content) -> bytes:
+        inicio = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            sumar_tiempo("serializacion", time.perf_counter() - inicio)
+
+
+class PlantillasMedidas(Jinja2Templates):
+    # CLEAN CODE: La respuesta de plantilla se renderiza al construirse; ahí se mide el tiempo.
+    def TemplateResponse(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return super().TemplateResponse(*args, **kwargs)
+        finally:
+            sumar_tiempo("plantilla", time.perf_counter() - inicio)
+
+
+def colector_pools(engines: Dict[str, object]) -> Callable:
+    # CLEAN CODE: Un solo colector para todos los engines, así cada métrica tiene un único HELP/TYPE.
+    gauges = (
+        ("size", "db_pool_size", "Tamaño configurado del pool."),
+        ("checkedout", "db_pool_checked_out", "Conexiones prestadas en este momento."),
+        ("checkedin", "db_pool_checked_in", "Conexiones libres en el pool."),
+        ("overflow", "db_pool_overflow", "Conexiones por encima del tamaño del pool."),
+    )
+
+    def colectar():
+        activos = {nombre: engine.sync_engine.pool for nombre, engine in engines.items() if engine is not None}
+        for metodo, nombre, ayuda in gauges:
+            muestras = [({"engine": e}, getattr(pool, metodo)()) for e, pool in activos.items() if hasattr(pool, metodo)]
+            if muestras:
+                yield nombre, ayuda, "gauge", muestras
+    return colectar
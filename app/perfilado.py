@@ -0,0 +1,128 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+# CLEAN CODE:
+# - SRP: Este módulo perfila el worker en vivo bajo demanda; no sabe nada de rutas ni de usuarios.
+# - Sin costo en reposo: no hay hooks ni hilos activos hasta que un administrador pide un perfil.
+# - Acotado: cada perfil dura como máximo `SEGUNDOS_MAX` y solo puede haber uno a la vez por worker.
+
+SEGUNDOS_MAX = 30.0
+PROFUNDIDAD_MAX = 128
+
+
+class PerfilEnCurso(Exception):
+    """Ya hay un perfil ejecutándose en este worker."""
+
+
+def _nombre_marco(frame) -> str:
+    codigo = frame.f_code
+    return f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{codigo.co_firstlineno}"
+
+
+def _pila_colapsada(frame) -> str:
+    # Formato de "collapsed stacks" (flamegraph.pl, speedscope): de la raíz a la hoja, separado por ';'.
+    marcos: List[str] = []
+    while frame is not None and len(marcos) < PROFUNDIDAD_MAX:
+        marcos.append(_nombre_marco(frame))
+        frame = frame.f_back
+    return ";".join(reversed(marcos))
+
+
+class _Muestreador(threading.Thread):
+    """Hilo que toma la pila del hilo del event loop cada `intervalo_s`; el loop no se instrumenta."""
+
+    def __init__(self, id_hilo: int, intervalo_s: float):
+        super().__init__(name="perfilador-muestreo", daemon=True)
+        self.id_hilo = id_hilo
+        self.intervalo_s = intervalo_s
+        self.pilas: Counter = Counter()
+        self.muestras = 0
+        self._detener = threading.Event()
+
+    def run(self) -> None:
+        while not self._detener.wait(self.intervalo_s):
+            frame = sys._current_frames().get(self.id_hilo)
+            if frame is None:
+                return
+            self.pilas[_pila_colapsada(frame)] += 1
+            self.muestras += 1
+
+    def detener(self) -> None:
+        self._detener.set()
+        self.join()
+
+
+class Perfilador:
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    @property
+    def ocupado(self) -> bool:
+        return self._lock.locked()
+
+    async def muestrear(self, segundos: float, intervalo_ms: float = 5.0) -> Dict:
+        """Perfil por muestreo del hilo del event loop; devuelve las pilas colapsadas y su conteo."""
+        async with self._reservar():
+            muestreador = _Muestreador(threading.get_ident(), max(intervalo_ms, 1.0) / 1000)
+            inicio = time.perf_counter()
+            muestreador.start()
+            try:
+                await asyncio.sleep(min(segundos, SEGUNDOS_MAX))
+            finally:
+                await asyncio.to_thread(muestreador.detener)
+            return {
+                "modo": "muestreo",
+                "duracion_s": round(time.perf_counter() - inicio, 3),
+                "muestras": muestreador.muestras,
+                "pilas": muestreador.pilas,
+            }
+
+    async def cprofile(self, segundos: float, limite: int = 50, orden: str = "cumulative") -> Dict:
+        """Perfil determinista con cProfile sobre todo lo que corre en el event loop durante la ventana."""
+        async with self._reservar():
+            perfil = cProfile.Profile()
+            inicio = time.perf_counter()
+            perfil.enable()
+            try:
+                await asyncio.sleep(min(segundos, SEGUNDOS_MAX))
+            finally:
+                perfil.disable()
+            salida = io.StringIO()
+            pstats.Stats(perfil, stream=salida).sort_stats(orden).print_stats(limite)
+            return {
+                "modo": "cprofile",
+                "duracion_s": round(time.perf_counter() - inicio, 3),
+                "estadisticas": salida.getvalue(),
+            }
+
+    def _reservar(self):
+        if self._lock.locked():
+            raise PerfilEnCurso("Ya hay un perfil en curso en este worker.")
+        return self._lock
+
+
+def colapsar(pilas: Counter) -> str:
+    return "".join(f"{pila} {n}\n" for pila, n in pilas.most_common())
+
+
+def pilas_de_tareas(limite_marcos: int = 20) -> List[Dict]:
+    """Pila actual de cada tarea de asyncio del worker (qué está esperando cada petición)."""
+    actual = asyncio.current_task()
+    tareas = []
+    for tarea in asyncio.all_tasks():
+        if tarea is actual:
+            continue
+        marcos = [_nombre_marco(frame) for frame in tarea.get_stack(limit=limite_marcos)]
+        tareas.append({"nombre": tarea.get_name(), "coro": getattr(tarea.get_coro(), "__qualname__", repr(tarea.get_coro())), "pila": marcos})
+    return sorted(tareas, key=lambda t: t["nombre"])
+
+
+perfilador = Perfilador()
@@ -2,6 +2,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy import text
 from app.usuario import Usuario
 from app.libro import Libro
+from app.analitica import contador_lecturas
 
 # CLEAN CODE:
 # - Herencia (LSP - Liskov Substitution Principle): `UsuarioPago` es un subtipo de `Usuario` y puede ser usado como tal.
@@ -10,6 +11,8 @@ from app.libro import Libro
 # - Cohesión Alta: Los métodos de la clase están estrechamente relacionados con la gestión de un usuario premium.
 
 class UsuarioPago(Usuario):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         # CLEAN CODE: El constructor es flexible y establece el rol correcto, simplificando la creación de instancias.
         kwargs['rol'] = 2  # El rol para UsuarioPago siempre será 2 (Premium).
@@ -20,7 +23,9 @@ class UsuarioPago(Usuario):
         # CLEAN CODE: Fail-Fast: La validación de rol se realiza al principio del método.
         if self.rol not in [0, 2]:
             return {"error": "Acceso denegado. Función solo para usuarios Premium."}
-        
+
+        # Solo en memoria: la lectura no escribe en la BD (`app/analitica.py`).
+        contador_lecturas.registrar(libro.id_libro)
         return {
             "titulo": libro.titulo,
             "autor": libro.autor,
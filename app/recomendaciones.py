@@ -0,0 +1,387 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import text
+
+# CLEAN CODE:
+# - SRP: Este módulo construye, persiste y sirve los "libros similares" del catálogo.
+# - Rendimiento: La construcción (offline) calcula los top-k vecinos con similitud coseno por lotes;
+#   los workers solo mapean los arreglos en memoria (`mmap`) y cada consulta es O(k).
+# - Dependencias perezosas: numpy se importa al cargar o construir; scipy solo al construir.
+# - Incremental: Los libros creados o actualizados se incorporan con un producto matriz-vector, sin reconstruir.
+# - Divergencia acotada: Esa capa incremental es del worker que atendió la escritura; los demás no la ven.
+#   Cada worker vuelve a mapear el artefacto compartido cuando cambia su `meta.json` (se revisa cada
+#   `RECOMENDACIONES_RECARGA_S`) y reaplica encima sus propios cambios posteriores a la construcción. Así dos
+#   workers difieren a lo sumo en los libros escritos desde la última construcción, y solo hasta la siguiente.
+# - Construcción: `python -m app.recomendaciones` o el trabajo `construir_recomendaciones` leen el catálogo por
+#   lotes y publican el artefacto en `RECOMENDACIONES_DIR`; los workers lo recogen en su siguiente revisión.
+# - Escritura atómica: Cada archivo se escribe aparte y se renombra (`meta.json` al final); un worker que tiene
+#   mapeados los anteriores sigue leyéndolos sin ver un archivo truncado a medio escribir.
+
+RECOMENDACIONES_DIR = os.getenv(
+    "RECOMENDACIONES_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "recomendaciones"),
+)
+RECARGA_S = float(os.getenv("RECOMENDACIONES_RECARGA_S", "300"))
+# Cambios locales que se reaplican tras recargar: los posteriores a la construcción, con este margen por si el
+# reloj de quien construyó no coincide con el del worker (reaplicar uno ya incluido no cambia el resultado).
+MARGEN_RELOJ_S = 300.0
+DIMENSIONES = 1 << 18
+TOP_K = 10
+# Máximo de celdas densas (lote x libros) por bloque de similitudes durante la construcción.
+CELDAS_POR_LOTE = 32_000_000
+
+_TOKEN = re.compile(r"[^\W\d_]{2,}")
+_ARCHIVOS = ("ids", "vecinos", "puntajes", "idf", "datos", "indices", "indptr")
+
+
+def _caracteristica(token: str) -> int:
+    # crc32 es estable entre procesos (a diferencia de `hash`), así todos los workers vectorizan igual.
+    return zlib.crc32(token.encode("utf-8")) & (DIMENSIONES - 1)
+
+
+def caracteristicas(autor: str, categoria: str, sinopsis: str) -> Counter:
+    """
+    Bolsa de características con hashing: palabras de la sinopsis, más la categoría y el autor
+    como tokens propios (con prefijo) para que pesen como señal de similitud.
+    """
+    conteo: Counter = Counter(_caracteristica(t) for t in _TOKEN.findall((sinopsis or "").lower()))
+    if categoria:
+        conteo[_caracteristica(f"categoria:{categoria.strip().lower()}")] += 3
+    if autor:
+        conteo[_caracteristica(f"autor:{autor.strip().lower()}")] += 3
+    return conteo
+
+
+def _vector(conteo: Counter, idf) -> Tuple["np.ndarray", "np.ndarray"]:
+    import numpy as np
+
+    if not conteo:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    indices = np.fromiter(conteo.keys(), dtype=np.int32, count=len(conteo))
+    tf = np.fromiter(conteo.values(), dtype=np.float32, count=len(conteo))
+    valores = (1.0 + np.log(tf)) * idf[indices]
+    norma = float(np.linalg.norm(valores))
+    if norma:
+        valores /= norma
+    orden = np.argsort(indices)
+    return indices[orden], valores[orden].astype(np.float32)
+
+
+# --- Construcción (offline) ---
+
+def construir(libros: Sequence, k: int = TOP_K, directorio: str = RECOMENDACIONES_DIR) -> int:
+    """
+    Vectoriza el catálogo con TF-IDF sobre características con hashing, calcula los top-k vecinos
+    por similitud coseno en lotes y guarda los arreglos en `directorio`. Devuelve el número de libros.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    libros = sorted(libros, key=lambda l: l["id_libro"])
+    n = len(libros)
+    conteos = [caracteristicas(l["autor"], l["categoria"], l["sinopsis"]) for l in libros]
+
+    df = np.zeros(DIMENSIONES, dtype=np.int32)
+    for conteo in conteos:
+        df[list(conteo.keys())] += 1
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    partes_indices, partes_datos = [], []
+    for i, conteo in enumerate(conteos):
+        indices, valores = _vector(conteo, idf)
+        partes_indices.append(indices)
+        partes_datos.append(valores)
+        indptr[i + 1] = indptr[i] + len(indices)
+    indices = np.concatenate(partes_indices) if partes_indices else np.empty(0, dtype=np.int32)
+    datos = np.concatenate(partes_datos) if partes_datos else np.empty(0, dtype=np.float32)
+
+    matriz = sparse.csr_matrix((datos, indices, indptr), shape=(n, DIMENSIONES))
+    transpuesta = matriz.T.tocsc()
+    k = max(1, min(k, n - 1)) if n > 1 else 1
+    vecinos = np.full((n, k), -1, dtype=np.int64)
+    puntajes = np.zeros((n, k), dtype=np.float32)
+    ids = np.fromiter((l["id_libro"] for l in libros), dtype=np.int64, count=n)
+
+    lote = max(1, CELDAS_POR_LOTE // max(n, 1))
+    for inicio in range(0, n, lote):
+        fin = min(n, inicio + lote)
+        bloque = (matriz[inicio:fin] @ transpuesta).toarray().astype(np.float32)
+        bloque[np.arange(fin - inicio), np.arange(inicio, fin)] = -np.inf  # un libro no es similar a sí mismo
+        if n > 1:
+            top = np.argpartition(-bloque, k - 1, axis=1)[:, :k]
+            top_puntajes = np.take_along_axis(bloque, top, axis=1)
+            orden = np.argsort(-top_puntajes, axis=1)
+            top = np.take_along_axis(top, orden, axis=1)
+            vecinos[inicio:fin] = ids[top]
+            puntajes[inicio:fin] = np.take_along_axis(top_puntajes, orden, axis=1)
+
+    os.makedirs(directorio, exist_ok=True)
+    arreglos = {"ids": ids, "vecinos": vecinos, "puntajes": puntajes, "idf": idf,
+                "datos": datos, "indices": indices, "indptr": indptr}
+    for nombre, arreglo in arreglos.items():
+        destino = os.path.join(directorio, f"{nombre}.npy")
+        with open(f"{destino}.tmp", "wb") as f:
+            np.save(f, arreglo)
+        os.replace(f"{destino}.tmp", destino)
+    meta = os.path.join(directorio, "meta.json")
+    with open(f"{meta}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"libros": n, "k": k, "dimensiones": DIMENSIONES,
+                   "construido_en": datetime.now(timezone.utc).isoformat()}, f)
+    os.replace(f"{meta}.tmp", meta)
+    return n
+
+
+async def leer_catalogo(session: AsyncSession, lote: int = 5000) -> List[Dict[str, Any]]:
+    """Lo que `construir` necesita de cada libro, en lotes por id (consultas cortas aun con un catálogo grande)."""
+    query = text(
+        "SELECT id_libro, autor, categoria, sinopsis FROM libro WHERE id_libro > :desde ORDER BY id_libro LIMIT :lote"
+    )
+    libros: List[Dict[str, Any]] = []
+    desde = 0
+    while True:
+        filas = [dict(fila) for fila in (await session.execute(query, {"desde": desde, "lote": lote})).mappings()]
+        if not filas:
+            return libros
+        libros.extend(filas)
+        desde = filas[-1]["id_libro"]
+
+
+def leer_meta(directorio: str = RECOMENDACIONES_DIR) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directorio, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# --- Servicio (workers) ---
+
+class MotorRecomendaciones:
+    """
+    Vecinos precalculados mapeados en memoria, más una capa en RAM con los cambios de este worker
+    (libros nuevos/actualizados y eliminados) hasta la próxima reconstrucción.
+    """
+
+    def __init__(self, directorio: str, meta: Optional[Dict] = None):
+        import numpy as np
+
+        self._np = np
+        self.meta = meta or leer_meta(directorio) or {}
+        arr = {nombre: np.load(os.path.join(directorio, f"{nombre}.npy"), mmap_mode="r") for nombre in _ARCHIVOS}
+        self.ids, self.vecinos, self.puntajes, self.idf = arr["ids"], arr["vecinos"], arr["puntajes"], arr["idf"]
+        self.datos, self.indices, self.indptr = arr["datos"], arr["indices"], arr["indptr"]
+        self.k = self.vecinos.shape[1] if self.vecinos.ndim == 2 else TOP_K
+        self._filas_nnz = None
+        self._overlay: Dict[int, List[Tuple[int, float]]] = {}
+        self._vectores_nuevos: Dict[int, Tuple["np.ndarray", "np.ndarray"]] = {}
+        self._eliminados: set = set()
+
+    def _fila(self, id_libro: int) -> Optional[int]:
+        i = int(self._np.searchsorted(self.ids, id_libro))
+        if i < len(self.ids) and int(self.ids[i]) == id_libro:
+            return i
+        return None
+
+    def similares(self, id_libro: int, k: Optional[int] = None) -> List[Tuple[int, float]]:
+        k = k or self.k
+        if id_libro in self._eliminados:
+            return []
+        candidatos = self._overlay.get(id_libro)
+        if candidatos is None:
+            fila = self._fila(id_libro)
+            if fila is None:
+                return []
+            candidatos = [(int(v), float(p)) for v, p in zip(self.vecinos[fila], self.puntajes[fila]) if v >= 0]
+        return [(v, p) for v, p in candidatos if v not in self._eliminados][:k]
+
+    def _puntajes_base(self, indices, valores):
+        # Producto matriz dispersa x vector con numpy puro: O(nnz), sin scipy en los workers.
+        np = self._np
+        if self._filas_nnz is None:
+            self._filas_nnz = np.repeat(np.arange(len(self.ids), dtype=np.int32), np.diff(self.indptr))
+        q = np.zeros(len(self.idf), dtype=np.float32)
+        q[indices] = valores
+        return np.bincount(self._filas_nnz, weights=self.datos * q[self.indices], minlength=len(self.ids))
+
+    def incorporar(self, id_libro: int, autor: str, categoria: str, sinopsis: str) -> None:
+        np = self._np
+        self._eliminados.discard(id_libro)
+        indices, valores = _vector(caracteristicas(autor, categoria, sinopsis), self.idf)
+        self._vectores_nuevos[id_libro] = (indices, valores)
+
+        puntajes = self._puntajes_base(indices, valores)
+        propia = self._fila(id_libro)
+        if propia is not None:
+            puntajes[propia] = -np.inf  # su vector base quedó obsoleto
+
+        candidatos: Dict[int, float] = {}
+        if len(puntajes):
+            top = np.argpartition(-puntajes, min(self.k, len(puntajes) - 1))[: self.k + 1]
+            candidatos.update({int(self.ids[i]): float(puntajes[i]) for i in top if np.isfinite(puntajes[i])})
+        for otro, (idx, val) in self._vectores_nuevos.items():
+            if otro != id_libro:
+                _, a, b = np.intersect1d(indices, idx, assume_unique=True, return_indices=True)
+                candidatos[otro] = float(np.dot(valores[a], val[b]))
+        candidatos.pop(id_libro, None)
+        self._overlay[id_libro] = sorted(candidatos.items(), key=lambda c: -c[1])[: self.k]
+
+        # Los libros para los que el nuevo entra en su top-k también se actualizan.
+        if not len(self.puntajes):
+            return
+        for fila in np.nonzero(puntajes > self.puntajes[:, -1])[0]:
+            otro = int(self.ids[fila])
+            if otro == id_libro:
+                continue
+            actual = [c for c in self.similares(otro, self.k) if c[0] != id_libro]
+            actual.append((id_libro, float(puntajes[fila])))
+            self._overlay[otro] = sorted(actual, key=lambda c: -c[1])[: self.k]
+
+    def eliminar(self, id_libro: int) -> None:
+        self._eliminados.add(id_libro)
+        self._overlay.pop(id_libro, None)
+        self._vectores_nuevos.pop(id_libro, None)
+
+
+motor: Optional[MotorRecomendaciones] = None
+# Libros escritos en este worker: id -> (momento, (autor, categoria, sinopsis)) o None si se eliminó.
+_cambios: Dict[int, Tuple[float, Optional[Tuple[str, str, str]]]] = {}
+_tarea_recarga: Optional[asyncio.Task] = None
+
+
+def _aplicar(destino: MotorRecomendaciones, id_libro: int, datos: Optional[Tuple[str, str, str]]) -> None:
+    if datos is None:
+        destino.eliminar(id_libro)
+    else:
+        destino.incorporar(id_libro, *datos)
+
+
+def _cambiar_motor(nuevo: MotorRecomendaciones) -> None:
+    # Sin awaits entre reaplicar y reemplazar: ninguna escritura de este worker queda entre medio y se pierde.
+    global motor
+    desde = datetime.fromisoformat(nuevo.meta["construido_en"]).timestamp() - MARGEN_RELOJ_S
+    for id_libro, (momento, datos) in list(_cambios.items()):
+        if momento < desde:
+            del _cambios[id_libro]
+        else:
+            _aplicar(nuevo, id_libro, datos)
+    motor = nuevo
+
+
+class Recomendaciones:
+    # CLEAN CODE: Fachada usada por el arranque, la API y el `Administrador`.
+
+    @staticmethod
+    def cargar(directorio: str = RECOMENDACIONES_DIR) -> int:
+        global motor
+        meta = leer_meta(directorio)
+        if meta is None:
+            return 0
+        motor = MotorRecomendaciones(directorio, meta)
+        return len(motor.ids)
+
+    @staticmethod
+    def iniciar(directorio: str = RECOMENDACIONES_DIR, intervalo_s: float = RECARGA_S) -> None:
+        global _tarea_recarga
+        if intervalo_s > 0:
+            _tarea_recarga = asyncio.create_task(_bucle_recarga(directorio, intervalo_s), name="recarga-recomendaciones")
+
+    @staticmethod
+    async def cerrar() -> None:
+        global _tarea_recarga
+        if _tarea_recarga is None:
+            return
+        _tarea_recarga.cancel()
+        await asyncio.gather(_tarea_recarga, return_exceptions=True)
+        _tarea_recarga = None
+
+    @staticmethod
+    def activo() -> bool:
+        return motor is not None
+
+    @staticmethod
+    async def similares(session: AsyncSession, id_libro: int, k: int = TOP_K) -> List[Dict]:
+        if motor is None:
+            return []
+        vecinos = motor.similares(id_libro, k)
+        if not vecinos:
+            return []
+        # Una sola consulta por clave primaria para los k títulos.
+        query = text("SELECT id_libro, titulo, autor FROM libro WHERE id_libro = ANY(:ids)")
+        filas = {f["id_libro"]: f for f in (await session.execute(query, {"ids": [v for v, _ in vecinos]})).mappings()}
+        return [
+            {"id_libro": v, "titulo": filas[v]["titulo"], "autor": filas[v]["autor"], "puntaje": round(p, 4)}
+            for v, p in vecinos if v in filas
+        ]
+
+    @staticmethod
+    async def sincronizar(session: AsyncSession, id_libro: int) -> None:
+        if motor is None:
+            return
+        query = text("SELECT autor, categoria, sinopsis FROM libro WHERE id_libro = :id")
+        fila = (await session.execute(query, {"id": id_libro})).first()
+        datos = (fila.autor, fila.categoria, fila.sinopsis) if fila else None
+        _cambios[id_libro] = (time.time(), datos)
+        _aplicar(motor, id_libro, datos)
+
+    @staticmethod
+    def eliminar(id_libro: int) -> None:
+        if motor is not None:
+            _cambios[id_libro] = (time.time(), None)
+            motor.eliminar(id_libro)
+
+
+async def _bucle_recarga(directorio: str, intervalo_s: float) -> None:
+    while True:
+        await asyncio.sleep(intervalo_s)
+        try:
+            meta = await asyncio.to_thread(leer_meta, directorio)
+            if meta is None or (motor is not None and meta == motor.meta):
+                continue
+            # Mapear los arreglos (y cargar numpy la primera vez) no debe frenar el event loop.
+            _cambiar_motor(await asyncio.to_thread(MotorRecomendaciones, directorio, meta))
+            print(f"Recomendaciones recargadas desde {os.path.abspath(directorio)} ({len(motor.ids)} libros).")
+        except Exception as e:
+            print(f"No se pudieron recargar las recomendaciones: {e}")
+
+
+# --- Construcción desde la línea de comandos ---
+
+async def _main(args: argparse.Namespace) -> int:
+    from database.connection_db import async_session, engine
+
+    engine.echo = False
+    try:
+        async with async_session() as session:
+            libros = await leer_catalogo(session, args.lote)
+    finally:
+        await engine.dispose()
+    inicio = time.perf_counter()
+    total = construir(libros, args.k, args.directorio)
+    print(
+        f"✅ Recomendaciones de {total} libros en {os.path.abspath(args.directorio)} "
+        f"({time.perf_counter() - inicio:.1f} s); los workers las recargan en menos de {RECARGA_S:g} s."
+    )
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Construye el artefacto de libros similares a partir del catálogo.")
+    parser.add_argument("--k", type=int, default=TOP_K, help="Vecinos guardados por libro.")
+    parser.add_argument("--directorio", default=RECOMENDACIONES_DIR, help="Destino compartido con los workers.")
+    parser.add_argument("--lote", type=int, default=5000, help="Libros por consulta al leer el catálogo.")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+# CLEAN CODE:
+# - SRP: Este módulo mantiene la API de lectura disponible cuando Postgres está lento o caído.
+# - Circuit Breaker: `CircuitoBD` observa cada consulta; si fallan o tardan demasiadas, deja de mandar
+#   tráfico a la BD durante un tiempo y luego la prueba de nuevo (cerrado -> abierto -> semiabierto).
+# - Stale-while-revalidate: `AlmacenLecturas` guarda la última respuesta buena de cada lectura; si está vieja
+#   la sirve igual y la refresca en segundo plano, y si el circuito está abierto es lo único que se sirve.
+# - Disponibilidad sobre frescura: una respuesta de hace un rato es mejor que un 503 en una lectura.
+# - Salvo para quien acaba de escribir: una lectura pegajosa va a la BD mientras el circuito esté cerrado, y una
+#   entrada que incluye datos de otra (una búsqueda incluye el libro y sus reviews) cae cuando se invalida esa otra.
+# - Escrituras por ruta: `escribe_en_bd` marca los endpoints que modifican datos; el método HTTP no basta
+#   (p. ej. la búsqueda es un POST y se sirve desde el almacén).
+
+CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+
+
+class CircuitoAbierto(Exception):
+    def __init__(self, reintentar_en: float):
+        super().__init__("La base de datos no está disponible por ahora.")
+        self.reintentar_en = max(1, int(reintentar_en + 0.999))
+
+
+class CircuitoBD:
+    def __init__(
+        self,
+        ventana_s: float = 30.0,
+        min_muestras: int = 20,
+        umbral_errores: float = 0.5,
+        latencia_lenta_s: float = 1.0,
+        umbral_lentas: float = 0.5,
+        enfriamiento_s: float = 10.0,
+        exitos_para_cerrar: int = 5,
+        reloj: Callable[[], float] = time.monotonic,
+    ):
+        self.ventana_s = ventana_s
+        self.min_muestras = min_muestras
+        self.umbral_errores = umbral_errores
+        self.latencia_lenta_s = latencia_lenta_s
+        self.umbral_lentas = umbral_lentas
+        self.enfriamiento_s = enfriamiento_s
+        self.exitos_para_cerrar = exitos_para_cerrar
+        self._reloj = reloj
+        self.estado = CERRADO
+        self._abierto_hasta = 0.0
+        self._exitos_semiabierto = 0
+        # (instante, falló, fue lenta) de las consultas de la ventana, con sus totales al día.
+        self._muestras: Deque[Tuple[float, bool, bool]] = deque()
+        self._errores = 0
+        self._lentas = 0
+        self.transiciones: Dict[Tuple[str, str], int] = {}
+
+    @classmethod
+    def desde_entorno(cls) -> "CircuitoBD":
+        return cls(
+            ventana_s=float(os.getenv("CIRCUITO_VENTANA_S", "30")),
+            min_muestras=int(os.getenv("CIRCUITO_MIN_MUESTRAS", "20")),
+            umbral_errores=float(os.getenv("CIRCUITO_UMBRAL_ERRORES", "0.5")),
+            latencia_lenta_s=float(os.getenv("CIRCUITO_LATENCIA_LENTA_S", "1.0")),
+            umbral_lentas=float(os.getenv("CIRCUITO_UMBRAL_LENTAS", "0.5")),
+            enfriamiento_s=float(os.getenv("CIRCUITO_ENFRIAMIENTO_S", "10")),
+        )
+
+    def _cambiar(self, nuevo: str) -> None:
+        clave = (self.estado, nuevo)
+        self.transiciones[clave] = self.transiciones.get(clave, 0) + 1
+        print(f"Circuito de la BD: {self.estado} -> {nuevo}")
+        self.estado = nuevo
+
+    def abierto(self) -> bool:
+        # Pasado el enfriamiento se deja pasar tráfico de prueba (semiabierto).
+        if self.estado == ABIERTO and self._reloj() >= self._abierto_hasta:
+            self._exitos_semiabierto = 0
+            self._cambiar(SEMIABIERTO)
+        return self.estado == ABIERTO
+
+    def verificar(self) -> None:
+        """Lanza `CircuitoAbierto` si no se debe ir a la BD en este momento."""
+        if self.abierto():
+            raise CircuitoAbierto(self._abierto_hasta - self._reloj())
+
+    def registrar(self, exito: bool, duracion_s: float) -> None:
+        ahora = self._reloj()
+        lenta = duracion_s >= self.latencia_lenta_s
+        if self.estado == SEMIABIERTO:
+            if not exito or lenta:
+                self._abrir(ahora)
+                return
+            self._exitos_semiabierto += 1
+            if self._exitos_semiabierto >= self.exitos_para_cerrar:
+                self._reiniciar_ventana()
+                self._cambiar(CERRADO)
+            return
+
+        self._muestras.append((ahora, not exito, lenta))
+        self._errores += not exito
+        self._lentas += lenta
+        while self._muestras and self._muestras[0][0] < ahora - self.ventana_s:
+            _, error, vieja_lenta = self._muestras.popleft()
+            self._errores -= error
+            self._lentas -= vieja_lenta
+
+        total = len(self._muestras)
+        if self.estado == CERRADO and total >= self.min_muestras and (
+            self._errores / total >= self.umbral_errores or self._lentas / total >= self.umbral_lentas
+        ):
+            self._abrir(ahora)
+
+    def _abrir(self, ahora: float) -> None:
+        self._abierto_hasta = ahora + self.enfriamiento_s
+        self._reiniciar_ventana()
+        self._cambiar(ABIERTO)
+
+    def _reiniciar_ventana(self) -> None:
+        self._muestras.clear()
+        self._errores = 0
+        self._lentas = 0
+
+
+class _Entrada:
+    __slots__ = ("valor", "guardado_en", "depende_de")
+
+    def __init__(self, valor: Any, guardado_en: float, depende_de: Tuple[Hashable, ...] = ()):
+        self.valor = valor
+        self.guardado_en = guardado_en
+        self.depende_de = depende_de
+
+
+Consulta = Callable[[Any], Awaitable[Any]]
+Dependencias = Callable[[Any], Iterable[Hashable]]
+
+
+def _lectura_pegajosa() -> bool:
+    # Import diferido: `database.connection_db` importa este módulo.
+    from database.connection_db import lectura_pegajosa
+
+    return lectura_pegajosa()
+
+
+class AlmacenLecturas:
+    """
+    Última respuesta buena de cada lectura (LRU acotado). Cada entrada es fresca durante `fresco_s`;
+    después se sigue sirviendo hasta `max_obsoleto_s` mientras se refresca en segundo plano.
+    """
+
+    def __init__(
+        self,
+        circuito: CircuitoBD,
+        fabrica_sesiones: Optional[Callable[[], Any]] = None,
+        capacidad: int = 10_000,
+        fresco_s: float = 5.0,
+        max_obsoleto_s: float = 3600.0,
+        reloj: Callable[[], float] = time.monotonic,
+        directa: Callable[[], bool] = _lectura_pegajosa,
+    ):
+        self.circuito = circuito
+        self.fabrica_sesiones = fabrica_sesiones
+        self.capacidad = capacidad
+        self.fresco_s = fresco_s
+        self.max_obsoleto_s = max_obsoleto_s
+        self._reloj = reloj
+        self.directa = directa
+        self._datos: "OrderedDict[Hashable, _Entrada]" = OrderedDict()
+        # Clave -> entradas que la incluyen (p. ej. ("libro", 7) -> búsquedas que devolvieron ese libro).
+        self._dependientes: Dict[Hashable, Set[Hashable]] = {}
+        self._refrescando: Set[Hashable] = set()
+        self.resultados: Dict[str, int] = {"fresco": 0, "obsoleto": 0, "consulta": 0, "sin_datos": 0}
+
+    @classmethod
+    def desde_entorno(cls, circuito: CircuitoBD) -> "AlmacenLecturas":
+        return cls(
+            circuito,
+            capacidad=int(os.getenv("OBSOLETOS_CAPACIDAD", "10000")),
+            fresco_s=float(os.getenv("OBSOLETOS_FRESCO_S", "5")),
+            max_obsoleto_s=float(os.getenv("OBSOLETOS_MAX_S", "3600")),
+        )
+
+    async def servir(self, clave: Hashable, consulta: Consulta, session: Any, depende_de: Optional[Dependencias] = None) -> Any:
+        """
+        Devuelve la lectura de `clave`; `consulta(session)` solo se ejecuta si no hay un valor utilizable.
+        `depende_de(valor)` da las claves cuyos datos trae el valor: invalidar cualquiera de ellas la invalida.
+        """
+        ahora = self._reloj()
+        entrada = self._datos.get(clave)
+        if entrada is not None and ahora - entrada.guardado_en > self.max_obsoleto_s:
+            self._quitar(clave)
+            entrada = None
+
+        # Quien acaba de escribir lee de la BD: otro worker puede tener guardado un valor anterior a su escritura.
+        if entrada is not None and self.directa() and not self.circuito.abierto():
+            entrada = None
+
+        if entrada is not None:
+            self._datos.move_to_end(clave)
+            if ahora - entrada.guardado_en <= self.fresco_s:
+                self.resultados["fresco"] += 1
+                return entrada.valor
+            self.resultados["obsoleto"] += 1
+            if not self.circuito.abierto():
+                self._refrescar(clave, consulta, depende_de)
+            return entrada.valor
+
+        try:
+            self.circuito.verificar()
+        except CircuitoAbierto:
+            self.resultados["sin_datos"] += 1
+            raise
+        valor = await consulta(session)
+        self.resultados["consulta"] += 1
+        self.guardar(clave, valor, depende_de(valor) if depende_de else ())
+        return valor
+
+    def guardar(self, clave: Hashable, valor: Any, depende_de: Iterable[Hashable] = ()) -> None:
+        self._quitar(clave)
+        entrada = _Entrada(valor, self._reloj(), tuple(depende_de))
+        self._datos[clave] = entrada
+        for otra in entrada.depende_de:
+            self._dependientes.setdefault(otra, set()).add(clave)
+        while len(self._datos) > self.capacidad:
+            self._quitar(next(iter(self._datos)))
+
+    def _quitar(self, clave: Hashable) -> None:
+        entrada = self._datos.pop(clave, None)
+        if entrada is None:
+            return
+        for otra in entrada.depende_de:
+            dependientes = self._dependientes.get(otra)
+            if dependientes is not None:
+                dependientes.discard(clave)
+                if not dependientes:
+                    del self._dependientes[otra]
+
+    def invalidar(self, *claves: Hashable) -> None:
+        # Tras una escritura de este worker; en los demás la entrada deja de ser fresca en `fresco_s`.
+        for clave in claves:
+            self._quitar(clave)
+            for dependiente in self._dependientes.pop(clave, ()):
+                self._quitar(dependiente)
+
+    def _refrescar(self, clave: Hashable, consulta: Consulta, depende_de: Optional[Dependencias] = None) -> None:
+        if clave in self._refrescando:
+            return
+        self._refrescando.add(clave)
+        asyncio.create_task(self._refrescar_en_segundo_plano(clave, consulta, depende_de))
+
+    async def _refrescar_en_segundo_plano(self, clave: Hashable, consulta: Consulta, depende_de: Optional[Dependencias]) -> None:
+        fabrica = self.fabrica_sesiones
+        if fabrica is None:
+            # Import diferido: `database.connection_db` importa este módulo.
+            from database.connection_db import fabrica_sesiones_lectura as fabrica
+        try:
+            async with fabrica() as session:
+                valor = await consulta(session)
+            self.guardar(clave, valor, depende_de(valor) if depende_de else ())
+        except Exception as e:
+            # Se sigue sirviendo el valor anterior; el circuito ya registró el fallo de la BD.
+            print(f"No se pudo refrescar la lectura {clave!r}: {e}")
+        finally:
+            self._refrescando.discard(clave)
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+
+def escribe_en_bd(endpoint: Callable) -> Callable:
+    """Marca un endpoint que modifica la BD: con el circuito abierto se rechaza antes de ejecutarlo."""
+    endpoint.escribe_en_bd = True
+    return endpoint
+
+
+def circuito_habilitado() -> bool:
+    return os.getenv("CIRCUITO_HABILITADO", "1").lower() in ("1", "true", "yes")
+
+
+circuito_bd = CircuitoBD.desde_entorno()
+almacen_lecturas = AlmacenLecturas.desde_entorno(circuito_bd)
+
+
+def invalidar_libro(id_libro: int) -> None:
+    # Arrastra las búsquedas que devolvieron el libro (guardadas con `depende_de`).
+    almacen_lecturas.invalidar(("libro", id_libro), ("libro_completo", id_libro))
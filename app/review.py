@@ -1,10 +1,12 @@
 from typing import Optional, TYPE_CHECKING
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy import text
+from app.difusion import difusor_reviews
 
 if TYPE_CHECKING:
     from app.libro import Libro
     from app.usuario import Usuario
+    from app.cola_reviews import ColaReviews
 
 # CLEAN CODE:
 # - SRP: La clase `Review` se encarga únicamente de representar y gestionar una review.
@@ -13,6 +15,8 @@ if TYPE_CHECKING:
 # - Encapsulación: La lógica para guardar la review en la base de datos está contenida en la clase.
 
 class Review:
+    __slots__ = ("id_review", "comentario", "usuario_id", "libro_id")
+
     def __init__(self, comentario: str, id_review: Optional[int] = None, usuario_id: Optional[int] = None, libro_id: Optional[int] = None):
         # CLEAN CODE: El constructor es simple y solo asigna los valores iniciales.
         self.id_review = id_review
@@ -46,3 +50,12 @@ class Review:
             await session.rollback()
             # CLEAN CODE: El manejo de errores es explícito y proporciona información útil.
             print(f"Error al guardar review en la BD: {e}")
+            return
+        # CLEAN CODE: Solo se avisa a los suscriptores de lo que ya quedó confirmado en la BD.
+        difusor_reviews.publicar_review(self.libro_id, self, usuario.username, usuario.rol)
+
+    async def encolar_review(self, cola: "ColaReviews", usuario: "Usuario", libro: "Libro") -> None:
+        # CLEAN CODE: Variante write-behind de `subir_review`; `id_review` queda en None hasta que se escriba el lote.
+        self.usuario_id = usuario.id_usuario
+        self.libro_id = libro.id_libro
+        await cola.encolar(self.usuario_id, self.libro_id, self.comentario, usuario.username, usuario.rol)
@@ -0,0 +1,210 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, List
+from pydantic import BaseModel, ConfigDict
+
+# CLEAN CODE:
+# - Contratos explícitos: Cada endpoint de la API declara la forma exacta de su respuesta.
+# - Seguridad: Los modelos de salida solo exponen los campos públicos (p. ej. nunca la contraseña).
+# - Rendimiento: `from_attributes` permite validar directamente filas de la BD u objetos de dominio,
+#   sin construir diccionarios intermedios ni pasar por `jsonable_encoder`.
+
+
+class RespuestaBase(BaseModel):
+    # CLEAN CODE: Configuración común para mapear filas (`Row`/`RowMapping`) y objetos de dominio.
+    model_config = ConfigDict(from_attributes=True)
+
+
+# --- Usuario ---
+
+class UsuarioOut(RespuestaBase):
+    id_usuario: int
+    rol: int
+    username: str
+    email_usuario: str
+    activo: bool
+    mes_suscripcion: Optional[int] = 0
+
+
+class EstadoUsuarioOut(RespuestaBase):
+    id_usuario: int
+    activo: bool
+
+
+class UsernameOut(RespuestaBase):
+    username: str
+
+
+class ContrasenaOut(RespuestaBase):
+    contrasena_actualizada: bool
+
+
+# --- Libro ---
+
+class ReviewOut(RespuestaBase):
+    username: str
+    comentario: str
+
+
+class LibroOut(RespuestaBase):
+    id_libro: int
+    titulo: str
+    autor: str
+    categoria: str
+    anio_publicacion: int
+    sinopsis: str
+
+
+class LibroConReviewsOut(LibroOut):
+    reviews: List[ReviewOut] = []
+
+
+class LibroSimilarOut(RespuestaBase):
+    id_libro: int
+    titulo: str
+    autor: str
+    puntaje: float
+
+
+class LibroPopularOut(RespuestaBase):
+    id_libro: int
+    titulo: str
+    autor: str
+    lecturas: int
+    puntaje: float
+
+
+class PopularesOut(RespuestaBase):
+    lista: str
+    # Instante (epoch) del último cálculo; None si aún no se calculó en este worker.
+    calculado_en: Optional[float] = None
+    libros: List[LibroPopularOut]
+
+
+class ResultadoContenidoOut(RespuestaBase):
+    id_libro: int
+    titulo: str
+    autor: str
+    rango: float
+    fragmento: str
+
+
+class PaginaContenidoOut(RespuestaBase):
+    pagina: int
+    por_pagina: int
+    hay_mas: bool
+    resultados: List[ResultadoContenidoOut]
+
+
+class LibroResumenOut(RespuestaBase):
+    id_libro: int
+    titulo: str
+    autor: str
+    categoria: str
+    anio_publicacion: int
+
+
+class ConteoCategoriaOut(RespuestaBase):
+    valor: str
+    total: int
+
+
+class ConteoAnioOut(RespuestaBase):
+    valor: int
+    total: int
+
+
+class FacetasOut(RespuestaBase):
+    total: int
+    categoria: List[ConteoCategoriaOut]
+    anio_publicacion: List[ConteoAnioOut]
+
+
+class PaginaCatalogoOut(RespuestaBase):
+    # `siguiente` es el cursor de la próxima página (None en la última); `facetas` solo si se pidieron.
+    libros: List[LibroResumenOut]
+    siguiente: Optional[str] = None
+    facetas: Optional[FacetasOut] = None
+
+
+class SugerenciaOut(RespuestaBase):
+    campo: str
+    valor: str
+    id_libro: Optional[int] = None
+    popularidad: int
+
+
+class SugerenciasOut(RespuestaBase):
+    # `q` se devuelve tal cual para que el cliente descarte respuestas de teclas anteriores.
+    q: str
+    sugerencias: List[SugerenciaOut]
+
+
+class BusquedaVaciaOut(RespuestaBase):
+    resultado: str
+
+
+class FragmentoOut(RespuestaBase):
+    titulo: str
+    autor: str
+    fragmento: str
+
+
+class LibroCompletoOut(RespuestaBase):
+    titulo: str
+    autor: str
+    contenido: str
+
+
+# --- Trabajos en segundo plano ---
+
+class TrabajoOut(RespuestaBase):
+    id_trabajo: int
+    tipo: str
+    estado: str
+    parametros: str
+    procesados: int
+    total: Optional[int] = None
+    resultado: Optional[str] = None
+    error: Optional[str] = None
+    cancelacion_solicitada: bool
+    creado_por: Optional[int] = None
+    creado_en: datetime
+    iniciado_en: Optional[datetime] = None
+    terminado_en: Optional[datetime] = None
+    propietario: Optional[str] = None
+    latido_en: Optional[datetime] = None
+
+
+# --- Suscripción y mensajes genéricos ---
+
+class EstadoSuscripcionOut(RespuestaBase):
+    estado: str
+    mes_suscripcion: Optional[int] = None
+
+
+class MensajeOut(RespuestaBase):
+    mensaje: str
+
+
+class ResultadoOut(RespuestaBase):
+    # CLEAN CODE: Para operaciones que responden con un mensaje de éxito o con un error.
+    mensaje: Optional[str] = None
+    error: Optional[str] = None
+
+
+class EventoAuditoriaOut(RespuestaBase):
+    id_evento: int
+    ocurrido_en: datetime
+    actor_id: Optional[int] = None
+    actor: str
+    accion: str
+    objetivo_tipo: str
+    objetivo_id: Optional[int] = None
+    cambios: Dict[str, Any]
+
+
+class PaginaAuditoriaOut(RespuestaBase):
+    eventos: List[EventoAuditoriaOut]
+    siguiente: Optional[str] = None
+    # Eventos que este worker descartó por buffer lleno desde su arranque (también quedan anotados en la tabla).
+    descartados: int
@@ -0,0 +1,125 @@
+"""
+Servidor de producción: gunicorn administra los procesos y cada worker corre uvicorn (uvloop + httptools).
+
+    python -m app.servidor
+
+Todo se ajusta por variables de entorno: WEB_CONCURRENCY, PORT/BIND, BACKLOG, KEEPALIVE_S, MAX_REQUESTS,
+MAX_REQUESTS_JITTER, GRACEFUL_TIMEOUT_S, WORKER_TIMEOUT_S y ACCESS_LOG.
+
+La app no guarda sesiones en el proceso: el usuario viaja en una cookie firmada (`app/sesion.py`) y la lectura
+pegajosa en otra, así que cualquier worker atiende a cualquier cliente. Lo que queda por proceso son cachés e
+índices que convergen solos (fragmentos, búsqueda, autocompletado, recomendaciones, almacén de lecturas) y los
+suscriptores SSE, que reciben las reviews publicadas en su propio worker (ver `app/difusion.py`).
+"""
+import multiprocessing
+import os
+import secrets
+import sys
+from typing import Any, Dict
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+# CLEAN CODE:
+# - SRP: Este módulo solo arranca `main:app` en producción; la app no sabe cuántos procesos la ejecutan.
+# - Un motor por worker: La app se importa después del fork (`preload_app=False`), así cada worker crea su
+#   engine y su pool. Si alguien activa la precarga, `post_fork` descarta las conexiones heredadas del padre.
+# - Reciclaje: Tras `MAX_REQUESTS` (± jitter, para que no reinicien todos a la vez) el worker termina sus
+#   peticiones en curso y gunicorn lo reemplaza; acota fugas de memoria sin cortar tráfico ni sesiones.
+# - Secreto compartido: Todos los workers firman las cookies de sesión con el mismo `SESION_SECRETO`.
+
+
+def cpus_disponibles() -> int:
+    # Respeta el límite de CPUs del contenedor/cgroup cuando el sistema lo expone.
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def workers_por_defecto() -> int:
+    # (2 × CPU) + 1: mientras un worker espera a la BD, otro usa el núcleo.
+    return 2 * cpus_disponibles() + 1
+
+
+def _disponible(modulo: str) -> bool:
+    try:
+        __import__(modulo)
+        return True
+    except ImportError:
+        return False
+
+
+class TrabajadorUvicorn(UvicornWorker):
+    # Sin uvloop/httptools (p. ej. en Windows) se usan asyncio y h11, igual que el uvicorn por defecto.
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if _disponible("uvloop") else "asyncio",
+        "http": "httptools" if _disponible("httptools") else "h11",
+        "lifespan": "on",
+        "server_header": False,
+    }
+
+
+def post_fork(server, worker) -> None:
+    if "database.connection_db" in sys.modules:
+        from database.connection_db import descartar_pools_heredados
+
+        descartar_pools_heredados()
+
+
+def opciones_desde_entorno() -> Dict[str, Any]:
+    return {
+        "bind": os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}"),
+        "workers": int(os.getenv("WEB_CONCURRENCY", workers_por_defecto())),
+        "worker_class": TrabajadorUvicorn,
+        # Conexiones en espera de accept(): absorbe ráfagas sin que el kernel rechace clientes.
+        "backlog": int(os.getenv("BACKLOG", "2048")),
+        # Mayor que el tiempo de inactividad del proxy de enfrente, para que sea él quien cierre primero.
+        "keepalive": int(os.getenv("KEEPALIVE_S", "75")),
+        "max_requests": int(os.getenv("MAX_REQUESTS", "10000")),
+        "max_requests_jitter": int(os.getenv("MAX_REQUESTS_JITTER", "1000")),
+        "graceful_timeout": int(os.getenv("GRACEFUL_TIMEOUT_S", "30")),
+        "timeout": int(os.getenv("WORKER_TIMEOUT_S", "60")),
+        "preload_app": False,
+        "post_fork": post_fork,
+        # El latido de los workers en tmpfs: en contenedores /tmp puede estar en disco y bloquearse.
+        "worker_tmp_dir": "/dev/shm" if os.path.isdir("/dev/shm") else None,
+        "accesslog": "-" if os.getenv("ACCESS_LOG", "0").lower() in ("1", "true", "yes") else None,
+        "errorlog": "-",
+    }
+
+
+class ServidorBiblioteca(BaseApplication):
+    def __init__(self, opciones: Dict[str, Any]):
+        self.opciones = opciones
+        super().__init__()
+
+    def load_config(self) -> None:
+        for clave, valor in self.opciones.items():
+            if valor is not None and clave in self.cfg.settings:
+                self.cfg.set(clave, valor)
+
+    def load(self):
+        # Se ejecuta en cada worker, después del fork.
+        from main import app
+
+        return app
+
+
+def main() -> None:
+    # Sin el eco de SQLAlchemy: en producción escribiría cada sentencia al log.
+    os.environ.setdefault("SQL_ECHO", "0")
+    # Antes del fork, para que los workers (y los que los reemplazan) validen las cookies de los demás. Sin
+    # SESION_SECRETO en el entorno las sesiones no sobreviven a un reinicio del servidor.
+    os.environ.setdefault("SESION_SECRETO", secrets.token_urlsafe(32))
+    opciones = opciones_desde_entorno()
+    conexiones = int(os.getenv("POOL_SIZE", "5")) + int(os.getenv("MAX_OVERFLOW", "10"))
+    print(
+        f"🚀 {opciones['workers']} workers en {opciones['bind']} "
+        f"({TrabajadorUvicorn.CONFIG_KWARGS['loop']} + {TrabajadorUvicorn.CONFIG_KWARGS['http']}); "
+        f"hasta {opciones['workers'] * conexiones} conexiones al primario."
+    )
+    ServidorBiblioteca(opciones).run()
+
+
+if __name__ == "__main__":
+    main()
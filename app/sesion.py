@@ -0,0 +1,119 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from contextvars import ContextVar
+from typing import Optional
+from app.usuario import Usuario
+
+# CLEAN CODE:
+# - SRP: Este módulo guarda quién inició sesión, en una cookie firmada, y lo expone a la petición en curso.
+# - Sin estado en el proceso: La cookie lleva el usuario (sin contraseña) firmado con HMAC-SHA256; cualquier worker
+#   o instancia que comparta `SESION_SECRETO` la valida sin consultar la BD ni memoria compartida.
+# - Por petición: Un middleware de main.py deja la `SesionPeticion` en un ContextVar; los endpoints la leen con
+#   `usuario_actual()`. Si el endpoint inicia, cierra o cambia la sesión (p. ej. un username nuevo), el middleware
+#   vuelve a emitir o borra la cookie en la respuesta.
+# - Vigencia: La cookie caduca a las `SESION_DURACION_S`; igual que antes, un cambio de rol hecho por un
+#   administrador se ve en el siguiente inicio de sesión.
+
+COOKIE_SESION = "sesion"
+SESION_DURACION_S = int(os.getenv("SESION_DURACION_S", str(8 * 3600)))
+COOKIE_SEGURA = os.getenv("SESION_COOKIE_SEGURA", "0").lower() in ("1", "true", "yes")
+
+
+def _secreto() -> bytes:
+    secreto = os.getenv("SESION_SECRETO")
+    if not secreto:
+        # `app/servidor.py` fija uno antes del fork, compartido por sus workers. Con uvicorn suelto se genera aquí:
+        # las sesiones no sobreviven al reinicio ni se comparten con otros procesos.
+        print("⚠️ SESION_SECRETO no está definida: las sesiones solo valen en este proceso.")
+        secreto = secrets.token_urlsafe(32)
+    return secreto.encode()
+
+
+SECRETO = _secreto()
+
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).decode().rstrip("=")
+
+
+def _desde_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _firma(carga: str) -> str:
+    return _b64(hmac.new(SECRETO, carga.encode(), hashlib.sha256).digest())
+
+
+def emitir(usuario: Usuario, ahora: Optional[float] = None) -> str:
+    datos = {campo: getattr(usuario, campo) for campo in Usuario.__slots__ if campo != "password"}
+    datos["expira"] = int((ahora if ahora is not None else time.time()) + SESION_DURACION_S)
+    carga = _b64(json.dumps(datos, separators=(",", ":")).encode())
+    return f"{carga}.{_firma(carga)}"
+
+
+def leer(valor: Optional[str], ahora: Optional[float] = None) -> Optional[Usuario]:
+    """Usuario de una cookie válida y vigente; None si falta, está alterada o caducó."""
+    if not valor or "." not in valor:
+        return None
+    carga, firma = valor.rsplit(".", 1)
+    if not hmac.compare_digest(firma, _firma(carga)):
+        return None
+    try:
+        datos = json.loads(_desde_b64(carga))
+        if datos.pop("expira") < (ahora if ahora is not None else time.time()):
+            return None
+        return Usuario(password="", **datos)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class SesionPeticion:
+    __slots__ = ("usuario", "_inicial")
+
+    def __init__(self, usuario: Optional[Usuario] = None):
+        self.usuario = usuario
+        self._inicial = usuario.como_dict() if usuario is not None else None
+
+    @classmethod
+    def desde_cookie(cls, valor: Optional[str]) -> "SesionPeticion":
+        return cls(leer(valor))
+
+    def cambio(self) -> bool:
+        actual = self.usuario.como_dict() if self.usuario is not None else None
+        return actual != self._inicial
+
+
+sesion_peticion: ContextVar[Optional[SesionPeticion]] = ContextVar("sesion_peticion", default=None)
+
+
+def usuario_actual() -> Optional[Usuario]:
+    sesion = sesion_peticion.get()
+    return sesion.usuario if sesion is not None else None
+
+
+def iniciar_sesion(usuario: Optional[Usuario]) -> None:
+    sesion = sesion_peticion.get()
+    if sesion is not None:
+        sesion.usuario = usuario
+
+
+def cerrar_sesion() -> None:
+    iniciar_sesion(None)
+
+
+def aplicar_cookie(response, sesion: SesionPeticion) -> None:
+    """Refleja en la respuesta lo que la petición hizo con la sesión (nada si no cambió)."""
+    if not sesion.cambio():
+        return
+    if sesion.usuario is None:
+        response.delete_cookie(COOKIE_SESION)
+    else:
+        response.set_cookie(
+            COOKIE_SESION, emitir(sesion.usuario), max_age=SESION_DURACION_S,
+            httponly=True, samesite="lax", secure=COOKIE_SEGURA,
+        )
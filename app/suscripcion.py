@@ -13,6 +13,8 @@ if TYPE_CHECKING:
 # - Manejo de Errores: El código maneja explícitamente los casos de error y devuelve mensajes claros.
 
 class Suscripcion:
+    __slots__ = ("id_suscripcion", "usuario_id", "mes_inicio", "mes_fin", "tarifa")
+
     def __init__(self, id_suscripcion: int, usuario_id: int, mes_inicio: int, mes_fin: int, tarifa: int):
         # CLEAN CODE: El constructor es simple y solo asigna valores.
         self.id_suscripcion = id_suscripcion
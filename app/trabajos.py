@@ -0,0 +1,442 @@
+import asyncio
+import csv
+import json
+import os
+import secrets
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import text
+from sqlmodel import Field, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.autocompletar import Autocompletar
+from app.busqueda import IndiceLibros
+from app.catalogo import Catalogo
+from app.fragmento import Fragmentos
+from app.recomendaciones import TOP_K, Recomendaciones, construir, leer_catalogo
+
+# CLEAN CODE:
+# - SRP: Este módulo ejecuta en segundo plano las tareas largas de administración y guarda su estado en `trabajo`.
+# - OCP: Un tipo de trabajo nuevo es una función async registrada con `@tipo_trabajo("nombre")`.
+# - Recursos acotados: Como máximo `max_concurrentes` trabajos a la vez por worker; cada paso abre y cierra
+#   su propia sesión, así ningún trabajo retiene una conexión del pool durante minutos.
+# - Cancelación cooperativa: El pedido se guarda en la BD y el trabajo lo ve al reportar progreso,
+#   aunque lo esté ejecutando otro worker.
+# - Reconciliación: Un trabajo vive en la tarea del proceso que lo recibió, que firma su fila (`propietario`) y
+#   renueva `latido_en` cada `LATIDO_S`. Si el proceso muere sin pasar por `cerrar` (OOM, kill), el latido se
+#   detiene y `reconciliar`, que corre en cada worker al arrancar y en cada latido, marca `interrumpido` solo lo
+#   que lleva más de `LATIDO_VENCIDO_S` sin latir; los trabajos vivos de otros workers no se tocan.
+# - Sin I/O bloqueante en el event loop: Los archivos CSV se leen y escriben con `asyncio.to_thread`.
+
+PENDIENTE, EN_CURSO, COMPLETADO, FALLIDO, CANCELADO, INTERRUMPIDO = (
+    "pendiente", "en_curso", "completado", "fallido", "cancelado", "interrumpido"
+)
+ESTADOS_FINALES = (COMPLETADO, FALLIDO, CANCELADO, INTERRUMPIDO)
+
+DIRECTORIO_IMPORTACION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database")
+DIRECTORIO_EXPORTACION = os.getenv(
+    "TRABAJOS_DIRECTORIO_EXPORTACION",
+    os.path.join(os.path.dirname(__file__), "..", "data", "exportaciones"),
+)
+COLUMNAS_LIBRO = ("id_libro", "titulo", "autor", "categoria", "anio_publicacion", "sinopsis")
+
+
+class Trabajo(SQLModel, table=True):
+    """Registro persistente de un trabajo en segundo plano y de su progreso."""
+    __tablename__ = "trabajo"
+
+    id_trabajo: Optional[int] = Field(default=None, primary_key=True)
+    tipo: str = Field(index=True)
+    estado: str = Field(default=PENDIENTE, index=True)
+    parametros: str = Field(default="{}")
+    procesados: int = Field(default=0)
+    total: Optional[int] = None
+    resultado: Optional[str] = None
+    error: Optional[str] = None
+    cancelacion_solicitada: bool = Field(default=False)
+    creado_por: Optional[int] = None
+    creado_en: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    iniciado_en: Optional[datetime] = None
+    terminado_en: Optional[datetime] = None
+    # Proceso que lo ejecuta (host:pid:arranque) y su último latido; sin latido reciente, el trabajo está huérfano.
+    propietario: Optional[str] = None
+    latido_en: Optional[datetime] = None
+
+
+class TrabajoCancelado(Exception):
+    """Se pidió cancelar el trabajo; lo lanza `ContextoTrabajo.avanzar`."""
+
+
+class TipoTrabajoDesconocido(Exception):
+    pass
+
+
+class ColaTrabajosLlena(Exception):
+    """El worker ya tiene demasiados trabajos pendientes."""
+
+
+FuncionTrabajo = Callable[["ContextoTrabajo"], Awaitable[Any]]
+TIPOS_TRABAJO: Dict[str, FuncionTrabajo] = {}
+
+
+def tipo_trabajo(nombre: str) -> Callable[[FuncionTrabajo], FuncionTrabajo]:
+    def registrar(funcion: FuncionTrabajo) -> FuncionTrabajo:
+        TIPOS_TRABAJO[nombre] = funcion
+        return funcion
+    return registrar
+
+
+class ContextoTrabajo:
+    # CLEAN CODE: Lo único que ve una función de trabajo: sus parámetros, quién lo pidió, sesiones y progreso.
+    INTERVALO_PROGRESO_S = 0.5
+
+    def __init__(self, ejecutor: "EjecutorTrabajos", id_trabajo: int, parametros: Dict[str, Any], usuario: Any):
+        self.id_trabajo = id_trabajo
+        self.parametros = parametros
+        self.usuario = usuario
+        self._ejecutor = ejecutor
+        self._ultimo_reporte = 0.0
+
+    def sesion(self) -> AsyncSession:
+        return self._ejecutor.fabrica_sesiones()
+
+    async def avanzar(self, procesados: int, total: Optional[int] = None, forzar: bool = False) -> None:
+        """Guarda el progreso (como mucho cada `INTERVALO_PROGRESO_S`) y lanza `TrabajoCancelado` si se pidió."""
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultimo_reporte < self.INTERVALO_PROGRESO_S:
+            return
+        self._ultimo_reporte = ahora
+        async with self.sesion() as session:
+            query = text(
+                "UPDATE trabajo SET procesados = :procesados, total = COALESCE(:total, total) "
+                "WHERE id_trabajo = :id RETURNING cancelacion_solicitada"
+            )
+            cancelar = (await session.execute(query, {"id": self.id_trabajo, "procesados": procesados, "total": total})).scalar_one()
+            await session.commit()
+        if cancelar:
+            raise TrabajoCancelado()
+
+
+def propietario_de_este_proceso() -> str:
+    # El sufijo aleatorio distingue arranques: en un contenedor el pid (a menudo 1) se repite tras reiniciar.
+    return f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+
+class EjecutorTrabajos:
+    def __init__(self, fabrica_sesiones: Callable[[], AsyncSession], max_concurrentes: int = 2, max_pendientes: int = 100,
+                 latido_s: float = 15.0, latido_vencido_s: float = 60.0):
+        self.fabrica_sesiones = fabrica_sesiones
+        self.max_pendientes = max_pendientes
+        self.latido_s = latido_s
+        self.latido_vencido_s = latido_vencido_s
+        self.propietario = propietario_de_este_proceso()
+        self._semaforo = asyncio.Semaphore(max_concurrentes)
+        self._tareas: Dict[int, asyncio.Task] = {}
+        self._estado_al_cancelar = CANCELADO
+        self._latidos: Optional[asyncio.Task] = None
+
+    @classmethod
+    def desde_entorno(cls, fabrica_sesiones: Callable[[], AsyncSession]) -> "EjecutorTrabajos":
+        return cls(
+            fabrica_sesiones,
+            max_concurrentes=int(os.getenv("TRABAJOS_CONCURRENTES", "2")),
+            max_pendientes=int(os.getenv("TRABAJOS_PENDIENTES", "100")),
+            latido_s=float(os.getenv("TRABAJOS_LATIDO_S", "15")),
+            latido_vencido_s=float(os.getenv("TRABAJOS_LATIDO_VENCIDO_S", "60")),
+        )
+
+    def iniciar(self) -> None:
+        if self._latidos is None:
+            self._latidos = asyncio.create_task(self._latir(), name="trabajos-latido")
+
+    async def _latir(self) -> None:
+        while True:
+            await asyncio.sleep(self.latido_s)
+            try:
+                if self._tareas:
+                    async with self.fabrica_sesiones() as session:
+                        await session.execute(
+                            text("UPDATE trabajo SET latido_en = now() WHERE id_trabajo = ANY(:ids) AND propietario = :yo"),
+                            {"ids": list(self._tareas), "yo": self.propietario},
+                        )
+                        await session.commit()
+                interrumpidos = await self.reconciliar()
+                if interrumpidos:
+                    print(f"{interrumpidos} trabajos de un worker que dejó de latir se marcaron como interrumpidos.")
+            except Exception as e:
+                # Sin BD no hay latido; al volver, lo que siga vivo late antes de vencer.
+                print(f"No se pudo registrar el latido de los trabajos: {e}")
+
+    async def enviar(self, tipo: str, parametros: Dict[str, Any], usuario: Any) -> Dict[str, Any]:
+        """Registra el trabajo y lo deja corriendo; devuelve su registro sin esperar a que termine."""
+        if tipo not in TIPOS_TRABAJO:
+            raise TipoTrabajoDesconocido(f"Tipo de trabajo desconocido: {tipo}")
+        if len(self._tareas) >= self.max_pendientes:
+            raise ColaTrabajosLlena("Hay demasiados trabajos pendientes en este worker.")
+
+        async with self.fabrica_sesiones() as session:
+            query = text(
+                "INSERT INTO trabajo (tipo, estado, parametros, procesados, cancelacion_solicitada, creado_por, creado_en, "
+                "propietario, latido_en) "
+                "VALUES (:tipo, :estado, :parametros, 0, false, :creado_por, now(), :propietario, now()) RETURNING *"
+            )
+            fila = (await session.execute(query, {
+                "tipo": tipo,
+                "estado": PENDIENTE,
+                "parametros": json.dumps(parametros),
+                "creado_por": getattr(usuario, "id_admin", None),
+                "propietario": self.propietario,
+            })).mappings().one()
+            await session.commit()
+
+        contexto = ContextoTrabajo(self, fila["id_trabajo"], parametros, usuario)
+        tarea = asyncio.create_task(self._ejecutar(tipo, contexto), name=f"trabajo-{fila['id_trabajo']}")
+        self._tareas[fila["id_trabajo"]] = tarea
+        tarea.add_done_callback(lambda _: self._tareas.pop(contexto.id_trabajo, None))
+        return dict(fila)
+
+    async def _ejecutar(self, tipo: str, contexto: ContextoTrabajo) -> None:
+        try:
+            async with self._semaforo:
+                if await self._marcar(contexto.id_trabajo, EN_CURSO, inicio=True) is False:
+                    return
+                resultado = await TIPOS_TRABAJO[tipo](contexto)
+            await self._marcar(contexto.id_trabajo, COMPLETADO, resultado=json.dumps(resultado, default=str))
+        except TrabajoCancelado:
+            await self._marcar(contexto.id_trabajo, CANCELADO)
+        except asyncio.CancelledError:
+            # Cancelado en este worker (endpoint de cancelación o apagado); se registra y termina.
+            await asyncio.shield(self._marcar(contexto.id_trabajo, self._estado_al_cancelar))
+        except Exception as e:
+            print(f"Error en el trabajo {contexto.id_trabajo} ({tipo}): {e}")
+            await self._marcar(contexto.id_trabajo, FALLIDO, error=str(e))
+
+    async def _marcar(self, id_trabajo: int, estado: str, inicio: bool = False,
+                      resultado: Optional[str] = None, error: Optional[str] = None) -> bool:
+        async with self.fabrica_sesiones() as session:
+            if inicio:
+                # Si lo cancelaron mientras esperaba turno, no llega a empezar.
+                query = text(
+                    "UPDATE trabajo SET estado = :estado, iniciado_en = now() "
+                    "WHERE id_trabajo = :id AND NOT cancelacion_solicitada RETURNING id_trabajo"
+                )
+                empezo = (await session.execute(query, {"id": id_trabajo, "estado": estado})).first() is not None
+                if not empezo:
+                    await session.execute(
+                        text("UPDATE trabajo SET estado = :estado, terminado_en = now() WHERE id_trabajo = :id"),
+                        {"id": id_trabajo, "estado": CANCELADO},
+                    )
+                await session.commit()
+                return empezo
+            query = text(
+                "UPDATE trabajo SET estado = :estado, resultado = :resultado, error = :error, terminado_en = now() "
+                "WHERE id_trabajo = :id"
+            )
+            await session.execute(query, {"id": id_trabajo, "estado": estado, "resultado": resultado, "error": error})
+            await session.commit()
+            return True
+
+    async def reconciliar(self) -> int:
+        """
+        Marca `interrumpido` lo pendiente o en curso cuyo proceso ya no late (o que es anterior a los latidos).
+        Los trabajos de este proceso nunca se tocan, aunque su latido se haya atrasado.
+        """
+        async with self.fabrica_sesiones() as session:
+            query = text(
+                "UPDATE trabajo SET estado = :estado, terminado_en = now(), "
+                "error = COALESCE(error, 'El proceso que lo ejecutaba terminó antes de acabarlo.') "
+                "WHERE estado = ANY(:activos) AND propietario IS DISTINCT FROM :yo "
+                "AND (latido_en IS NULL OR latido_en < now() - make_interval(secs => :vencido)) RETURNING id_trabajo"
+            )
+            interrumpidos = (await session.execute(query, {
+                "estado": INTERRUMPIDO,
+                "activos": [PENDIENTE, EN_CURSO],
+                "yo": self.propietario,
+                "vencido": self.latido_vencido_s,
+            })).all()
+            await session.commit()
+        return len(interrumpidos)
+
+    async def cancelar(self, id_trabajo: int) -> Optional[Dict[str, Any]]:
+        async with self.fabrica_sesiones() as session:
+            query = text(
+                "UPDATE trabajo SET cancelacion_solicitada = true WHERE id_trabajo = :id "
+                "AND NOT (estado = ANY(:finales)) RETURNING id_trabajo"
+            )
+            marcado = (await session.execute(query, {"id": id_trabajo, "finales": list(ESTADOS_FINALES)})).first()
+            await session.commit()
+        tarea = self._tareas.get(id_trabajo)
+        if marcado and tarea is not None:
+            tarea.cancel()
+        return await self.consultar(id_trabajo)
+
+    async def consultar(self, id_trabajo: int) -> Optional[Dict[str, Any]]:
+        async with self.fabrica_sesiones() as session:
+            fila = (await session.execute(text("SELECT * FROM trabajo WHERE id_trabajo = :id"), {"id": id_trabajo})).mappings().first()
+        return dict(fila) if fila else None
+
+    async def listar(self, estado: Optional[str] = None, limite: int = 50) -> List[Dict[str, Any]]:
+        filtro = "WHERE estado = :estado " if estado else ""
+        query = text(f"SELECT * FROM trabajo {filtro}ORDER BY id_trabajo DESC LIMIT :limite")
+        async with self.fabrica_sesiones() as session:
+            filas = (await session.execute(query, {"estado": estado, "limite": limite})).mappings().all()
+        return [dict(fila) for fila in filas]
+
+    async def cerrar(self) -> None:
+        # CLEAN CODE: Al apagar no se espera a trabajos de minutos; quedan registrados como interrumpidos.
+        self._estado_al_cancelar = INTERRUMPIDO
+        if self._latidos is not None:
+            self._latidos.cancel()
+            await asyncio.gather(self._latidos, return_exceptions=True)
+            self._latidos = None
+        tareas = list(self._tareas.values())
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+
+# --- Tipos de trabajo ---
+
+@tipo_trabajo("eliminar_usuarios")
+async def _eliminar_usuarios(ctx: ContextoTrabajo) -> Dict[str, Any]:
+    # Misma operación que el endpoint (memento + DELETE), un usuario por transacción.
+    ids: List[int] = [int(i) for i in ctx.parametros.get("ids", [])]
+    eliminados, fallidos = 0, []
+    await ctx.avanzar(0, len(ids), forzar=True)
+    for n, id_usuario in enumerate(ids, start=1):
+        async with ctx.sesion() as session:
+            if await ctx.usuario.eliminar_usuario(session, id_usuario):
+                eliminados += 1
+            else:
+                fallidos.append(id_usuario)
+        await ctx.avanzar(n)
+    await ctx.avanzar(len(ids), forzar=True)
+    return {"eliminados": eliminados, "fallidos": fallidos}
+
+
+def _leer_libros(ruta: str) -> List[Dict[str, Any]]:
+    with open(ruta, newline="", encoding="utf-8") as csvfile:
+        filas = list(csv.DictReader(csvfile))
+    for fila in filas:
+        fila["id_libro"] = int(fila["id_libro"])
+        fila["anio_publicacion"] = int(fila["anio_publicacion"])
+    return filas
+
+
+def _escribir_libros(ruta: str, filas: List[Dict[str, Any]], encabezado: bool) -> None:
+    with open(ruta, "w" if encabezado else "a", newline="", encoding="utf-8") as csvfile:
+        escritor = csv.DictWriter(csvfile, fieldnames=COLUMNAS_LIBRO)
+        if encabezado:
+            escritor.writeheader()
+        escritor.writerows(filas)
+
+
+@tipo_trabajo("importar_libros")
+async def _importar_libros(ctx: ContextoTrabajo) -> Dict[str, Any]:
+    # Versión asíncrona de `database/libros_to_db.py`: idempotente (upsert por id) y en lotes.
+    archivo = os.path.basename(ctx.parametros.get("archivo", "libros.csv"))
+    tamano_lote = int(ctx.parametros.get("tamano_lote", 500))
+    filas = await asyncio.to_thread(_leer_libros, os.path.join(DIRECTORIO_IMPORTACION, archivo))
+
+    query = text(
+        "INSERT INTO libro (id_libro, titulo, autor, categoria, anio_publicacion, sinopsis) "
+        "VALUES (:id_libro, :titulo, :autor, :categoria, :anio_publicacion, :sinopsis) "
+        "ON CONFLICT (id_libro) DO UPDATE SET titulo = EXCLUDED.titulo, autor = EXCLUDED.autor, "
+        "categoria = EXCLUDED.categoria, anio_publicacion = EXCLUDED.anio_publicacion, sinopsis = EXCLUDED.sinopsis"
+    )
+    await ctx.avanzar(0, len(filas), forzar=True)
+    for inicio in range(0, len(filas), tamano_lote):
+        lote = filas[inicio:inicio + tamano_lote]
+        # Facetas: sale la combinación que tenía cada libro existente y entra la del CSV (la última si el id se repite).
+        nuevas = {fila["id_libro"]: (fila["categoria"], fila["anio_publicacion"]) for fila in lote}
+        async with ctx.sesion() as session:
+            anteriores = await Catalogo.facetas_de(session, list(nuevas))
+            await session.execute(query, lote)
+            await Catalogo.ajustar(session, altas=nuevas.values(), bajas=anteriores)
+            for fila in lote:
+                await Fragmentos.guardar(session, fila["id_libro"], fila["titulo"], fila["autor"], fila["sinopsis"])
+            await session.commit()
+            for fila in lote:
+                await IndiceLibros.sincronizar(session, fila["id_libro"])
+                await Recomendaciones.sincronizar(session, fila["id_libro"])
+                await Autocompletar.sincronizar(session, fila["id_libro"])
+        await ctx.avanzar(inicio + len(lote))
+    await ctx.avanzar(len(filas), forzar=True)
+    return {"archivo": archivo, "libros": len(filas)}
+
+
+@tipo_trabajo("regenerar_fragmentos")
+async def _regenerar_fragmentos(ctx: ContextoTrabajo) -> Dict[str, Any]:
+    async with ctx.sesion() as session:
+        ids = (await session.execute(text("SELECT id_libro FROM libro ORDER BY id_libro"))).scalars().all()
+    await ctx.avanzar(0, len(ids), forzar=True)
+    for inicio in range(0, len(ids), 200):
+        async with ctx.sesion() as session:
+            for id_libro in ids[inicio:inicio + 200]:
+                await Fragmentos.regenerar(session, id_libro)
+            await session.commit()
+        await ctx.avanzar(min(inicio + 200, len(ids)))
+    await ctx.avanzar(len(ids), forzar=True)
+    return {"libros": len(ids)}
+
+
+@tipo_trabajo("recargar_indice_busqueda")
+async def _recargar_indice_busqueda(ctx: ContextoTrabajo) -> Dict[str, Any]:
+    # El índice es por proceso: esto recarga el del worker que ejecuta el trabajo.
+    if not IndiceLibros.activo():
+        return {"libros": 0, "pid": os.getpid()}
+    async with ctx.sesion() as session:
+        total = await IndiceLibros.cargar(session)
+    await ctx.avanzar(total, total, forzar=True)
+    return {"libros": total, "pid": os.getpid()}
+
+
+@tipo_trabajo("construir_recomendaciones")
+async def _construir_recomendaciones(ctx: ContextoTrabajo) -> Dict[str, Any]:
+    # Lo mismo que `python -m app.recomendaciones`. Todos los workers recogen el artefacto nuevo al revisar su
+    # `meta.json`, no solo el que ejecuta el trabajo.
+    async with ctx.sesion() as session:
+        libros = await leer_catalogo(session)
+    await ctx.avanzar(0, len(libros), forzar=True)
+    # numpy/scipy en un hilo: el cálculo tarda segundos y el event loop sigue atendiendo peticiones.
+    total = await asyncio.to_thread(construir, libros, int(ctx.parametros.get("k", TOP_K)))
+    await ctx.avanzar(total, total, forzar=True)
+    return {"libros": total}
+
+
+@tipo_trabajo("exportar_libros")
+async def _exportar_libros(ctx: ContextoTrabajo) -> Dict[str, Any]:
+    # Mismo formato que `database/libros.csv`, así la exportación se puede volver a importar.
+    # Lotes por id (keyset): cada lote es una consulta corta y el archivo crece sin tener el catálogo en memoria.
+    archivo = os.path.basename(ctx.parametros.get("archivo") or f"libros_{ctx.id_trabajo}.csv")
+    tamano_lote = int(ctx.parametros.get("tamano_lote", 1000))
+    os.makedirs(DIRECTORIO_EXPORTACION, exist_ok=True)
+    destino = os.path.join(DIRECTORIO_EXPORTACION, archivo)
+    # Se escribe aparte y se renombra al final: una exportación cancelada o fallida no deja un CSV a medias.
+    temporal = f"{destino}.{ctx.id_trabajo}.parcial"
+    query = text(
+        f"SELECT {', '.join(COLUMNAS_LIBRO)} FROM libro WHERE id_libro > :desde ORDER BY id_libro LIMIT :lote"
+    )
+    async with ctx.sesion() as session:
+        total = (await session.execute(text("SELECT COUNT(*) FROM libro"))).scalar_one()
+    await ctx.avanzar(0, total, forzar=True)
+    exportados, desde = 0, 0
+    try:
+        await asyncio.to_thread(_escribir_libros, temporal, [], True)
+        while True:
+            async with ctx.sesion() as session:
+                filas = [dict(fila) for fila in (await session.execute(query, {"desde": desde, "lote": tamano_lote})).mappings()]
+            if not filas:
+                break
+            await asyncio.to_thread(_escribir_libros, temporal, filas, False)
+            exportados, desde = exportados + len(filas), filas[-1]["id_libro"]
+            await ctx.avanzar(exportados)
+        await asyncio.to_thread(os.replace, temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    await ctx.avanzar(exportados, forzar=True)
+    return {"archivo": os.path.abspath(destino), "libros": exportados}
@@ -11,6 +11,9 @@ from app.design_patterns import DesignPatterns
 # - Encapsulación: La lógica de negocio, como la autenticación y la gestión de la sesión, está contenida en la clase.
 
 class Usuario:
+    # CLEAN CODE: `__slots__` evita un `__dict__` por instancia; `como_dict` da la misma vista cuando hace falta.
+    __slots__ = ("id_usuario", "rol", "username", "email_usuario", "password", "activo", "mes_suscripcion")
+
     def __init__(self, id_usuario: int, rol: int, username: str, email_usuario: str, password: str, activo: bool = True, mes_suscripcion: int = 0):
         # CLEAN CODE: El constructor es simple y solo asigna valores. Los valores por defecto mejoran la usabilidad.
         self.id_usuario = id_usuario
@@ -56,7 +59,10 @@ class Usuario:
         }
         menu = menu_roles.get(self.rol, menu_basico)
 
-        return {"autenticado": True, "usuario": self.__dict__, "menu_habilitado": menu}
+        return {"autenticado": True, "usuario": self.como_dict(), "menu_habilitado": menu}
+
+    def como_dict(self) -> dict:
+        return {campo: getattr(self, campo) for campo in Usuario.__slots__}
 
     async def cerrar_sesion(self) -> dict:
         # CLEAN CODE: Método simple y con un propósito claro.
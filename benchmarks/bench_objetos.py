@@ -0,0 +1,94 @@
+"""
+Micro-benchmark de los objetos de dominio: memoria por instancia y costo de construcción por fila.
+
+    python -m benchmarks.bench_objetos --n 200000
+
+"Antes" se reproduce con una copia de cada clase sin `__slots__` (mismo `__init__`, con `__dict__`).
+También compara el armado de la respuesta de reviews: el camino anterior (fila -> `Review` -> decorador
+-> dict) contra el actual (fila -> decorador -> dict). No necesita base de datos.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from collections import namedtuple
+from typing import Callable, Dict, List
+
+from app.administrador import Administrador
+from app.design_patterns import DesignPatterns
+from app.libro import Libro
+from app.review import Review
+from app.suscripcion import Suscripcion
+from app.usuario import Usuario
+
+# Imita a `sqlalchemy.Row`: tupla con acceso por atributo.
+FilaReview = namedtuple("FilaReview", "id_review usuario_id libro_id comentario username rol")
+
+ARGUMENTOS = {
+    Libro: dict(id_libro=1, titulo="Cien años de soledad", autor="Gabriel García Márquez", categoria="Realismo mágico", anio_publicacion=1967, sinopsis="..."),
+    Review: dict(comentario="Muy bueno", id_review=1, usuario_id=2, libro_id=3),
+    Usuario: dict(id_usuario=1, rol=1, username="ana", email_usuario="ana@correo.com", password="x", activo=True, mes_suscripcion=0),
+    Suscripcion: dict(id_suscripcion=1, usuario_id=2, mes_inicio=1, mes_fin=2, tarifa=10),
+    Administrador: dict(id_admin=1, username="admin", email="admin@correo.com", password="x", rol=0),
+}
+
+
+def sin_slots(clase: type) -> type:
+    return type(f"{clase.__name__}ConDict", (), {"__init__": clase.__init__})
+
+
+def medir(fabrica: Callable[[], object], n: int) -> Dict[str, float]:
+    # El tiempo se toma sin tracemalloc (que encarece cada asignación) y la memoria en una segunda pasada.
+    gc.collect()
+    inicio = time.perf_counter()
+    objetos = [fabrica() for _ in range(n)]
+    duracion = time.perf_counter() - inicio
+    del objetos
+
+    gc.collect()
+    tracemalloc.start()
+    objetos = [fabrica() for _ in range(n)]
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objetos
+    # La lista en sí ocupa ~8 bytes por elemento; se descuenta para quedarse con el objeto.
+    return {"bytes_por_objeto": round(memoria / n - 8, 1), "ns_por_objeto": round(duracion / n * 1e9, 1)}
+
+
+def _reviews_antes(filas: List[FilaReview]) -> List[dict]:
+    respuesta = []
+    for fila in filas:
+        review = Review(id_review=fila.id_review, usuario_id=fila.usuario_id, libro_id=fila.libro_id, comentario=fila.comentario)
+        respuesta.append({"username": fila.username, "comentario": DesignPatterns.decorar_review(review, fila.rol == 2).mostrar()})
+    return respuesta
+
+
+def _reviews_ahora(filas: List[FilaReview]) -> List[dict]:
+    return [{"username": f.username, "comentario": DesignPatterns.decorar_review(f, f.rol == 2).mostrar()} for f in filas]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memoria y costo de construcción de los objetos de dominio.")
+    parser.add_argument("--n", type=int, default=200_000)
+    args = parser.parse_args()
+
+    resultado: Dict[str, Dict] = {}
+    for clase, kwargs in ARGUMENTOS.items():
+        antes = sin_slots(clase)
+        resultado[clase.__name__] = {
+            "antes": medir(lambda: antes(**kwargs), args.n),
+            "ahora": medir(lambda: clase(**kwargs), args.n),
+        }
+
+    filas = [FilaReview(i, i % 50, 1, f"comentario {i}", f"usuario{i % 50}", 2 if i % 3 else 1) for i in range(args.n)]
+    for nombre, funcion in (("antes", _reviews_antes), ("ahora", _reviews_ahora)):
+        inicio = time.perf_counter()
+        funcion(filas)
+        resultado.setdefault("reviews_de_libro", {})[nombre] = {"ns_por_fila": round((time.perf_counter() - inicio) / args.n * 1e9, 1)}
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
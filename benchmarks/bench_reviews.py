@@ -0,0 +1,189 @@
+"""
+Latencia de la consulta de reviews de un libro con `review` particionada y sin particionar.
+
+En una BD que se va a convertir (antes/después de `python -m database.particiones`):
+
+    python -m benchmarks.bench_reviews medir --database-url ... --salida antes.json
+    DATABASE_URL=... python -m database.particiones
+    python -m benchmarks.bench_reviews medir --database-url ... --salida despues.json
+    python -m benchmarks.bench_api comparar antes.json despues.json
+
+En una BD de pruebas, donde `bench_api seed` ya deja `review` particionada (migración v6), se comparan las dos
+formas sobre los mismos datos: `plana` copia `review` a `review_sin_particionar` con los índices de antes.
+
+    python -m benchmarks.bench_api seed --database-url ... --libros 20000 --reset
+    python -m benchmarks.bench_reviews sembrar --database-url ... --reviews 5000000
+    python -m benchmarks.bench_reviews plana --database-url ...
+    python -m benchmarks.bench_reviews medir --database-url ... --tabla review_sin_particionar --salida antes.json
+    python -m benchmarks.bench_reviews medir --database-url ... --salida despues.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks.bench_api import PALABRAS, _exigir_url_bench, resumir
+
+CONSULTA = (
+    "SELECT r.id_review, r.usuario_id, r.libro_id, r.comentario, u.username, u.rol "
+    "FROM {tabla} r JOIN usuario u ON r.usuario_id = u.id_usuario WHERE r.libro_id = :id_libro"
+)
+LOTE_SIEMBRA = 500_000
+
+
+async def sembrar(args: argparse.Namespace) -> None:
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(_exigir_url_bench(args.database_url))
+    async with engine.connect() as conn:
+        libros = (await conn.execute(text("SELECT MAX(id_libro) FROM libro"))).scalar_one()
+        usuarios = (await conn.execute(text("SELECT MAX(id_usuario) FROM usuario"))).scalar_one()
+    if not libros or not usuarios:
+        sys.exit("La BD no tiene libros o usuarios: siembra primero con `bench_api seed`.")
+
+    # Distribución sesgada (power(random(), 3)): pocos libros concentran muchas reviews, como en un catálogo real.
+    comentario = " ".join(PALABRAS[:12])
+    insertar = text(
+        "INSERT INTO review (usuario_id, libro_id, comentario) "
+        "SELECT 1 + floor(random() * :usuarios)::int, 1 + floor(power(random(), 3) * :libros)::int, :comentario "
+        "FROM generate_series(1, :n)"
+    )
+    restantes = args.reviews
+    while restantes > 0:
+        n = min(restantes, LOTE_SIEMBRA)
+        async with engine.begin() as conn:
+            await conn.execute(insertar, {"usuarios": usuarios, "libros": libros, "comentario": comentario, "n": n})
+        restantes -= n
+        print(f"  {args.reviews - restantes} de {args.reviews} reviews insertadas")
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE review"))
+        await conn.commit()
+    await engine.dispose()
+
+
+async def plana(args: argparse.Namespace) -> None:
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from database.particiones import ANTIGUA
+
+    # Misma forma que `review` antes de la v6: sin particiones, PK id_review e índices simples.
+    engine = create_async_engine(_exigir_url_bench(args.database_url))
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {ANTIGUA}"))
+        await conn.execute(text(f"CREATE TABLE {ANTIGUA} AS SELECT id_review, usuario_id, libro_id, comentario FROM review"))
+        await conn.execute(text(f"ALTER TABLE {ANTIGUA} ADD PRIMARY KEY (id_review)"))
+        await conn.execute(text(f"CREATE INDEX ON {ANTIGUA} (libro_id)"))
+        await conn.execute(text(f"CREATE INDEX ON {ANTIGUA} (usuario_id)"))
+    async with engine.connect() as conn:
+        await conn.execute(text(f"ANALYZE {ANTIGUA}"))
+        await conn.commit()
+    await engine.dispose()
+    print(f"{ANTIGUA} lista para medir con --tabla {ANTIGUA}.")
+
+
+async def _descripcion(conn, tabla: str) -> Dict:
+    from sqlalchemy import text
+
+    particiones = (await conn.execute(
+        text("SELECT COUNT(*) FROM pg_inherits WHERE inhparent = to_regclass(:t)"), {"t": f"public.{tabla}"}
+    )).scalar_one()
+    tamanos = (await conn.execute(text(
+        "SELECT COALESCE(SUM(pg_table_size(relid)), 0), COALESCE(SUM(pg_indexes_size(relid)), 0) "
+        "FROM pg_partition_tree(:t) WHERE isleaf"
+    ), {"t": tabla})).one()
+    filas = (await conn.execute(text(f"SELECT COUNT(*) FROM {tabla}"))).scalar_one()
+    return {"tabla": tabla, "particiones": particiones, "filas": filas, "bytes_tabla": tamanos[0], "bytes_indices": tamanos[1]}
+
+
+async def medir(args: argparse.Namespace) -> None:
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(_exigir_url_bench(args.database_url), pool_size=args.concurrencia, max_overflow=0)
+    consulta = text(CONSULTA.format(tabla=args.tabla))
+    async with engine.connect() as conn:
+        descripcion = await _descripcion(conn, args.tabla)
+        # Se eligen libros con reviews, en proporción a cuántas tienen: así pesan los libros populares.
+        muestra = (await conn.execute(
+            text(f"SELECT libro_id FROM {args.tabla} ORDER BY random() LIMIT :n"), {"n": max(args.consultas, 1000)}
+        )).scalars().all()
+    if not muestra:
+        sys.exit(f"{args.tabla} no tiene reviews.")
+
+    rng = random.Random(args.semilla)
+    ids = [rng.choice(muestra) for _ in range(args.calentamiento + args.consultas)]
+    pendientes = list(reversed(ids))
+    latencias: List[float] = []
+    errores = 0
+
+    async def trabajador() -> None:
+        nonlocal errores
+        async with engine.connect() as conn:
+            while pendientes:
+                calentando = len(pendientes) > args.consultas
+                id_libro = pendientes.pop()
+                inicio = time.perf_counter()
+                try:
+                    (await conn.execute(consulta, {"id_libro": id_libro})).all()
+                except Exception:
+                    errores += 1
+                    continue
+                if not calentando:
+                    latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(args.concurrencia)))
+    duracion = time.perf_counter() - inicio
+    await engine.dispose()
+
+    resumen = resumir(latencias, errores, duracion)
+    informe = {
+        "meta": {
+            "fecha": datetime.now(timezone.utc).isoformat(),
+            "concurrencia": args.concurrencia,
+            "consultas": args.consultas,
+            "semilla": args.semilla,
+            **descripcion,
+        },
+        "por_operacion": {"reviews_de_libro": resumen},
+        "total": resumen,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    print(texto)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Latencia de las reviews de un libro con y sin particiones.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_sembrar = sub.add_parser("sembrar", help="Agrega reviews sintéticas generadas en el servidor.")
+    p_sembrar.add_argument("--database-url")
+    p_sembrar.add_argument("--reviews", type=int, default=1_000_000)
+
+    p_plana = sub.add_parser("plana", help="Copia review a una tabla sin particionar, para comparar.")
+    p_plana.add_argument("--database-url")
+
+    p_medir = sub.add_parser("medir", help="Mide la consulta de reviews por libro sobre una tabla.")
+    p_medir.add_argument("--database-url")
+    p_medir.add_argument("--tabla", default="review", help="review, o review_sin_particionar tras convertir.")
+    p_medir.add_argument("--consultas", type=int, default=5000)
+    p_medir.add_argument("--calentamiento", type=int, default=500)
+    p_medir.add_argument("--concurrencia", type=int, default=8)
+    p_medir.add_argument("--semilla", type=int, default=42)
+    p_medir.add_argument("--salida", help="Archivo JSON, comparable con `bench_api comparar`.")
+
+    args = parser.parse_args()
+    comandos = {"sembrar": sembrar, "plana": plana, "medir": medir}
+    asyncio.run(comandos[args.comando](args))
+
+
+if __name__ == "__main__":
+    main()
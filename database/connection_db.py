@@ -1,9 +1,13 @@
+import asyncio
 import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
-from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as TimeoutPool
 from dotenv import load_dotenv
 
 # Importar todos los modelos para que SQLModel los conozca
@@ -12,6 +16,13 @@ from app.libro import Libro
 from app.review import Review
 from app.suscripcion import Suscripcion
 from app.eliminado import Eliminado
+from app.fragmento import LibroFragmento
+from app.trabajos import Trabajo
+from database.esquema import UsuarioTabla, LibroTabla, ReviewTabla, SuscripcionTabla, LibroFacetaTabla, LecturaLibroTabla, LibroPopularidadTabla, AuditoriaTabla
+from database.migraciones import migrar
+from database import despliegue
+from app.metricas import sumar_tiempo
+from app.resiliencia import CircuitoBD, circuito_bd, circuito_habilitado
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', 'app', '.env')
 
@@ -22,15 +33,190 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL no está configurada en el archivo .env o no se pudo cargar.")
 
-engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# --- Enrutamiento lectura/escritura ---
+# Tras escribir, las lecturas de ese cliente van al primario durante este tiempo (retraso de réplica).
+LECTURA_PEGAJOSA_S = float(os.getenv("LECTURA_PEGAJOSA_S", "5"))
+# Si la réplica falla, se deja de usar durante este tiempo antes de volver a intentarlo.
+REPLICA_PAUSA_S = float(os.getenv("REPLICA_PAUSA_S", "30"))
+# La marca de la última escritura viaja en una cookie: la ve cualquier worker o instancia que atienda la
+# siguiente petición, no solo el proceso que hizo el commit. Es hora de reloj (epoch) por eso mismo.
+COOKIE_ESCRITURA = "ultima_escritura"
+
+_replica_caida_hasta = 0.0
+
+
+class MarcaEscritura:
+    # CLEAN CODE: Estado de la petición en curso; los middlewares y las sesiones comparten la misma instancia.
+    __slots__ = ("en", "renovada")
+
+    def __init__(self, en: Optional[float] = None):
+        self.en = en
+        self.renovada = False
+
+    @classmethod
+    def desde_cookie(cls, valor: Optional[str]) -> "MarcaEscritura":
+        try:
+            return cls(float(valor)) if valor else cls()
+        except ValueError:
+            return cls()
+
+
+# La fija un middleware de main.py con la cookie de la petición; fuera de una petición no hay marca.
+marca_peticion: ContextVar[Optional[MarcaEscritura]] = ContextVar("marca_peticion", default=None)
+
+
+def marcar_escritura() -> None:
+    marca = marca_peticion.get()
+    if marca is not None:
+        marca.en = time.time()
+        marca.renovada = True
+
+
+def lectura_pegajosa() -> bool:
+    marca = marca_peticion.get()
+    # Una marca del futuro (cookie alterada) no cuenta: lo peor que puede hacer un cliente es leer del primario.
+    return marca is not None and marca.en is not None and 0 <= time.time() - marca.en <= LECTURA_PEGAJOSA_S
+
+
+# Errores que indican que la BD (o la red hacia ella) no responde; los de datos, como IntegrityError, no cuentan.
+ERRORES_DISPONIBILIDAD = (OperationalError, InterfaceError, TimeoutPool, OSError, asyncio.TimeoutError)
+circuito = circuito_bd if circuito_habilitado() else None
+
+
+class SesionMedida(AsyncSession):
+    # CLEAN CODE: Suma el tiempo de cada consulta y commit al desglose "bd" de las métricas de la petición.
+    # Si la clase tiene `circuito_sesion`, además lo alimenta (y el circuito corta las consultas mientras está abierto).
+    circuito_sesion: Optional[CircuitoBD] = None
 
-async def init_db():
+    async def execute(self, *args, **kwargs):
+        if self.circuito_sesion is not None:
+            self.circuito_sesion.verificar()
+        inicio = time.perf_counter()
+        exito = True
+        try:
+            return await super().execute(*args, **kwargs)
+        except ERRORES_DISPONIBILIDAD:
+            exito = False
+            raise
+        finally:
+            duracion = time.perf_counter() - inicio
+            sumar_tiempo("bd", duracion)
+            if self.circuito_sesion is not None:
+                self.circuito_sesion.registrar(exito, duracion)
+
+    async def commit(self) -> None:
+        inicio = time.perf_counter()
+        try:
+            await super().commit()
+        finally:
+            sumar_tiempo("bd", time.perf_counter() - inicio)
+
+
+class SesionPrincipal(SesionMedida):
+    # CLEAN CODE: El circuito mide solo al primario: los errores o la lentitud de la réplica no deben cortar las
+    # escrituras a un primario sano. La réplica usa `SesionMedida` y, si falla, `get_session_lectura` cae al primario.
+    # Cada commit en el primario activa la lectura pegajosa del cliente (read-your-writes).
+    circuito_sesion = circuito
+
+    async def commit(self) -> None:
+        await super().commit()
+        marcar_escritura()
+
+
+# `SQL_ECHO=0` en producción (lo fija `app/servidor.py`): el log de cada sentencia cuesta más que la consulta.
+engine: AsyncEngine = create_async_engine(
+    DATABASE_URL,
+    echo=os.getenv("SQL_ECHO", "1").lower() in ("1", "true", "yes"),
+    pool_size=int(os.getenv("POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("MAX_OVERFLOW", "10")),
+)
+async_session = sessionmaker(engine, class_=SesionPrincipal, expire_on_commit=False)
+
+# Réplica opcional de solo lectura, con su propio pool.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+engine_lectura: Optional[AsyncEngine] = None
+async_session_lectura = None
+if READ_DATABASE_URL:
+    engine_lectura = create_async_engine(
+        READ_DATABASE_URL,
+        pool_size=int(os.getenv("READ_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("READ_MAX_OVERFLOW", "10")),
+        pool_pre_ping=True,
+    )
+    async_session_lectura = sessionmaker(engine_lectura, class_=SesionMedida, expire_on_commit=False)
+
+async def esperar_bd(espera_max_s: float = 60.0) -> None:
+    """Reintenta con espera creciente hasta que el primario acepta conexiones (p. ej. si arranca después que la app)."""
+    limite = time.monotonic() + espera_max_s
+    pausa = 0.5
+    while True:
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return
+        except ERRORES_DISPONIBILIDAD as e:
+            if time.monotonic() + pausa > limite:
+                raise
+            print(f"La base de datos aún no responde ({e.__class__.__name__}); nuevo intento en {pausa:.1f} s.")
+            await asyncio.sleep(pausa)
+            pausa = min(pausa * 2, 5.0)
+
+async def bd_disponible(espera_s: float = 2.0) -> bool:
+    # Sondeo de readiness: toma una conexión del pool y hace un SELECT 1, sin pasar por el circuito.
+    async def sondear() -> None:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    try:
+        await asyncio.wait_for(sondear(), timeout=espera_s)
+        return True
+    except ERRORES_DISPONIBILIDAD:
+        return False
+
+def descartar_pools_heredados() -> None:
+    # Tras un fork con la app precargada, el hijo no debe reutilizar conexiones abiertas por el padre.
+    for motor in (engine, engine_lectura):
+        if motor is not None:
+            motor.sync_engine.dispose(close=False)
+
+async def init_db() -> int:
+    # En un arranque normal solo se verifica la versión del esquema; el DDL vive en `database/migraciones.py`.
     async with engine.begin() as conn:
-        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
-        # Al importar los modelos arriba, SQLModel los registrará aquí.
-        await conn.run_sync(SQLModel.metadata.create_all)
+        version = await migrar(conn)
+        faltan = await despliegue.pendientes(conn)
+    if faltan:
+        print(f"Pasos de despliegue pendientes ({', '.join(faltan)}): ejecuta `python -m database.despliegue`.")
+    return version
+
+def fabrica_sesiones_lectura():
+    # Para trabajos fuera de una petición (p. ej. refrescos en segundo plano): réplica si existe, si no el primario.
+    return (async_session_lectura or async_session)()
 
 async def get_session():
     async with async_session() as session:
         yield session
+
+async def get_session_lectura():
+    """
+    Sesión para endpoints de solo lectura: usa la réplica si existe, salvo que el cliente acabe
+    de escribir (lectura pegajosa) o la réplica haya fallado hace poco; en esos casos, el primario.
+    """
+    global _replica_caida_hasta
+    usar_replica = (
+        async_session_lectura is not None
+        and time.monotonic() >= _replica_caida_hasta
+        and not lectura_pegajosa()
+    )
+    if usar_replica:
+        async with async_session_lectura() as session:
+            try:
+                # Se toma la conexión por adelantado para poder caer al primario si la réplica no responde.
+                await session.connection()
+            except Exception as e:
+                print(f"Réplica de lectura no disponible, se usa el primario: {e}")
+                _replica_caida_hasta = time.monotonic() + REPLICA_PAUSA_S
+            else:
+                yield session
+                return
+
+    async with async_session() as session:
+        yield session
@@ -0,0 +1,263 @@
+"""
+Pasos de despliegue que no caben en la transacción de migraciones del arranque: índices con
+`CREATE INDEX CONCURRENTLY`, rellenos por lotes (sinopsis_tsv, fragmentos) y validación de FKs.
+
+    DATABASE_URL=... python -m database.despliegue --lote 5000 --pausa-ms 50
+    python -m database.despliegue --listar   # solo muestra lo que falta
+
+Se ejecuta una vez por despliegue, con la app ya arrancada en la versión nueva (las migraciones crean las
+columnas y triggers de los que parten estos pasos). El arranque avisa mientras quede alguno pendiente; hasta
+entonces la app funciona igual, solo que sin el índice la consulta recorre la tabla y los libros sin
+`sinopsis_tsv` todavía no aparecen en la búsqueda por contenido (ni, sin fragmento, en la vista previa gratuita).
+"""
+import argparse
+import asyncio
+import sys
+from typing import Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.fragmento import UPSERT_FRAGMENTO, Fragmentos
+from database.esquema import INDICES_CATALOGO
+from database.migraciones import FKS_LIBRO
+from database.particiones import es_particionada
+
+# CLEAN CODE:
+# - SRP: Este módulo solo ejecuta el DDL largo que `migraciones.py` deja fuera del arranque.
+# - Sin candados largos: Cada índice se construye con CONCURRENTLY (fuera de toda transacción), cada lote de
+#   relleno es una transacción corta y cada VALIDATE CONSTRAINT va en la suya (SHARE UPDATE EXCLUSIVE), así
+#   las lecturas y escrituras de la app siguen durante el despliegue.
+# - Idempotente: Un paso completado queda anotado en `despliegue_paso`; un índice que quedó inválido por un
+#   CONCURRENTLY interrumpido se borra y se vuelve a construir.
+# - OCP: Un paso nuevo se registra con `@paso` (o con `_indice`), al final de la lista.
+
+Paso = Callable[[AsyncEngine, int, float], Awaitable[bool]]
+PASOS: List[Tuple[str, str, Paso]] = []
+
+
+def paso(nombre: str, descripcion: str) -> Callable[[Paso], Paso]:
+    def registrar(funcion: Paso) -> Paso:
+        PASOS.append((nombre, descripcion, funcion))
+        return funcion
+    return registrar
+
+
+async def crear_indice(engine: AsyncEngine, nombre: str, tabla: str, definicion: str) -> bool:
+    async with engine.connect() as conn:
+        # CONCURRENTLY no puede ir dentro de una transacción.
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        # Postgres no admite CONCURRENTLY sobre una tabla particionada; sus índices nacen con las particiones.
+        if await es_particionada(conn, tabla):
+            return True
+        valido = (await conn.execute(
+            text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:nombre)"), {"nombre": f"public.{nombre}"}
+        )).scalar()
+        if valido:
+            return True
+        if valido is False:
+            print(f"  {nombre} quedó inválido en un intento anterior; se reconstruye.")
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}"))
+        await conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {tabla} {definicion}"))
+    return True
+
+
+def _indice(nombre: str, tabla: str, definicion: str) -> None:
+    async def construir(engine: AsyncEngine, lote: int, pausa_s: float) -> bool:
+        return await crear_indice(engine, nombre, tabla, definicion)
+
+    PASOS.append((nombre, f"índice {nombre} sobre {tabla}", construir))
+
+
+async def rellenar_por_lotes(engine: AsyncEngine, tabla: str, clave: str, sentencia: str, lote: int, pausa_s: float,
+                             antes: Optional[str] = None) -> int:
+    """Ejecuta `sentencia` (con :desde y :hasta) por rangos de `clave`; cada rango es una transacción corta.
+
+    `antes`, si se da, va primero en la misma transacción (p. ej. para tomar un candado)."""
+    async with engine.connect() as conn:
+        maximo = (await conn.execute(text(f"SELECT COALESCE(MAX({clave}), 0) FROM {tabla}"))).scalar_one()
+    filas, desde = 0, 0
+    while desde < maximo:
+        hasta = min(desde + lote, maximo)
+        async with engine.begin() as conn:
+            if antes:
+                await conn.execute(text(antes), {"desde": desde, "hasta": hasta})
+            filas += (await conn.execute(text(sentencia), {"desde": desde, "hasta": hasta})).rowcount
+        desde = hasta
+        print(f"  {clave} <= {hasta} de {maximo}: {filas} filas")
+        # La pausa deja respirar al WAL, a las réplicas y al autovacuum entre lotes.
+        await asyncio.sleep(pausa_s)
+    return filas
+
+
+# --- Pasos, en orden ---
+
+@paso("sinopsis_tsv", "rellena libro.sinopsis_tsv de los libros anteriores a la migración v2")
+async def _rellenar_sinopsis_tsv(engine: AsyncEngine, lote: int, pausa_s: float) -> bool:
+    async with engine.connect() as conn:
+        # Las BDs que aplicaron la v2 cuando la columna era generada ya la tienen calculada.
+        generada = (await conn.execute(text(
+            "SELECT attgenerated <> '' FROM pg_attribute WHERE attrelid = 'libro'::regclass AND attname = 'sinopsis_tsv'"
+        ))).scalar()
+    if generada:
+        return True
+    # Los libros escritos desde la v2 los calcula el trigger `libro_sinopsis_tsv`.
+    await rellenar_por_lotes(
+        engine, "libro", "id_libro",
+        "UPDATE libro SET sinopsis_tsv = to_tsvector('spanish', coalesce(sinopsis, '')) "
+        "WHERE id_libro > :desde AND id_libro <= :hasta AND sinopsis_tsv IS NULL",
+        lote, pausa_s,
+    )
+    return True
+
+
+# Después del relleno: construir el GIN sobre la columna ya llena es más rápido que mantenerlo en cada UPDATE.
+_indice("ix_libro_sinopsis_tsv", "libro", "USING GIN (sinopsis_tsv)")
+
+
+@paso("fragmentos", "genera libro_fragmento para los libros cargados sin él (scripts, siembras)")
+async def _generar_fragmentos(engine: AsyncEngine, lote: int, pausa_s: float) -> bool:
+    # La regla del fragmento vive en Python (`Fragmentos.generar`): se lee cada lote y se escribe de una vez.
+    faltantes = text(
+        "SELECT l.id_libro, l.titulo, l.autor, l.sinopsis FROM libro l "
+        "WHERE l.id_libro > :desde AND NOT EXISTS (SELECT 1 FROM libro_fragmento f WHERE f.id_libro = l.id_libro) "
+        "ORDER BY l.id_libro LIMIT :lote"
+    )
+    desde, generados = 0, 0
+    while True:
+        async with engine.begin() as conn:
+            filas = (await conn.execute(faltantes, {"desde": desde, "lote": lote})).mappings().all()
+            if not filas:
+                break
+            await conn.execute(UPSERT_FRAGMENTO, [
+                {"id_libro": f["id_libro"], "titulo": f["titulo"], "autor": f["autor"], "fragmento": Fragmentos.generar(f["sinopsis"])}
+                for f in filas
+            ])
+        desde, generados = filas[-1]["id_libro"], generados + len(filas)
+        print(f"  id_libro <= {desde}: {generados} fragmentos generados")
+        await asyncio.sleep(pausa_s)
+    return True
+
+
+# Índices de los JOIN y búsquedas frecuentes (migración v4). Con `review` ya particionada se omiten: su clave
+# empieza por libro_id y el de usuario_id nace con las particiones.
+for _nombre, _tabla, _columna in (
+    ("ix_review_libro_id", "review", "libro_id"),
+    ("ix_review_usuario_id", "review", "usuario_id"),
+    ("ix_suscripcion_usuario_id", "suscripcion", "usuario_id"),
+    ("ix_usuario_username", "usuario", "username"),
+):
+    _indice(_nombre, _tabla, f"({_columna})")
+
+
+@paso("validar_fks", "valida las FKs a libro que la migración v4 agregó como NOT VALID")
+async def _validar_fks(engine: AsyncEngine, lote: int, pausa_s: float) -> bool:
+    completo = True
+    for tabla, columna, _, _ in FKS_LIBRO:
+        nombre = f"{tabla}_{columna}_fkey"
+        async with engine.connect() as conn:
+            validada = (await conn.execute(
+                text("SELECT convalidated FROM pg_constraint WHERE conname = :n AND conrelid = to_regclass(:t)"),
+                {"n": nombre, "t": f"public.{tabla}"},
+            )).scalar()
+        if validada is None or validada:
+            continue
+        try:
+            # Cada validación en su propia transacción corta: recorre la tabla sin bloquear las escrituras.
+            async with engine.begin() as conn:
+                await conn.execute(text(f"ALTER TABLE {tabla} VALIDATE CONSTRAINT {nombre}"))
+        except IntegrityError as e:
+            completo = False
+            print(f"  {tabla} tiene filas que apuntan a libros inexistentes; {nombre} queda sin validar: {e.orig}")
+    return completo
+
+
+# Índices de cobertura del catálogo (migración v5).
+for _nombre, _clave, _incluidas in INDICES_CATALOGO:
+    _indice(_nombre, "libro", f"({', '.join(_clave)}) INCLUDE ({', '.join(_incluidas)})")
+
+
+@paso("sin_ix_libro_anio_publicacion", "borra el índice simple por año, que reemplaza ix_libro_catalogo_anio")
+async def _borrar_indice_anio(engine: AsyncEngine, lote: int, pausa_s: float) -> bool:
+    # Va después de construir su reemplazo: las consultas por año nunca se quedan sin índice.
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_libro_anio_publicacion"))
+    return True
+
+
+@paso("libro_popularidad", "cuenta en libro_popularidad las reviews anteriores a la migración v10")
+async def _contar_popularidad(engine: AsyncEngine, lote: int, pausa_s: float) -> bool:
+    # FOR UPDATE sobre los libros del lote choca con el FOR KEY SHARE de la FK de `review`: mientras se cuenta
+    # nadie agrega ni borra reviews de esos libros. El conteo va en otra sentencia, con una foto tomada después
+    # del candado, y reemplaza lo que hayan sumado los triggers desde la v10.
+    await rellenar_por_lotes(
+        engine, "libro", "id_libro",
+        "INSERT INTO libro_popularidad (libro_id, reviews) "
+        "SELECT l.id_libro, COUNT(r.libro_id) FROM libro l LEFT JOIN review r ON r.libro_id = l.id_libro "
+        "WHERE l.id_libro > :desde AND l.id_libro <= :hasta GROUP BY l.id_libro "
+        "ON CONFLICT (libro_id) DO UPDATE SET reviews = EXCLUDED.reviews",
+        lote, pausa_s,
+        antes="SELECT 1 FROM libro WHERE id_libro > :desde AND id_libro <= :hasta FOR UPDATE",
+    )
+    return True
+
+
+async def pendientes(conn: AsyncConnection) -> List[str]:
+    """Nombres de los pasos aún no completados en esta BD (una consulta, para el aviso del arranque)."""
+    existe = (await conn.execute(text("SELECT to_regclass('public.despliegue_paso') IS NOT NULL"))).scalar_one()
+    hechos = set((await conn.execute(text("SELECT nombre FROM despliegue_paso"))).scalars().all()) if existe else set()
+    return [nombre for nombre, _, _ in PASOS if nombre not in hechos]
+
+
+async def ejecutar(engine: AsyncEngine, lote: int = 5_000, pausa_s: float = 0.05) -> List[str]:
+    """Ejecuta los pasos pendientes en orden y devuelve los que siguen pendientes."""
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS despliegue_paso ("
+            "nombre TEXT PRIMARY KEY, "
+            "completado_en TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+        faltan = set(await pendientes(conn))
+    for nombre, descripcion, funcion in PASOS:
+        if nombre not in faltan:
+            continue
+        print(f"Paso {nombre}: {descripcion}")
+        if await funcion(engine, lote, pausa_s):
+            async with engine.begin() as conn:
+                await conn.execute(
+                    text("INSERT INTO despliegue_paso (nombre) VALUES (:nombre) ON CONFLICT DO NOTHING"), {"nombre": nombre}
+                )
+            faltan.discard(nombre)
+    return [nombre for nombre, _, _ in PASOS if nombre in faltan]
+
+
+async def _main(args: argparse.Namespace) -> int:
+    from database.connection_db import engine
+
+    engine.echo = False
+    try:
+        if args.listar:
+            async with engine.connect() as conn:
+                faltan = await pendientes(conn)
+            print("\n".join(faltan) if faltan else "No hay pasos pendientes.")
+            return 0
+        faltan = await ejecutar(engine, args.lote, args.pausa_ms / 1000)
+        if faltan:
+            print(f"Siguen pendientes: {', '.join(faltan)}.")
+            return 1
+        print("✅ Pasos de despliegue completos.")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Índices concurrentes y rellenos por lotes que el arranque no hace.")
+    parser.add_argument("--lote", type=int, default=5_000, help="Filas por transacción de relleno.")
+    parser.add_argument("--pausa-ms", type=float, default=50.0, help="Pausa entre lotes.")
+    parser.add_argument("--listar", action="store_true", help="Solo lista los pasos pendientes.")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import BigInteger, DateTime, Index, PrimaryKeyConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+# CLEAN CODE:
+# - Fuente única: Estas son las tablas reales de la BD. Las clases de `app/` (`Usuario`, `Libro`...) son objetos
+#   de dominio sin mapeo; los scripts `database/*_to_db.py` solo cargan datos de ejemplo.
+# - Integridad: `review` y `libro_fragmento` cuelgan de `libro` con borrado en cascada.
+# - Rendimiento: Índices en las columnas de los JOIN y búsquedas frecuentes (`review.usuario_id`, `usuario.username`...).
+# - `review.usuario_id` y `suscripcion.usuario_id` no llevan FK: al eliminar un usuario se guarda un memento
+#   y al restaurarlo recupera sus reviews y suscripciones por `usuario_id`; una FK obligaría a borrarlas o a
+#   impedir la eliminación.
+# - Catálogo: Los índices `ix_libro_catalogo_*` cubren el listado por categoría, autor y año (`app/catalogo.py`),
+#   y `libro_faceta` guarda los conteos por (categoría, año) que mantiene el `Administrador`.
+# - Particiones: `review` se parte por hash de `libro_id` (`database/particiones.py`); su clave primaria empieza
+#   por `libro_id`, que es también el índice de las reviews de un libro.
+# - Analítica: `lectura_libro` guarda lecturas agregadas por (libro, hora), sin FK: los volcados de
+#   `app/analitica.py` no fallan si el libro se borró entre la lectura y el volcado.
+# - Popularidad: `libro_popularidad` cuenta las reviews de cada libro para el autocompletado; la mantienen
+#   triggers de `review` (`app/autocompletar.py`), sin FK por la misma razón que `lectura_libro`.
+# - Auditoría: `auditoria` es de solo agregar y se parte por mes (`app/auditoria.py`); sin FKs, porque el
+#   registro sobrevive a los usuarios y libros que menciona.
+
+
+class UsuarioTabla(SQLModel, table=True):
+    __tablename__ = "usuario"
+
+    id_usuario: Optional[int] = Field(default=None, primary_key=True)
+    rol: int = Field(..., ge=0, le=2)
+    username: str = Field(..., min_length=3, max_length=50, index=True)
+    email_usuario: str = Field(..., min_length=5, max_length=100)
+    password: str = Field(..., min_length=3, max_length=100)
+    activo: bool = Field(default=True)
+    mes_suscripcion: int = Field(default=0)
+
+
+# (nombre, columnas de la clave, columnas incluidas): el orden de la clave es el de `Catalogo.listar`.
+INDICES_CATALOGO = (
+    ("ix_libro_catalogo_anio", ("anio_publicacion", "id_libro"), ("titulo", "autor", "categoria")),
+    ("ix_libro_catalogo_categoria", ("categoria", "anio_publicacion", "id_libro"), ("titulo", "autor")),
+    ("ix_libro_catalogo_autor", ("autor", "anio_publicacion", "id_libro"), ("titulo", "categoria")),
+)
+
+
+class LibroTabla(SQLModel, table=True):
+    __tablename__ = "libro"
+    __table_args__ = tuple(
+        Index(nombre, *clave, postgresql_include=list(incluidas)) for nombre, clave, incluidas in INDICES_CATALOGO
+    )
+
+    id_libro: Optional[int] = Field(default=None, primary_key=True)
+    titulo: str = Field(..., min_length=1, max_length=200)
+    autor: str = Field(..., min_length=1, max_length=100)
+    categoria: str = Field(..., min_length=1, max_length=100)
+    anio_publicacion: int = Field(..., ge=0, le=2025)
+    sinopsis: str = Field(..., min_length=1)
+
+
+class ReviewTabla(SQLModel, table=True):
+    __tablename__ = "review"
+    # Postgres exige la columna de partición en la clave primaria. Las particiones las crea la migración v6.
+    __table_args__ = (
+        PrimaryKeyConstraint("libro_id", "id_review"),
+        {"postgresql_partition_by": "HASH (libro_id)"},
+    )
+
+    id_review: Optional[int] = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
+    usuario_id: int = Field(..., index=True)
+    libro_id: int = Field(..., foreign_key="libro.id_libro", ondelete="CASCADE", primary_key=True)
+    comentario: str = Field(..., max_length=500)
+
+
+class SuscripcionTabla(SQLModel, table=True):
+    __tablename__ = "suscripcion"
+
+    id_suscripcion: Optional[int] = Field(default=None, primary_key=True)
+    usuario_id: int = Field(..., index=True)
+    mes_inicio: int
+    mes_fin: int
+    tarifa: int
+
+
+class LibroFacetaTabla(SQLModel, table=True):
+    __tablename__ = "libro_faceta"
+
+    categoria: str = Field(..., max_length=100, primary_key=True)
+    anio_publicacion: int = Field(..., primary_key=True)
+    total: int = Field(default=0)
+
+
+class LecturaLibroTabla(SQLModel, table=True):
+    __tablename__ = "lectura_libro"
+    # Las listas de tendencia recorren solo las últimas horas.
+    __table_args__ = (Index("ix_lectura_libro_hora", "hora"),)
+
+    libro_id: int = Field(..., primary_key=True)
+    hora: datetime = Field(..., primary_key=True, sa_type=DateTime(timezone=True))
+    lecturas: int = Field(default=0)
+
+
+class LibroPopularidadTabla(SQLModel, table=True):
+    __tablename__ = "libro_popularidad"
+
+    libro_id: int = Field(..., primary_key=True)
+    reviews: int = Field(default=0)
+
+
+class AuditoriaTabla(SQLModel, table=True):
+    __tablename__ = "auditoria"
+    # La clave empieza por la columna de partición; es también el orden de las páginas (más reciente primero).
+    __table_args__ = (
+        PrimaryKeyConstraint("ocurrido_en", "id_evento"),
+        Index("ix_auditoria_objetivo", "objetivo_tipo", "objetivo_id", "ocurrido_en"),
+        Index("ix_auditoria_actor", "actor_id", "ocurrido_en"),
+        {"postgresql_partition_by": "RANGE (ocurrido_en)"},
+    )
+
+    id_evento: Optional[int] = Field(default=None, primary_key=True, sa_type=BigInteger, sa_column_kwargs={"autoincrement": True})
+    ocurrido_en: datetime = Field(..., primary_key=True, sa_type=DateTime(timezone=True))
+    actor_id: Optional[int] = None
+    actor: str = Field(..., max_length=50)
+    accion: str = Field(..., max_length=50)
+    objetivo_tipo: str = Field(..., max_length=20)
+    objetivo_id: Optional[int] = None
+    cambios: Dict[str, Any] = Field(default_factory=dict, sa_type=JSONB)
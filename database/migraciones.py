@@ -0,0 +1,255 @@
+from typing import Awaitable, Callable, List, Tuple
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import SQLModel
+from app.auditoria import preparar_tabla as preparar_auditoria
+from app.autocompletar import preparar_popularidad
+from database import particiones
+
+# CLEAN CODE:
+# - SRP: Este módulo solo conoce la versión del esquema y cómo llevar la BD hasta ella.
+# - OCP: Para cambiar el esquema se agrega una nueva migración al final de `MIGRACIONES`, sin tocar las anteriores.
+# - Rendimiento: En un arranque normal solo se consulta la versión; el DDL se ejecuta una única vez por versión.
+# - Arranque corto: Todo corre en una transacción con candado; lo que reescribe o recorre tablas grandes (rellenos,
+#   índices) va a `database/despliegue.py`, que lo hace por lotes y con CONCURRENTLY.
+
+Migracion = Callable[[AsyncConnection], Awaitable[None]]
+
+# Número arbitrario y fijo para el candado de Postgres que serializa las migraciones entre workers.
+MIGRACIONES_LOCK_ID = 72_540_001
+
+
+# Copia congelada de las tablas que existían en la v1: las de los scripts `*_to_db.py` y las dos de la app.
+# No se usan los modelos actuales, que ya traen FKs, índices y particiones de migraciones posteriores.
+ESQUEMA_V1 = MetaData()
+TABLAS_V1 = [
+    Table(
+        "usuario", ESQUEMA_V1,
+        Column("id_usuario", Integer, primary_key=True),
+        Column("rol", Integer, nullable=False),
+        Column("username", String(50), nullable=False),
+        Column("email_usuario", String(100), nullable=False),
+        Column("password", String(100), nullable=False),
+        Column("activo", Boolean, nullable=False),
+        Column("mes_suscripcion", Integer, nullable=False),
+    ),
+    Table(
+        "libro", ESQUEMA_V1,
+        Column("id_libro", Integer, primary_key=True),
+        Column("titulo", String(200), nullable=False),
+        Column("autor", String(100), nullable=False),
+        Column("categoria", String(100), nullable=False),
+        Column("anio_publicacion", Integer, nullable=False),
+        Column("sinopsis", String, nullable=False),
+    ),
+    Table(
+        "review", ESQUEMA_V1,
+        Column("id_review", Integer, primary_key=True),
+        Column("usuario_id", Integer, nullable=False),
+        Column("libro_id", Integer, nullable=False),
+        Column("comentario", String(500), nullable=False),
+    ),
+    Table(
+        "suscripcion", ESQUEMA_V1,
+        Column("id_suscripcion", Integer, primary_key=True),
+        Column("usuario_id", Integer, nullable=False),
+        Column("mes_inicio", Integer, nullable=False),
+        Column("mes_fin", Integer, nullable=False),
+        Column("tarifa", Integer, nullable=False),
+    ),
+    Table(
+        "eliminado", ESQUEMA_V1,
+        Column("id_usuario", Integer, primary_key=True),
+        Column("rol", Integer, nullable=False),
+        Column("username", String, nullable=False),
+        Column("email_usuario", String, nullable=False),
+        Column("password", String, nullable=False),
+        Column("activo", Boolean, nullable=False),
+        Column("mes_suscripcion", Integer),
+    ),
+    Table(
+        "libro_fragmento", ESQUEMA_V1,
+        Column("id_libro", Integer, primary_key=True, autoincrement=False),
+        Column("titulo", String, nullable=False),
+        Column("autor", String, nullable=False),
+        Column("fragmento", String, nullable=False),
+    ),
+]
+
+
+async def _v1_esquema_inicial(conn: AsyncConnection) -> None:
+    # Equivale a lo que antes hacía `init_db` en cada arranque, con las tablas de entonces.
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    await conn.run_sync(lambda c: ESQUEMA_V1.create_all(c, tables=TABLAS_V1))
+
+
+FUNCION_SINOPSIS_TSV = """
+CREATE OR REPLACE FUNCTION libro_sinopsis_tsv() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.sinopsis_tsv := to_tsvector('spanish', coalesce(NEW.sinopsis, ''));
+    RETURN NEW;
+END $$
+"""
+
+
+async def _v2_texto_completo_sinopsis(conn: AsyncConnection) -> None:
+    # Columna nullable y sin DEFAULT: solo toca el catálogo, sin reescribir `libro`. El trigger la calcula en cada
+    # escritura; los libros existentes y el índice GIN (CONCURRENTLY) quedan para `python -m database.despliegue`.
+    await conn.execute(text("ALTER TABLE libro ADD COLUMN IF NOT EXISTS sinopsis_tsv tsvector"))
+    await conn.execute(text(FUNCION_SINOPSIS_TSV))
+    await conn.execute(text("DROP TRIGGER IF EXISTS libro_sinopsis_tsv ON libro"))
+    await conn.execute(text(
+        "CREATE TRIGGER libro_sinopsis_tsv BEFORE INSERT OR UPDATE OF sinopsis ON libro "
+        "FOR EACH ROW EXECUTE FUNCTION libro_sinopsis_tsv()"
+    ))
+
+
+async def _v3_trabajos(conn: AsyncConnection) -> None:
+    # Registro de trabajos en segundo plano (`app/trabajos.py`). checkfirst: las BDs creadas antes de congelar
+    # la v1 ya la tienen.
+    tabla = SQLModel.metadata.tables["trabajo"]
+    await conn.run_sync(lambda c: SQLModel.metadata.create_all(c, tables=[tabla]))
+
+
+# (tabla, columna, tabla referenciada, columna referenciada); mismos nombres que genera Postgres en `create_all`.
+FKS_LIBRO = (
+    ("review", "libro_id", "libro", "id_libro"),
+    ("libro_fragmento", "id_libro", "libro", "id_libro"),
+)
+
+
+async def _v4_claves_e_indices(conn: AsyncConnection) -> None:
+    # Esquema de `database/esquema.py` sobre una BD creada por los scripts `*_to_db.py` (sin FKs ni índices).
+    for tabla in ("usuario", "libro", "review", "suscripcion"):
+        await conn.run_sync(lambda c, t=tabla: SQLModel.metadata.tables[t].create(c, checkfirst=True))
+
+    # Los índices de JOIN (CONCURRENTLY) y la validación de estas FKs, que recorren tablas enteras, los hace
+    # `python -m database.despliegue`. Con NOT VALID la FK ya protege las escrituras nuevas sin revisar las filas
+    # viejas, así que aquí solo se toca el catálogo.
+    for tabla, columna, referida, columna_referida in FKS_LIBRO:
+        nombre = f"{tabla}_{columna}_fkey"
+        existe = (await conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :n"), {"n": nombre})).first()
+        if existe:
+            continue
+        await conn.execute(text(
+            f"ALTER TABLE {tabla} ADD CONSTRAINT {nombre} FOREIGN KEY ({columna}) "
+            f"REFERENCES {referida} ({columna_referida}) ON DELETE CASCADE NOT VALID"
+        ))
+
+
+async def _v5_catalogo(conn: AsyncConnection) -> None:
+    # Los índices de cobertura del listado los construye `python -m database.despliegue` con CONCURRENTLY.
+    # Conteos iniciales de facetas; de aquí en adelante los ajusta cada escritura de `libro`.
+    tabla = SQLModel.metadata.tables["libro_faceta"]
+    await conn.run_sync(lambda c: tabla.create(c, checkfirst=True))
+    await conn.execute(text("DELETE FROM libro_faceta"))
+    await conn.execute(text(
+        "INSERT INTO libro_faceta (categoria, anio_publicacion, total) "
+        "SELECT categoria, anio_publicacion, COUNT(*) FROM libro GROUP BY categoria, anio_publicacion"
+    ))
+
+
+async def _v6_review_particionada(conn: AsyncConnection) -> None:
+    # BD creada antes de congelar la v1: su `create_all` ya creó `review` particionada; faltan sus particiones.
+    # Su clave (libro_id, id_review) sirve a las búsquedas por libro, así que el índice simple de la v4 sobra.
+    if await particiones.es_particionada(conn, "review"):
+        await particiones.crear_particiones(conn, "review")
+        await conn.execute(text("DROP INDEX IF EXISTS ix_review_libro_id"))
+        return
+
+    filas = await particiones.filas_estimadas(conn)
+    if filas <= particiones.UMBRAL_EN_LINEA:
+        await particiones.convertir_en_transaccion(conn)
+        return
+    # Copiar millones de filas aquí bloquearía el arranque: se deja la tabla nueva sincronizada por el trigger.
+    await particiones.preparar(conn)
+    print(f"review tiene ~{filas} filas: ejecuta `python -m database.particiones` para copiarlas e intercambiar las tablas.")
+
+
+async def _v7_lecturas(conn: AsyncConnection) -> None:
+    # Conteos agregados de lecturas (`app/analitica.py`); checkfirst como en la v3.
+    tabla = SQLModel.metadata.tables["lectura_libro"]
+    await conn.run_sync(lambda c: tabla.create(c, checkfirst=True))
+
+
+async def _v8_auditoria(conn: AsyncConnection) -> None:
+    # Registro de auditoría (`app/auditoria.py`): tabla, trigger de solo agregar y particiones de este mes y el próximo.
+    tabla = SQLModel.metadata.tables["auditoria"]
+    await conn.run_sync(lambda c: tabla.create(c, checkfirst=True))
+    await preparar_auditoria(conn)
+
+
+async def _v9_auditoria_por_fila(conn: AsyncConnection) -> None:
+    # El trigger de sentencia de la v8 no corría con UPDATE/DELETE/TRUNCATE dirigidos a una partición.
+    await preparar_auditoria(conn)
+
+
+async def _v10_popularidad(conn: AsyncConnection) -> None:
+    # Reviews por libro para el autocompletado. Desde aquí la mantienen los triggers; las reviews anteriores
+    # las cuenta `python -m database.despliegue` por lotes (contar `review` entera aquí alargaría el arranque).
+    tabla = SQLModel.metadata.tables["libro_popularidad"]
+    await conn.run_sync(lambda c: tabla.create(c, checkfirst=True))
+    await preparar_popularidad(conn)
+
+
+async def _v11_latido_trabajos(conn: AsyncConnection) -> None:
+    # Columnas nullable y sin DEFAULT: solo catálogo. Las filas anteriores no tienen latido y, si siguen activas,
+    # `reconciliar` las trata como huérfanas, igual que antes.
+    await conn.execute(text("ALTER TABLE trabajo ADD COLUMN IF NOT EXISTS propietario VARCHAR"))
+    await conn.execute(text("ALTER TABLE trabajo ADD COLUMN IF NOT EXISTS latido_en TIMESTAMP WITHOUT TIME ZONE"))
+
+
+MIGRACIONES: List[Tuple[int, str, Migracion]] = [
+    (1, "esquema inicial (pg_trgm, tablas base, eliminado, libro_fragmento)", _v1_esquema_inicial),
+    (2, "búsqueda de texto completo sobre libro.sinopsis (tsvector + trigger)", _v2_texto_completo_sinopsis),
+    (3, "tabla trabajo para los trabajos de administración en segundo plano", _v3_trabajos),
+    (4, "esquema único con FKs a libro e índices de JOIN (review, suscripcion, usuario)", _v4_claves_e_indices),
+    (5, "catálogo: tabla libro_faceta (índices de cobertura en database.despliegue)", _v5_catalogo),
+    (6, "review particionada por hash de libro_id", _v6_review_particionada),
+    (7, "tabla lectura_libro con las lecturas por libro y hora", _v7_lecturas),
+    (8, "auditoria de administración: solo agregar, particionada por mes", _v8_auditoria),
+    (9, "auditoria: trigger de solo agregar por fila y por partición, permisos revocados", _v9_auditoria_por_fila),
+    (10, "libro_popularidad: reviews por libro mantenidas por triggers de review", _v10_popularidad),
+    (11, "trabajo: propietario y latido para reconciliar solo los trabajos huérfanos", _v11_latido_trabajos),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+async def version_actual(conn: AsyncConnection) -> int:
+    # CLEAN CODE: `to_regclass` evita un error (y una transacción abortada) cuando la tabla aún no existe.
+    existe = (await conn.execute(text("SELECT to_regclass('public.schema_version') IS NOT NULL"))).scalar_one()
+    if not existe:
+        return 0
+    version = (await conn.execute(text("SELECT MAX(version) FROM schema_version"))).scalar_one()
+    return version or 0
+
+
+async def migrar(conn: AsyncConnection) -> int:
+    """
+    Aplica las migraciones pendientes y devuelve la versión final del esquema.
+    Debe ejecutarse dentro de una transacción (`engine.begin()`).
+    """
+    if await version_actual(conn) >= VERSION_ESQUEMA:
+        return VERSION_ESQUEMA
+
+    # Otro worker puede estar migrando a la vez: se espera su candado y se vuelve a leer la versión.
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRACIONES_LOCK_ID})
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "descripcion TEXT NOT NULL, "
+        "aplicada_en TIMESTAMPTZ NOT NULL DEFAULT now())"
+    ))
+    actual = await version_actual(conn)
+
+    for version, descripcion, migracion in MIGRACIONES:
+        if version <= actual:
+            continue
+        print(f"Aplicando migración {version}: {descripcion}")
+        await migracion(conn)
+        await conn.execute(
+            text("INSERT INTO schema_version (version, descripcion) VALUES (:version, :descripcion)"),
+            {"version": version, "descripcion": descripcion},
+        )
+    return VERSION_ESQUEMA
@@ -0,0 +1,261 @@
+"""
+Convierte `review` en una tabla particionada por hash de `libro_id` sin cortar el servicio.
+
+    python -m database.particiones --lote 20000 --pausa-ms 50
+    python -m database.particiones --eliminar-antigua   # cuando ya no se necesite volver atrás
+
+La migración v6 prepara la tabla nueva; si la vieja es pequeña (siempre, en una BD nueva) la convierte ahí
+mismo y si no, avisa de que falta ejecutar este módulo, que copia las filas por lotes y termina con el intercambio.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.autocompletar import preparar_popularidad
+
+# CLEAN CODE:
+# - SRP: Este módulo solo sabe particionar `review`; qué versión del esquema toca lo decide `migraciones.py`.
+# - Particiones: Hash de `libro_id`, así las reviews de un libro viven en una sola partición y la consulta de
+#   `Libro.reviews_de_libro` solo recorre el índice de esa partición (más chico, más caliente en caché).
+#   El número de particiones queda fijo al crear la tabla: cambiarlo es repetir la conversión.
+# - En línea: Un trigger replica en `review_nueva` cada escritura de `review` mientras se copian las filas
+#   viejas en transacciones cortas; el intercambio final solo renombra tablas bajo un candado de milisegundos.
+# - Vuelta atrás: La tabla vieja queda como `review_sin_particionar` (sin escrituras) hasta `--eliminar-antigua`.
+
+PARTICIONES = int(os.getenv("REVIEW_PARTICIONES", "16"))
+# Hasta este número de filas la migración v6 copia e intercambia en su propia transacción.
+UMBRAL_EN_LINEA = int(os.getenv("REVIEW_UMBRAL_EN_LINEA", "200000"))
+NUEVA = "review_nueva"
+ANTIGUA = "review_sin_particionar"
+
+FUNCION_ESPEJO = f"""
+CREATE OR REPLACE FUNCTION review_espejo() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM {NUEVA} WHERE libro_id = OLD.libro_id AND id_review = OLD.id_review;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO {NUEVA} (id_review, usuario_id, libro_id, comentario)
+        VALUES (NEW.id_review, NEW.usuario_id, NEW.libro_id, NEW.comentario)
+        ON CONFLICT (libro_id, id_review)
+        DO UPDATE SET usuario_id = EXCLUDED.usuario_id, comentario = EXCLUDED.comentario;
+    END IF;
+    RETURN NULL;
+END $$
+"""
+
+# FOR KEY SHARE: un DELETE concurrente de una fila del lote espera a que el lote termine y su trigger la borra
+# después de copiada; sin el candado podría borrarse antes y el lote la resucitaría en `review_nueva`.
+# Las reviews huérfanas (FK de la v4 sin validar) no se copian: la FK de la tabla nueva sí está validada.
+COPIAR_LOTE = text(
+    f"INSERT INTO {NUEVA} (id_review, usuario_id, libro_id, comentario) "
+    "SELECT r.id_review, r.usuario_id, r.libro_id, r.comentario FROM review r "
+    "WHERE r.id_review > :desde AND r.id_review <= :hasta "
+    "AND EXISTS (SELECT 1 FROM libro l WHERE l.id_libro = r.libro_id) "
+    "FOR KEY SHARE OF r "
+    "ON CONFLICT (libro_id, id_review) DO NOTHING"
+)
+
+
+async def es_particionada(conn: AsyncConnection, tabla: str = "review") -> bool:
+    consulta = text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:tabla)")
+    return bool((await conn.execute(consulta, {"tabla": f"public.{tabla}"})).scalar())
+
+
+async def existe(conn: AsyncConnection, tabla: str) -> bool:
+    return (await conn.execute(text("SELECT to_regclass(:tabla) IS NOT NULL"), {"tabla": f"public.{tabla}"})).scalar_one()
+
+
+async def crear_particiones(conn: AsyncConnection, tabla: str, particiones: int = PARTICIONES) -> None:
+    for resto in range(particiones):
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {tabla}_p{resto} PARTITION OF {tabla} "
+            f"FOR VALUES WITH (MODULUS {particiones}, REMAINDER {resto})"
+        ))
+
+
+async def filas_estimadas(conn: AsyncConnection) -> int:
+    # Estimación del último ANALYZE; -1 si nunca se analizó, y entonces se cuenta.
+    estimadas = (await conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'review'::regclass"))).scalar_one()
+    if estimadas >= 0:
+        return estimadas
+    return (await conn.execute(text("SELECT COUNT(*) FROM review"))).scalar_one()
+
+
+async def preparar(conn: AsyncConnection) -> None:
+    """Crea `review_nueva` vacía y particionada, y el trigger que le replica las escrituras. Idempotente."""
+    # La tabla nueva toma los ids de la misma secuencia: las filas copiadas y las nuevas nunca chocan.
+    secuencia = (await conn.execute(text("SELECT pg_get_serial_sequence('review', 'id_review')"))).scalar_one()
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {NUEVA} ("
+        f"id_review INTEGER NOT NULL DEFAULT nextval('{secuencia}'::regclass), "
+        "usuario_id INTEGER NOT NULL, "
+        "libro_id INTEGER NOT NULL REFERENCES libro (id_libro) ON DELETE CASCADE, "
+        "comentario VARCHAR(500) NOT NULL, "
+        "PRIMARY KEY (libro_id, id_review)"
+        ") PARTITION BY HASH (libro_id)"
+    ))
+    await crear_particiones(conn, NUEVA)
+    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{NUEVA}_usuario_id ON {NUEVA} (usuario_id)"))
+    await conn.execute(text(FUNCION_ESPEJO))
+    await conn.execute(text("DROP TRIGGER IF EXISTS review_espejo ON review"))
+    await conn.execute(text(
+        "CREATE TRIGGER review_espejo AFTER INSERT OR UPDATE OR DELETE ON review "
+        "FOR EACH ROW EXECUTE FUNCTION review_espejo()"
+    ))
+
+
+async def rango_ids(conn: AsyncConnection) -> int:
+    return (await conn.execute(text("SELECT COALESCE(MAX(id_review), 0) FROM review"))).scalar_one()
+
+
+async def copiar(engine: AsyncEngine, lote: int = 20_000, pausa_s: float = 0.05, desde: int = 0, reintentos: int = 3) -> int:
+    """Copia `review` a `review_nueva` por rangos de `id_review`; cada lote es una transacción corta."""
+    async with engine.connect() as conn:
+        # Las filas con id mayor llegaron después del trigger: ya están en `review_nueva`.
+        maximo = await rango_ids(conn)
+    copiadas, inicio, comienzo = 0, desde, time.perf_counter()
+    while inicio < maximo:
+        fin = min(inicio + lote, maximo)
+        for intento in range(reintentos + 1):
+            try:
+                async with engine.begin() as conn:
+                    copiadas += (await conn.execute(COPIAR_LOTE, {"desde": inicio, "hasta": fin})).rowcount
+                break
+            except DBAPIError:
+                # Un interbloqueo con una escritura concurrente aborta el lote entero; se repite igual.
+                if intento == reintentos:
+                    raise
+                await asyncio.sleep(pausa_s * (intento + 1) + 0.1)
+        inicio = fin
+        ritmo = copiadas / max(time.perf_counter() - comienzo, 1e-9)
+        print(f"  id_review <= {fin} de {maximo}: {copiadas} filas copiadas ({ritmo:.0f} filas/s)")
+        # La pausa deja respirar al WAL, a las réplicas y al autovacuum entre lotes.
+        await asyncio.sleep(pausa_s)
+    return copiadas
+
+
+async def pendientes(conn: AsyncConnection) -> int:
+    """Filas copiables de `review` que aún no están en `review_nueva` (0 cuando la copia está completa)."""
+    return (await conn.execute(text(
+        "SELECT COUNT(*) FROM review r "
+        "WHERE EXISTS (SELECT 1 FROM libro l WHERE l.id_libro = r.libro_id) "
+        f"AND NOT EXISTS (SELECT 1 FROM {NUEVA} n WHERE n.libro_id = r.libro_id AND n.id_review = r.id_review)"
+    ))).scalar_one()
+
+
+async def intercambiar(conn: AsyncConnection) -> None:
+    """Pone `review_nueva` en el lugar de `review`. Va dentro de una transacción: solo bloquea y renombra."""
+    secuencia = (await conn.execute(text("SELECT pg_get_serial_sequence('review', 'id_review')"))).scalar_one()
+    await conn.execute(text("LOCK TABLE review IN ACCESS EXCLUSIVE MODE"))
+    await conn.execute(text("DROP TRIGGER IF EXISTS review_espejo ON review"))
+    await conn.execute(text("DROP FUNCTION IF EXISTS review_espejo()"))
+
+    # La tabla vieja se aparta con sus índices renombrados, sin FK ni secuencia: ya no se escribe en ella.
+    indices = (await conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = 'review'::regclass"
+    ))).scalars().all()
+    for indice in indices:
+        await conn.execute(text(f"ALTER INDEX {indice} RENAME TO {(indice + '_' + ANTIGUA[7:])[:63]}"))
+    await conn.execute(text("ALTER TABLE review DROP CONSTRAINT IF EXISTS review_libro_id_fkey"))
+    await conn.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY {NUEVA}.id_review"))
+    await conn.execute(text(f"ALTER TABLE review RENAME TO {ANTIGUA}"))
+
+    # La nueva toma los nombres de siempre (tabla, particiones, índices y FK).
+    await conn.execute(text(f"ALTER TABLE {NUEVA} RENAME TO review"))
+    particiones = (await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits h JOIN pg_class c ON c.oid = h.inhrelid WHERE h.inhparent = 'review'::regclass"
+    ))).scalars().all()
+    for particion in particiones:
+        await conn.execute(text(f"ALTER TABLE {particion} RENAME TO {particion.replace(NUEVA, 'review')}"))
+    indices = (await conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND indexname LIKE :patron"
+    ), {"patron": f"%{NUEVA}%"})).scalars().all()
+    for indice in indices:
+        await conn.execute(text(f"ALTER INDEX {indice} RENAME TO {indice.replace(NUEVA, 'review')}"))
+    await conn.execute(text(f"ALTER TABLE review RENAME CONSTRAINT {NUEVA}_libro_id_fkey TO review_libro_id_fkey"))
+    # Los triggers de popularidad se quedaron en la tabla vieja; la nueva los recibe (desde la migración v10).
+    if await existe(conn, "libro_popularidad"):
+        await preparar_popularidad(conn)
+
+
+async def convertir_en_transaccion(conn: AsyncConnection) -> None:
+    # Para tablas chicas (migración v6): preparar, copiar e intercambiar de una sola vez.
+    await preparar(conn)
+    await conn.execute(COPIAR_LOTE, {"desde": 0, "hasta": await rango_ids(conn)})
+    await intercambiar(conn)
+    await conn.execute(text("ANALYZE review"))
+
+
+async def convertir(engine: AsyncEngine, lote: int, pausa_s: float, desde: int, espera_candado_s: float) -> int:
+    async with engine.begin() as conn:
+        if await es_particionada(conn):
+            print("review ya está particionada; no hay nada que copiar.")
+            return 0
+        await preparar(conn)
+
+    print(f"Copiando review a {NUEVA} ({PARTICIONES} particiones) en lotes de {lote} ids...")
+    await copiar(engine, lote, pausa_s, desde)
+
+    async with engine.connect() as conn:
+        faltan = await pendientes(conn)
+    if faltan:
+        print(f"{faltan} filas no llegaron a {NUEVA}; no se intercambia. Vuelve a ejecutar la copia.")
+        return 1
+
+    # El candado espera a las transacciones en curso sobre `review`; con lock_timeout no se forma una cola detrás.
+    for intento in range(1, 11):
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"SET LOCAL lock_timeout = '{int(espera_candado_s * 1000)}ms'"))
+                await intercambiar(conn)
+            break
+        except DBAPIError:
+            print(f"  intento {intento}: review ocupada; se reintenta el intercambio.")
+            await asyncio.sleep(intento)
+    else:
+        print("No se consiguió el candado de review; la copia sigue sincronizada por el trigger. Reintenta más tarde.")
+        return 1
+
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE review"))
+        await conn.commit()
+    print(f"✅ review particionada. La tabla vieja quedó como {ANTIGUA} (python -m database.particiones --eliminar-antigua).")
+    return 0
+
+
+async def eliminar_antigua(engine: AsyncEngine) -> int:
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {ANTIGUA}"))
+    print(f"{ANTIGUA} eliminada.")
+    return 0
+
+
+async def _main(args: argparse.Namespace) -> int:
+    from database.connection_db import engine
+
+    engine.echo = False
+    try:
+        if args.eliminar_antigua:
+            return await eliminar_antigua(engine)
+        return await convertir(engine, args.lote, args.pausa_ms / 1000, args.desde, args.espera_candado_s)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Particiona la tabla review por hash de libro_id, en línea.")
+    parser.add_argument("--lote", type=int, default=20_000, help="Ids de review por transacción de copia.")
+    parser.add_argument("--pausa-ms", type=float, default=50.0, help="Pausa entre lotes.")
+    parser.add_argument("--desde", type=int, default=0, help="Retoma la copia a partir de este id_review.")
+    parser.add_argument("--espera-candado-s", type=float, default=3.0, help="lock_timeout del intercambio final.")
+    parser.add_argument("--eliminar-antigua", action="store_true", help=f"Borra {ANTIGUA} tras el intercambio.")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
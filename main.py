@@ -1,12 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
-from typing import Optional, Dict, Any, Union
+import time
+_INICIO_ARRANQUE = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Form
+from fastapi.responses import HTMLResponse, RedirectResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
+import hmac
+import json
+import math
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, Union
 from sqlmodel.ext.asyncio.session import AsyncSession
 from contextlib import asynccontextmanager
-from database.connection_db import get_session, init_db
-from fastapi.templating import Jinja2Templates
+from database.connection_db import get_session, get_session_lectura, init_db, esperar_bd, bd_disponible, circuito, async_session, fabrica_sesiones_lectura, marca_peticion, MarcaEscritura, COOKIE_ESCRITURA, LECTURA_PEGAJOSA_S, engine, engine_lectura
 import os
 from functools import wraps
+from starlette.routing import Match
 
 from app.usuario import Usuario
 from app.gratuito import Gratuito
@@ -15,47 +22,303 @@ from app.administrador import Administrador
 from app.libro import Libro
 from app.review import Review
 from app.suscripcion import Suscripcion
+from app.schemas import (
+    UsuarioOut, EstadoUsuarioOut, UsernameOut, ContrasenaOut,
+    ReviewOut, LibroConReviewsOut, LibroSimilarOut, SugerenciasOut, PaginaContenidoOut, PaginaCatalogoOut, PopularesOut, BusquedaVaciaOut, FragmentoOut, LibroCompletoOut,
+    EstadoSuscripcionOut, MensajeOut, ResultadoOut, TrabajoOut, PaginaAuditoriaOut,
+)
+from app.arranque import ReporteArranque
+from app.busqueda import IndiceLibros, BusquedaContenido, busqueda_en_memoria_habilitada
+from app.recomendaciones import Recomendaciones
+from app.autocompletar import LIMITE_MAX, Autocompletar
+from app.catalogo import Catalogo, CursorInvalido, MAX_POR_PAGINA, POR_PAGINA
+from app.cola_reviews import ColaReviews, ColaReviewsLlena, reviews_en_lote_habilitadas
+from app.admision import ControlAdmision, PeticionRechazada, admision_habilitada, backend_desde_entorno, clasificar_ruta, identidad_peticion
+from app.metricas import MiddlewareMetricas, ORJSONMedida, PlantillasMedidas, colector_pools, registro
+from app.perfilado import PerfilEnCurso, colapsar, perfilador, pilas_de_tareas
+from app.trabajos import ColaTrabajosLlena, EjecutorTrabajos, TipoTrabajoDesconocido
+from app.coalescencia import EsperaAgotada, vuelo_busquedas, vuelo_libros, vuelo_reviews
+from app.resiliencia import CircuitoAbierto, almacen_lecturas, circuito_bd, escribe_en_bd, invalidar_libro
+from app.difusion import difusor_reviews
+from app.analitica import LISTAS, contador_lecturas
+from app.auditoria import MAX_POR_PAGINA as MAX_EVENTOS_POR_PAGINA, POR_PAGINA as EVENTOS_POR_PAGINA, registro_auditoria
+from app.activos import DIRECTORIO_ESTATICOS, Activos, ArchivosEstaticos
+from app.compresion import MiddlewareCompresion
+from app.sesion import COOKIE_SESION, SesionPeticion, aplicar_cookie, cerrar_sesion, iniciar_sesion, sesion_peticion, usuario_actual
+
+reporte_arranque = ReporteArranque(inicio=_INICIO_ARRANQUE)
+reporte_arranque.marcar("imports")
 
 # --- Authentication and Authorization ---
-usuario_actual: Optional[Usuario] = None
+# La sesión vive en una cookie firmada (`app/sesion.py`); `usuario_actual()` es el usuario de la petición en curso.
+
+# Cola write-behind de reviews; solo existe con REVIEWS_EN_LOTE=1.
+cola_reviews: Optional[ColaReviews] = None
+
+# Trabajos largos de administración que corren en segundo plano en este worker.
+ejecutor_trabajos = EjecutorTrabajos.desde_entorno(async_session)
 
 def role_required(allowed_roles: list[int]):
     def decorator(func):
         @wraps(func)
         async def wrapper(request: Request, *args, **kwargs):
-            if usuario_actual is None:
+            if usuario_actual() is None:
                 return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
-            if usuario_actual.rol not in allowed_roles:
-                return templates.TemplateResponse("access_denied.html", {"request": request, "usuario": usuario_actual})
+            if usuario_actual().rol not in allowed_roles:
+                return templates.TemplateResponse("access_denied.html", {"request": request, "usuario": usuario_actual()})
             return await func(request, *args, **kwargs)
         return wrapper
     return decorator
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Iniciando aplicación y creando tablas si es necesario...")
-    await init_db()
-    print("Tablas listas.")
+    app.state.lista = False
+    print("Iniciando aplicación y verificando la versión del esquema...")
+    with reporte_arranque.fase("espera_bd"):
+        await esperar_bd(float(os.getenv("ARRANQUE_ESPERA_BD_S", "60")))
+    with reporte_arranque.fase("esquema_bd"):
+        version = await init_db()
+    print(f"Esquema en la versión {version}.")
+    interrumpidos = await ejecutor_trabajos.reconciliar()
+    if interrumpidos:
+        print(f"{interrumpidos} trabajos de un worker que ya no late quedaron sin terminar; se marcaron como interrumpidos.")
+    ejecutor_trabajos.iniciar()
+    if busqueda_en_memoria_habilitada():
+        with reporte_arranque.fase("indice_busqueda"):
+            async with async_session() as session:
+                total = await IndiceLibros.cargar(session)
+        print(f"Índice de búsqueda en memoria cargado con {total} libros.")
+    with reporte_arranque.fase("autocompletar"):
+        async with async_session() as session:
+            total = await Autocompletar.cargar(session)
+    print(f"Autocompletado cargado con {total} libros.")
+    with reporte_arranque.fase("recomendaciones"):
+        total = Recomendaciones.cargar()
+    if total:
+        print(f"Recomendaciones mapeadas en memoria para {total} libros.")
+    Recomendaciones.iniciar()
+    global cola_reviews
+    if reviews_en_lote_habilitadas():
+        cola_reviews = ColaReviews.desde_entorno(async_session)
+        cola_reviews.iniciar()
+        print("Escritura de reviews en lote habilitada.")
+    contador_lecturas.iniciar(async_session, fabrica_sesiones_lectura)
+    registro_auditoria.iniciar(async_session)
+    print(reporte_arranque.resumen())
+    app.state.reporte_arranque = reporte_arranque.como_dict()
+    app.state.lista = True
     yield
+    # Primero deja de anunciarse como lista, para que el balanceador no le mande tráfico nuevo.
+    app.state.lista = False
+    await ejecutor_trabajos.cerrar()
+    await Recomendaciones.cerrar()
+    await contador_lecturas.cerrar()
+    await registro_auditoria.cerrar()
+    print(f"Auditoría cerrada: {registro_auditoria.metricas()}")
+    if cola_reviews is not None:
+        print("Vaciando la cola de reviews...")
+        await cola_reviews.cerrar()
+        print(f"Cola de reviews cerrada: {cola_reviews.metricas()}")
     print("Cerrando aplicación.")
 
 app = FastAPI(
     title="Modelo de Biblioteca Digital",
     description="API que simula el manejo de una biblioteca digital.",
     version="1.0.1",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONMedida
 )
 
+# --- Read/Write Routing ---
+@app.middleware("http")
+async def lectura_pegajosa(request: Request, call_next):
+    # La cookie trae la última escritura del cliente; si esta petición escribe, la respuesta la renueva.
+    marca = MarcaEscritura.desde_cookie(request.cookies.get(COOKIE_ESCRITURA))
+    marca_peticion.set(marca)
+    response = await call_next(request)
+    if marca.renovada:
+        response.set_cookie(
+            COOKIE_ESCRITURA, f"{marca.en:.3f}", max_age=max(1, math.ceil(LECTURA_PEGAJOSA_S)), httponly=True, samesite="lax"
+        )
+    return response
+
+# --- Admission Control ---
+control_admision: Optional[ControlAdmision] = ControlAdmision(backend_desde_entorno()) if admision_habilitada() else None
+
+@app.middleware("http")
+async def control_de_admision(request: Request, call_next):
+    clase = clasificar_ruta(request.method, request.url.path)
+    if control_admision is None or clase is None:
+        return await call_next(request)
+
+    # Cada petición trae su identidad: el usuario de la cookie de sesión o, si no hay, la IP del cliente.
+    u = usuario_actual()
+    usuario = identidad_peticion(u.id_usuario if u is not None else None, request.client.host if request.client else None)
+    try:
+        async with control_admision.admitir(clase, request.url.path, usuario):
+            return await call_next(request)
+    except PeticionRechazada as e:
+        return ORJSONResponse({"detail": e.detalle}, status_code=e.status_code, headers={"Retry-After": str(e.reintentar_en)})
+
+# --- Circuit Breaker ---
+def _escribe_en_bd(request: Request) -> bool:
+    # Solo cuenta la ruta que atenderá la petición: sin coincidencia completa decide el router (404/405).
+    for ruta in app.router.routes:
+        coincide, _ = ruta.matches(request.scope)
+        if coincide == Match.FULL:
+            return getattr(getattr(ruta, "endpoint", None), "escribe_en_bd", False)
+    return False
+
+@app.middleware("http")
+async def circuito_de_la_bd(request: Request, call_next):
+    # Con la BD caída las escrituras (`@escribe_en_bd`) se rechazan enseguida; las lecturas, sean GET o POST,
+    # siguen con el almacén de lecturas.
+    if circuito_bd.abierto() and _escribe_en_bd(request):
+        return ORJSONResponse(
+            {"detail": "La base de datos no está disponible; no se aceptan cambios por ahora."},
+            status_code=503, headers={"Retry-After": str(int(circuito_bd.enfriamiento_s))},
+        )
+    return await call_next(request)
+
+@app.exception_handler(CircuitoAbierto)
+async def circuito_abierto(request: Request, e: CircuitoAbierto):
+    return ORJSONResponse({"detail": str(e)}, status_code=503, headers={"Retry-After": str(e.reintentar_en)})
+
+# --- Session ---
+# Se declara después de los demás middlewares "http", así queda por fuera de ellos: la admisión y el resto ya
+# ven al usuario de la cookie.
+@app.middleware("http")
+async def sesion(request: Request, call_next):
+    estado = SesionPeticion.desde_cookie(request.cookies.get(COOKIE_SESION))
+    sesion_peticion.set(estado)
+    response = await call_next(request)
+    aplicar_cookie(response, estado)
+    return response
+
+# --- Compression ---
+# HTML y JSON dinámicos; los estáticos ya salen precomprimidos de `app/activos.py`.
+app.add_middleware(MiddlewareCompresion)
+
+# --- Metrics ---
+# Se agrega al final para quedar como el middleware más externo y medir la petición completa.
+app.add_middleware(MiddlewareMetricas)
+registro.registrar_colector(colector_pools({"primario": engine, "lectura": engine_lectura}))
+
+def _colector_admision():
+    if control_admision is None:
+        return
+    estado = control_admision.estado()
+    yield "admision_en_curso", "Peticiones admitidas en curso por clase de ruta.", "gauge", [
+        ({"clase": clase}, n) for clase, n in estado["en_curso"].items()
+    ]
+    yield "admision_rechazos_total", "Peticiones rechazadas por control de admisión.", "counter", [
+        ({"status": codigo}, n) for codigo, n in estado["rechazos"].items()
+    ]
+
+def _colector_cola_reviews():
+    if cola_reviews is None:
+        return
+    datos = cola_reviews.metricas()
+    yield "reviews_en_cola", "Reviews pendientes de escribir en la cola write-behind.", "gauge", [({}, datos["en_cola"])]
+    yield "reviews_escritas_total", "Reviews escritas por la cola write-behind.", "counter", [({}, datos["reviews_escritas"])]
+    yield "reviews_no_escritas_total", "Reviews de la cola rechazadas por la BD (fallidas) o sin escribir al cerrar (perdidas).", "counter", [
+        ({"motivo": motivo}, datos[f"reviews_{motivo}"]) for motivo in ("fallidas", "perdidas")
+    ]
+    yield "reviews_reintentos_total", "Volcados de la cola reintentados por la BD no disponible.", "counter", [({}, datos["reintentos"])]
+    yield "reviews_lote_tamano", "Reviews por lote volcado por la cola write-behind.", "histogram", [({}, cola_reviews.histograma_lote)]
+    yield "reviews_volcado_segundos", "Duración de cada volcado de la cola, reintentos incluidos.", "histogram", [
+        ({}, cola_reviews.histograma_volcado)
+    ]
+
+def _colector_coalescencia():
+    vuelos = (vuelo_libros, vuelo_reviews, vuelo_busquedas)
+    yield "coalescencia_consultas_total", "Consultas ejecutadas por la capa single-flight.", "counter", [
+        ({"grupo": v.nombre}, v.consultas) for v in vuelos
+    ]
+    yield "coalescencia_agrupadas_total", "Llamadas que esperaron una consulta idéntica en curso.", "counter", [
+        ({"grupo": v.nombre}, v.agrupadas) for v in vuelos
+    ]
+    yield "coalescencia_directas_total", "Lecturas pegajosas que consultaron sin agrupar.", "counter", [
+        ({"grupo": v.nombre}, v.directas) for v in vuelos
+    ]
+
+def _colector_resiliencia():
+    yield "circuito_bd_abierto", "1 si el circuito de la BD está abierto, 0.5 si está semiabierto.", "gauge", [
+        ({}, {"cerrado": 0, "semiabierto": 0.5, "abierto": 1}[circuito_bd.estado])
+    ]
+    yield "circuito_bd_transiciones_total", "Cambios de estado del circuito de la BD.", "counter", [
+        ({"desde": desde, "hacia": hacia}, n) for (desde, hacia), n in circuito_bd.transiciones.items()
+    ]
+    yield "almacen_lecturas_total", "Lecturas servidas por el almacén (fresco, obsoleto, consulta, sin_datos).", "counter", [
+        ({"resultado": resultado}, n) for resultado, n in almacen_lecturas.resultados.items()
+    ]
+    yield "almacen_lecturas_entradas", "Entradas guardadas en el almacén de lecturas.", "gauge", [({}, len(almacen_lecturas))]
+
+def _colector_difusion():
+    datos = difusor_reviews.metricas()
+    yield "difusion_suscriptores", "Streams SSE de reviews abiertos en este worker.", "gauge", [({}, datos["suscriptores"])]
+    yield "difusion_eventos_total", "Eventos de reviews publicados, entregados a colas y suscriptores descartados.", "counter", [
+        ({"resultado": resultado}, datos[resultado]) for resultado in ("publicados", "entregados", "descartados")
+    ]
+
+def _colector_lecturas():
+    datos = contador_lecturas.metricas()
+    yield "lecturas_pendientes", "Lecturas contadas en memoria que aún no se volcaron a lectura_libro.", "gauge", [({}, datos["pendientes"])]
+    yield "lecturas_total", "Lecturas de libros registradas, volcadas y descartadas por este worker.", "counter", [
+        ({"resultado": resultado}, datos[resultado]) for resultado in ("registradas", "volcadas", "descartadas")
+    ]
+    yield "lecturas_volcados_fallidos_total", "Volcados de lecturas que fallaron y se reintentarán.", "counter", [({}, datos["fallos"])]
+
+def _colector_auditoria():
+    datos = registro_auditoria.metricas()
+    yield "auditoria_en_buffer", "Eventos de auditoría en memoria pendientes de escribir.", "gauge", [({}, datos["en_buffer"])]
+    yield "auditoria_eventos_total", "Eventos de auditoría registrados, escritos, descartados (buffer lleno) y perdidos (BD).", "counter", [
+        ({"resultado": resultado}, datos[resultado]) for resultado in ("registrados", "escritos", "descartados", "perdidos")
+    ]
+
+registro.registrar_colector(_colector_admision)
+registro.registrar_colector(_colector_cola_reviews)
+registro.registrar_colector(_colector_coalescencia)
+registro.registrar_colector(_colector_resiliencia)
+registro.registrar_colector(_colector_difusion)
+registro.registrar_colector(_colector_lecturas)
+registro.registrar_colector(_colector_auditoria)
+
+@app.exception_handler(EsperaAgotada)
+async def espera_agotada(request: Request, e: EsperaAgotada):
+    return ORJSONResponse({"detail": "Servicio saturado. Intenta de nuevo en unos segundos."}, status_code=503, headers={"Retry-After": "1"})
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+templates = PlantillasMedidas(directory=os.path.join(BASE_DIR, "templates"))
+templates.env.globals["activos"] = Activos.cargar()
+app.mount("/static", ArchivosEstaticos(directory=DIRECTORIO_ESTATICOS, check_dir=False), name="static")
+reporte_arranque.marcar("app_y_templates")
 
 # --- Routes ---
 
+# --- Sondeos del orquestador (sin sesión de usuario) ---
+
+@app.get("/salud/viva", include_in_schema=False)
+async def salud_viva():
+    # Liveness: el event loop responde; no toca la BD para no reiniciar workers sanos si Postgres cae.
+    return {"estado": "viva"}
+
+@app.get("/salud/lista", include_in_schema=False)
+async def salud_lista():
+    # Readiness: 503 hasta terminar el arranque (BD alcanzable y esquema al día). Después, si la BD no responde
+    # y el circuito está activo, el worker sigue listo: sirve lecturas del almacén y rechaza escrituras con 503.
+    if not getattr(app.state, "lista", False):
+        return ORJSONResponse({"estado": "arrancando"}, status_code=503)
+    bd = "ok" if await bd_disponible() else "caida"
+    if bd == "caida" and circuito is None:
+        return ORJSONResponse({"estado": "sin_bd", "bd": bd}, status_code=503)
+    return {"estado": "lista", "bd": bd, "pid": os.getpid()}
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
-    if usuario_actual is None:
+    if usuario_actual() is None:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
-    return templates.TemplateResponse("home.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("home.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_form(request: Request):
@@ -64,19 +327,17 @@ async def login_form(request: Request):
 
 @app.post("/login", response_class=HTMLResponse)
 async def login_submit(request: Request, username: str = Form(...), password: str = Form(...), session: AsyncSession = Depends(get_session)):
-    global usuario_actual
     u = Usuario(id_usuario=0, rol=0, username=username, email_usuario="", password=password)
     info = await u.iniciar_sesion(session)
     if not info.get("autenticado"):
         return templates.TemplateResponse("login.html", {"request": request, "error": info.get("mensaje")})
     
-    usuario_actual = u
+    iniciar_sesion(u)
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
 @app.get("/logout")
 async def logout(request: Request):
-    global usuario_actual
-    usuario_actual = None
+    cerrar_sesion()
     return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
 # --- Administrator Views ---
@@ -84,106 +345,107 @@ async def logout(request: Request):
 @app.get("/admin/crear_usuario_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_crear_usuario(request: Request):
-    return templates.TemplateResponse("admin/crear_usuario.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/crear_usuario.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/admin/consultar_usuario_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_consultar_usuario(request: Request):
-    return templates.TemplateResponse("admin/consultar_usuario.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/consultar_usuario.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/admin/actualizar_usuario_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_actualizar_usuario(request: Request):
-    return templates.TemplateResponse("admin/actualizar_usuario.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/actualizar_usuario.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/admin/eliminar_usuario_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_eliminar_usuario(request: Request):
-    return templates.TemplateResponse("admin/eliminar_usuario.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/eliminar_usuario.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/admin/gestionar_estado_usuario_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_gestionar_estado_usuario(request: Request):
-    return templates.TemplateResponse("admin/gestionar_estado_usuario.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/gestionar_estado_usuario.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/admin/crear_libro_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_crear_libro(request: Request):
-    return templates.TemplateResponse("admin/crear_libro.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/crear_libro.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/admin/consultar_libro_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_consultar_libro(request: Request):
-    return templates.TemplateResponse("admin/consultar_libro.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/consultar_libro.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/admin/actualizar_libro_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_actualizar_libro(request: Request):
-    return templates.TemplateResponse("admin/actualizar_libro.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/actualizar_libro.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/admin/eliminar_libro_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0])
 async def form_eliminar_libro(request: Request):
-    return templates.TemplateResponse("admin/eliminar_libro.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("admin/eliminar_libro.html", {"request": request, "usuario": usuario_actual()})
 
 # --- User Views ---
 @app.get("/user/buscar_libro_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0, 1, 2])
 async def form_buscar_libro(request: Request):
-    return templates.TemplateResponse("user/buscar_libro.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("user/buscar_libro.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/user/cambiar_username_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0, 1, 2])
 async def form_cambiar_username(request: Request):
-    return templates.TemplateResponse("user/cambiar_username.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("user/cambiar_username.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/user/cambiar_contrasena_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0, 1, 2])
 async def form_cambiar_contrasena(request: Request):
-    return templates.TemplateResponse("user/cambiar_contrasena.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("user/cambiar_contrasena.html", {"request": request, "usuario": usuario_actual()})
 
 # --- Gratuito Views ---
 @app.get("/gratuito/leer_fragmento_libro_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[1])
 async def form_leer_fragmento_libro(request: Request):
-    return templates.TemplateResponse("gratuito/leer_fragmento_libro.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("gratuito/leer_fragmento_libro.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/gratuito/pasar_a_premium_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[1])
 async def form_pasar_a_premium(request: Request):
-    return templates.TemplateResponse("gratuito/pasar_a_premium.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("gratuito/pasar_a_premium.html", {"request": request, "usuario": usuario_actual()})
 
 # --- Premium Views ---
 @app.get("/premium/leer_libro_completo_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[2])
 async def form_leer_libro_completo(request: Request):
-    return templates.TemplateResponse("premium/leer_libro_completo.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("premium/leer_libro_completo.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/premium/cancelar_suscripcion_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[2])
 async def form_cancelar_suscripcion(request: Request):
-    return templates.TemplateResponse("premium/cancelar_suscripcion.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("premium/cancelar_suscripcion.html", {"request": request, "usuario": usuario_actual()})
 
 # --- Review Views ---
 @app.get("/review/subir_review_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0, 1, 2])
 async def form_subir_review(request: Request):
-    return templates.TemplateResponse("review/subir_review.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("review/subir_review.html", {"request": request, "usuario": usuario_actual()})
 
 # --- Suscripcion Views ---
 @app.get("/suscripcion/activar_suscripcion_premium_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[1])
 async def form_activar_suscripcion_premium(request: Request):
-    return templates.TemplateResponse("suscripcion/activar_suscripcion_premium.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("suscripcion/activar_suscripcion_premium.html", {"request": request, "usuario": usuario_actual()})
 
 @app.get("/suscripcion/ver_estado_suscripcion_form", response_class=HTMLResponse)
 @role_required(allowed_roles=[0, 1, 2])
 async def form_ver_estado_suscripcion(request: Request):
-    return templates.TemplateResponse("suscripcion/ver_estado_suscripcion.html", {"request": request, "usuario": usuario_actual})
+    return templates.TemplateResponse("suscripcion/ver_estado_suscripcion.html", {"request": request, "usuario": usuario_actual()})
     
 # --- API Endpoints (for AJAX calls from templates) ---
 
-@app.post("/api/admin/crear_usuario", tags=["Administrador"])
+@app.post("/api/admin/crear_usuario", tags=["Administrador"], response_model=UsuarioOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0])
 async def api_crear_usuario(
     request: Request,
@@ -193,7 +455,7 @@ async def api_crear_usuario(
     email_usuario: str = Form(...),
     rol: int = Form(...)
 ):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
     datos = {
         "username": username,
         "password": password,
@@ -201,19 +463,19 @@ async def api_crear_usuario(
         "rol": rol,
         "activo": True
     }
-    u = await admin.crear_usuario(session, datos)
-    return u.__dict__
+    return await admin.crear_usuario(session, datos)
 
-@app.get("/api/admin/consultar_usuario/{id_usuario}", tags=["Administrador"])
+@app.get("/api/admin/consultar_usuario/{id_usuario}", tags=["Administrador"], response_model=UsuarioOut)
 @role_required(allowed_roles=[0])
-async def api_consultar_usuario(request: Request, id_usuario: int, session: AsyncSession = Depends(get_session)):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
-    u = await admin.consultar_usuario(session, id_usuario)
+async def api_consultar_usuario(request: Request, id_usuario: int, session: AsyncSession = Depends(get_session_lectura)):
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
+    u = await admin.consultar_usuario_datos(session, id_usuario)
     if not u:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    return u.__dict__
+    return u
 
-@app.patch("/api/admin/actualizar_usuario/{id_usuario}", tags=["Administrador"])
+@app.patch("/api/admin/actualizar_usuario/{id_usuario}", tags=["Administrador"], response_model=MensajeOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0])
 async def api_actualizar_usuario(
     request: Request, 
@@ -224,7 +486,7 @@ async def api_actualizar_usuario(
     rol: str = Form(None),
     activo: str = Form(None)
 ):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
     
     campos = {}
     if username:
@@ -242,136 +504,357 @@ async def api_actualizar_usuario(
     await admin.actualizar_usuario(session, id_usuario, campos)
     return {"mensaje": "Usuario actualizado correctamente"}
 
-@app.delete("/api/admin/eliminar_usuario/{id_usuario}", tags=["Administrador"])
+@app.delete("/api/admin/eliminar_usuario/{id_usuario}", tags=["Administrador"], response_model=MensajeOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0])
 async def api_eliminar_usuario(request: Request, id_usuario: int, session: AsyncSession = Depends(get_session)):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
     if await admin.eliminar_usuario(session, id_usuario):
         return {"mensaje": "Usuario eliminado correctamente"}
     raise HTTPException(status_code=500, detail="No se pudo eliminar el usuario")
 
-@app.post("/api/admin/restaurar_usuario", tags=["Administrador"])
+@app.post("/api/admin/restaurar_usuario", tags=["Administrador"], response_model=MensajeOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0])
 async def api_restaurar_usuario(request: Request, id_usuario: int = Form(...), session: AsyncSession = Depends(get_session)):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
     if await admin.restaurar_usuario(session, id_usuario):
         return {"mensaje": f"Usuario con ID {id_usuario} restaurado correctamente."}
     raise HTTPException(status_code=500, detail="No se pudo restaurar el usuario.")
 
-@app.post("/api/admin/gestionar_estado_usuario/{id_usuario}", tags=["Administrador"])
+@app.post("/api/admin/gestionar_estado_usuario/{id_usuario}", tags=["Administrador"], response_model=EstadoUsuarioOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0])
 async def api_gestionar_estado_usuario(request: Request, id_usuario: int, activo: bool, session: AsyncSession = Depends(get_session)):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
     await admin.gestionar_estado_usuario(session, id_usuario, activo)
     return {"id_usuario": id_usuario, "activo": activo}
 
-@app.post("/api/admin/crear_libro", tags=["Administrador"])
+@app.post("/api/admin/crear_libro", tags=["Administrador"], response_model=MensajeOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0])
 async def api_crear_libro(request: Request, session: AsyncSession = Depends(get_session), datos: Dict[str, Any] = None):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
     # Logic to create book from form data
     # ...
-    return {"message": "Libro creado"}
+    return {"mensaje": "Libro creado"}
 
-@app.get("/api/admin/consultar_libro/{id_libro}", tags=["Administrador"])
+@app.get("/api/admin/consultar_libro/{id_libro}", tags=["Administrador"], response_model=LibroConReviewsOut)
 @role_required(allowed_roles=[0])
-async def api_consultar_libro(request: Request, id_libro: int, session: AsyncSession = Depends(get_session)):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
-    libro = await admin.consultar_libro(session, id_libro)
-    if not libro:
+async def api_consultar_libro(request: Request, id_libro: int, session: AsyncSession = Depends(get_session_lectura)):
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
+
+    async def consultar(s: AsyncSession) -> Optional[Dict[str, Any]]:
+        libro = await admin.consultar_libro_datos(s, id_libro)
+        if not libro:
+            return None
+        return {**libro, "reviews": await Libro.reviews_de_libro(s, id_libro)}
+
+    respuesta = await almacen_lecturas.servir(("libro", id_libro), consultar, session)
+    if respuesta is None:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
-    
-    reviews = await libro.get_reviews(session)
-    libro_dict = libro.__dict__
-    libro_dict["reviews"] = reviews
-    return libro_dict
+    return respuesta
 
-@app.patch("/api/admin/actualizar_libro/{id_libro}", tags=["Administrador"])
+@app.patch("/api/admin/actualizar_libro/{id_libro}", tags=["Administrador"], response_model=MensajeOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0])
 async def api_actualizar_libro(request: Request, id_libro: int, campos: Dict[str, Any], session: AsyncSession = Depends(get_session)):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
-    await admin.actualizar_libro(session, id_libro, campos)
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
+    try:
+        await admin.actualizar_libro(session, id_libro, campos)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"mensaje": "Libro actualizado correctamente"}
 
-@app.delete("/api/admin/eliminar_libro/{id_libro}", tags=["Administrador"])
+@app.delete("/api/admin/eliminar_libro/{id_libro}", tags=["Administrador"], response_model=MensajeOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0])
 async def api_eliminar_libro(request: Request, id_libro: int, session: AsyncSession = Depends(get_session)):
-    admin = Administrador(id_admin=usuario_actual.id_usuario, username=usuario_actual.username, email=usuario_actual.email_usuario, password=usuario_actual.password, rol=usuario_actual.rol)
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
     await admin.eliminar_libro(session, id_libro)
     return {"mensaje": "Libro eliminado correctamente"}
 
-@app.post("/api/user/buscar_libro", tags=["Usuario"])
+@app.post("/api/user/buscar_libro", tags=["Usuario"], response_model=Union[LibroConReviewsOut, BusquedaVaciaOut])
 @role_required(allowed_roles=[0, 1, 2])
-async def api_buscar_libro(request: Request, session: AsyncSession = Depends(get_session), search_term: str = Form(...)):
-    libro = await usuario_actual.buscar_libro(session, search_term)
-    if not libro:
-        return {"resultado": "No se encontraron libros."}
-    
-    reviews = await libro.get_reviews(session)
-    libro_dict = libro.__dict__
-    libro_dict["reviews"] = reviews
-    return libro_dict
+async def api_buscar_libro(request: Request, session: AsyncSession = Depends(get_session_lectura), search_term: str = Form(...)):
+    buscador = usuario_actual()
+
+    async def consultar(s: AsyncSession) -> Union[LibroConReviewsOut, Dict[str, str]]:
+        libro = await buscador.buscar_libro(s, search_term)
+        if not libro:
+            return {"resultado": "No se encontraron libros."}
+        respuesta = LibroConReviewsOut.model_validate(libro)
+        reviews = await Libro.reviews_de_libro(s, libro.id_libro)
+        respuesta.reviews = [ReviewOut.model_validate(review) for review in reviews]
+        return respuesta
+
+    def depende_de(respuesta) -> List[Tuple[str, int]]:
+        # La respuesta trae el libro y sus reviews: una review nueva o un cambio del libro la invalidan.
+        return [("libro", respuesta.id_libro)] if isinstance(respuesta, LibroConReviewsOut) else []
+
+    return await almacen_lecturas.servir(("busqueda", search_term.strip().lower()), consultar, session, depende_de)
+
+@app.get("/api/user/autocompletar", tags=["Usuario"], response_model=SugerenciasOut)
+@role_required(allowed_roles=[0, 1, 2])
+async def api_autocompletar(request: Request, response: Response, q: str = "", limite: int = 10):
+    # Sin sesión de BD: se responde desde memoria. El navegador puede reutilizar la respuesta de un prefijo repetido.
+    response.headers["Cache-Control"] = "private, max-age=60"
+    return {"q": q, "sugerencias": Autocompletar.sugerir(q, min(max(limite, 1), LIMITE_MAX))}
+
+@app.get("/api/user/buscar_contenido", tags=["Usuario"], response_model=PaginaContenidoOut)
+@role_required(allowed_roles=[0, 1, 2])
+async def api_buscar_contenido(request: Request, q: str, pagina: int = 1, por_pagina: int = 10, session: AsyncSession = Depends(get_session_lectura)):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="El término de búsqueda no puede estar vacío.")
+    clave = ("contenido", q.strip().lower(), pagina, por_pagina)
+    return await almacen_lecturas.servir(clave, lambda s: BusquedaContenido.buscar(s, q, pagina, por_pagina), session)
+
+@app.get("/api/user/catalogo", tags=["Usuario"], response_model=PaginaCatalogoOut)
+@role_required(allowed_roles=[0, 1, 2])
+async def api_catalogo(
+    request: Request,
+    categoria: Optional[str] = None,
+    autor: Optional[str] = None,
+    anio_desde: Optional[int] = None,
+    anio_hasta: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limite: int = POR_PAGINA,
+    facetas: bool = True,
+    session: AsyncSession = Depends(get_session_lectura),
+):
+    # Las facetas no cambian al pasar de página: el cliente puede pedirlas solo en la primera (`facetas=false`).
+    filtros = {"categoria": categoria, "autor": autor, "anio_desde": anio_desde, "anio_hasta": anio_hasta}
+    try:
+        pagina = await Catalogo.listar(session, filtros, cursor, min(max(limite, 1), MAX_POR_PAGINA))
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if facetas:
+        pagina["facetas"] = await Catalogo.facetas(session, filtros)
+    return pagina
+
+@app.get("/api/user/libros_similares/{id_libro}", tags=["Usuario"], response_model=list[LibroSimilarOut])
+@role_required(allowed_roles=[0, 1, 2])
+async def api_libros_similares(request: Request, id_libro: int, k: int = 10, session: AsyncSession = Depends(get_session_lectura)):
+    if not Recomendaciones.activo():
+        raise HTTPException(status_code=503, detail="Las recomendaciones no están disponibles.")
+    return await Recomendaciones.similares(session, id_libro, min(max(k, 1), 50))
+
+@app.get("/api/user/libros_populares", tags=["Usuario"], response_model=PopularesOut)
+@role_required(allowed_roles=[0, 1, 2])
+async def api_libros_populares(request: Request, lista: str = "tendencia", k: int = 10):
+    # Sale de la memoria del worker: las listas se recalculan en segundo plano cada TENDENCIAS_REFRESCO_S.
+    if lista not in LISTAS:
+        raise HTTPException(status_code=400, detail=f"Lista desconocida; usa una de: {', '.join(LISTAS)}.")
+    return {
+        "lista": lista,
+        "calculado_en": contador_lecturas.calculado_en,
+        "libros": contador_lecturas.listar(lista, min(max(k, 1), contador_lecturas.top)),
+    }
 
-@app.post("/api/user/cambiar_username", tags=["Usuario"])
+@app.post("/api/user/cambiar_username", tags=["Usuario"], response_model=UsernameOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0, 1, 2])
 async def api_cambiar_username(request: Request, nuevo_username: str = Form(...), session: AsyncSession = Depends(get_session)):
-    return await usuario_actual.cambiar_username(session, nuevo_username)
+    return await usuario_actual().cambiar_username(session, nuevo_username)
 
-@app.post("/api/user/cambiar_contrasena", tags=["Usuario"])
+@app.post("/api/user/cambiar_contrasena", tags=["Usuario"], response_model=ContrasenaOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0, 1, 2])
 async def api_cambiar_contrasena(request: Request, nueva_contrasena: str = Form(...), session: AsyncSession = Depends(get_session)):
-    global usuario_actual
-    result = await usuario_actual.cambiar_contrasena(session, nueva_contrasena)
+    result = await usuario_actual().cambiar_contrasena(session, nueva_contrasena)
     if result.get("contrasena_actualizada"):
-        usuario_actual = None  # Logout
+        cerrar_sesion()  # Logout
     return result
 
-@app.get("/api/gratuito/leer_fragmento_libro/{id_libro}", tags=["Gratuito"])
+@app.get("/api/gratuito/leer_fragmento_libro/{id_libro}", tags=["Gratuito"], response_model=FragmentoOut)
 @role_required(allowed_roles=[1])
-async def api_leer_fragmento_libro(request: Request, id_libro: int, session: AsyncSession = Depends(get_session)):
-    g = Gratuito(**usuario_actual.__dict__)
-    libro = await Administrador(0,"","","",0).consultar_libro(session, id_libro)
-    if not libro:
+async def api_leer_fragmento_libro(request: Request, id_libro: int, session: AsyncSession = Depends(get_session_lectura)):
+    g = Gratuito(**usuario_actual().como_dict())
+    fragmento = await g.leer_fragmento_libro(session, id_libro)
+    if not fragmento:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
-    return g.leer_fragmento_libro(libro)
+    return fragmento
 
-@app.post("/api/gratuito/pasar_a_premium", tags=["Gratuito"])
+@app.post("/api/gratuito/pasar_a_premium", tags=["Gratuito"], response_model=str)
+@escribe_en_bd
 @role_required(allowed_roles=[1])
 async def api_pasar_a_premium(request: Request, codigo: str = Form(...), session: AsyncSession = Depends(get_session)):
-    g = Gratuito(**usuario_actual.__dict__)
+    g = Gratuito(**usuario_actual().como_dict())
     return await g.pasar_a_premium(session, codigo)
 
-@app.get("/api/premium/leer_libro_completo/{id_libro}", tags=["Premium"])
+@app.get("/api/premium/leer_libro_completo/{id_libro}", tags=["Premium"], response_model=LibroCompletoOut)
 @role_required(allowed_roles=[2])
-async def api_leer_libro_completo(request: Request, id_libro: int, session: AsyncSession = Depends(get_session)):
-    p = UsuarioPago(**usuario_actual.__dict__)
-    libro = await Administrador(0,"","","",0).consultar_libro(session, id_libro)
-    if not libro:
+async def api_leer_libro_completo(request: Request, id_libro: int, session: AsyncSession = Depends(get_session_lectura)):
+    p = UsuarioPago(**usuario_actual().como_dict())
+    # Se guarda el libro, no la respuesta: `leer_libro_completo` corre en cada lectura y así la cuenta.
+    libro = await almacen_lecturas.servir(
+        ("libro_completo", id_libro), lambda s: Administrador(0,"","","",0).consultar_libro(s, id_libro), session
+    )
+    if libro is None:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
     return p.leer_libro_completo(libro)
 
-@app.post("/api/premium/cancelar_suscripcion", tags=["Premium"])
+@app.post("/api/premium/cancelar_suscripcion", tags=["Premium"], response_model=ResultadoOut, response_model_exclude_none=True)
+@escribe_en_bd
 @role_required(allowed_roles=[2])
 async def api_cancelar_suscripcion(request: Request, session: AsyncSession = Depends(get_session)):
-    p = UsuarioPago(**usuario_actual.__dict__)
+    p = UsuarioPago(**usuario_actual().como_dict())
     return await p.cancelar_suscripcion(session)
 
-@app.post("/api/review/subir_review/{id_libro}", tags=["Review"])
+@app.post("/api/review/subir_review/{id_libro}", tags=["Review"], response_model=MensajeOut)
+@escribe_en_bd
 @role_required(allowed_roles=[0, 1, 2])
 async def api_subir_review(request: Request, id_libro: int, comentario: str = Form(...), session: AsyncSession = Depends(get_session)):
     r = Review(comentario=comentario)
     libro = await Administrador(0,"","","",0).consultar_libro(session, id_libro)
     if not libro:
         raise HTTPException(status_code=404, detail="Libro no encontrado")
-    await r.subir_review(session, usuario_actual, libro)
-    return {"mensaje": "Review subida correctamente."}
+    if cola_reviews is None:
+        await r.subir_review(session, usuario_actual(), libro)
+        Autocompletar.registrar_review(id_libro)
+        invalidar_libro(id_libro)
+        return {"mensaje": "Review subida correctamente."}
+
+    try:
+        await r.encolar_review(cola_reviews, usuario_actual(), libro)
+    except ColaReviewsLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    Autocompletar.registrar_review(id_libro)
+    return {"mensaje": "Review recibida; se publicará en unos instantes."}
+
+@app.get("/api/review/eventos/{id_libro}", tags=["Review"], response_class=StreamingResponse)
+@role_required(allowed_roles=[0, 1, 2])
+async def api_eventos_reviews(request: Request, id_libro: int):
+    # Una sola consulta al conectarse; después el stream solo recibe lo que publican las escrituras.
+    async with fabrica_sesiones_lectura() as session:
+        libro = await Administrador(0,"","","",0).consultar_libro_datos(session, id_libro)
+    if not libro:
+        raise HTTPException(status_code=404, detail="Libro no encontrado")
+    if difusor_reviews.lleno():
+        raise HTTPException(status_code=503, detail="Demasiados clientes escuchando reviews en este momento.", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        difusor_reviews.eventos(id_libro),
+        media_type="text/event-stream",
+        # Sin caché ni buffer en proxies (nginx), para que cada evento llegue al momento.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/admin/metricas_reviews", tags=["Administrador"], response_model=Dict[str, Union[bool, int, float]])
+@role_required(allowed_roles=[0])
+async def api_metricas_reviews(request: Request):
+    if cola_reviews is None:
+        return {"habilitada": False}
+    return {"habilitada": True, **cola_reviews.metricas()}
 
-@app.post("/api/suscripcion/activar_suscripcion_premium", tags=["Suscripcion"])
+@app.get("/api/admin/auditoria", tags=["Administrador"], response_model=PaginaAuditoriaOut)
+@role_required(allowed_roles=[0])
+async def api_auditoria(
+    request: Request,
+    actor_id: Optional[int] = None,
+    accion: Optional[str] = None,
+    objetivo_tipo: Optional[str] = None,
+    objetivo_id: Optional[int] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limite: int = EVENTOS_POR_PAGINA,
+    session: AsyncSession = Depends(get_session_lectura),
+):
+    # Los eventos de los últimos instantes pueden estar aún en el buffer del worker (AUDITORIA_LOTE_MS).
+    filtros = {
+        "actor_id": actor_id, "accion": accion, "objetivo_tipo": objetivo_tipo, "objetivo_id": objetivo_id,
+        "desde": desde, "hasta": hasta,
+    }
+    try:
+        pagina = await registro_auditoria.consultar(session, filtros, cursor, min(max(limite, 1), MAX_EVENTOS_POR_PAGINA))
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**pagina, "descartados": registro_auditoria.descartados}
+
+@app.post("/api/admin/trabajos", tags=["Administrador"], response_model=TrabajoOut, status_code=status.HTTP_202_ACCEPTED)
+@escribe_en_bd
+@role_required(allowed_roles=[0])
+async def api_crear_trabajo(request: Request, tipo: str = Form(...), parametros: str = Form("{}")):
+    # Responde enseguida con el id del trabajo; el progreso se consulta en /api/admin/trabajos/{id_trabajo}.
+    try:
+        datos = json.loads(parametros)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Los parámetros deben ser un objeto JSON.")
+    if not isinstance(datos, dict):
+        raise HTTPException(status_code=400, detail="Los parámetros deben ser un objeto JSON.")
+    admin = Administrador(id_admin=usuario_actual().id_usuario, username=usuario_actual().username, email=usuario_actual().email_usuario, password=usuario_actual().password, rol=usuario_actual().rol)
+    try:
+        return await ejecutor_trabajos.enviar(tipo, datos, admin)
+    except TipoTrabajoDesconocido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ColaTrabajosLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+@app.get("/api/admin/trabajos", tags=["Administrador"], response_model=List[TrabajoOut])
+@role_required(allowed_roles=[0])
+async def api_listar_trabajos(request: Request, estado: Optional[str] = None, limite: int = 50):
+    return await ejecutor_trabajos.listar(estado, min(limite, 200))
+
+@app.get("/api/admin/trabajos/{id_trabajo}", tags=["Administrador"], response_model=TrabajoOut)
+@role_required(allowed_roles=[0])
+async def api_consultar_trabajo(request: Request, id_trabajo: int):
+    trabajo = await ejecutor_trabajos.consultar(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+@app.post("/api/admin/trabajos/{id_trabajo}/cancelar", tags=["Administrador"], response_model=TrabajoOut)
+@escribe_en_bd
+@role_required(allowed_roles=[0])
+async def api_cancelar_trabajo(request: Request, id_trabajo: int):
+    trabajo = await ejecutor_trabajos.cancelar(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+@app.get("/api/admin/perfil", tags=["Administrador"])
+@role_required(allowed_roles=[0])
+async def api_perfil(request: Request, modo: str = "muestreo", segundos: float = 5.0, intervalo_ms: float = 5.0, formato: str = "colapsado"):
+    # El perfil es del worker que atiende esta petición; con varios workers se pide a cada uno por separado.
+    if modo not in ("muestreo", "cprofile"):
+        raise HTTPException(status_code=400, detail="Modo inválido. Usa 'muestreo' o 'cprofile'.")
+    try:
+        if modo == "cprofile":
+            resultado = await perfilador.cprofile(segundos)
+            return PlainTextResponse(resultado["estadisticas"])
+        resultado = await perfilador.muestrear(segundos, intervalo_ms)
+    except PerfilEnCurso as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if formato == "colapsado":
+        # Listo para flamegraph.pl o speedscope.
+        return PlainTextResponse(colapsar(resultado["pilas"]))
+    resultado["pilas"] = dict(resultado["pilas"].most_common())
+    return resultado
+
+@app.get("/api/admin/tareas", tags=["Administrador"])
+@role_required(allowed_roles=[0])
+async def api_tareas(request: Request):
+    return {"pid": os.getpid(), "tareas": pilas_de_tareas()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    # Lo consulta Prometheus, no un usuario con sesión; si hay METRICAS_TOKEN se exige como Bearer.
+    token = os.getenv("METRICAS_TOKEN")
+    # Comparación en tiempo constante: el tiempo de respuesta no revela cuántos caracteres del token coinciden.
+    if token and not hmac.compare_digest(request.headers.get("authorization", "").encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de métricas inválido")
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/suscripcion/activar_suscripcion_premium", tags=["Suscripcion"], response_model=str)
+@escribe_en_bd
 @role_required(allowed_roles=[1])
 async def api_activar_suscripcion_premium(request: Request, codigo: str = Form(...), session: AsyncSession = Depends(get_session)):
-    return await Suscripcion.activar_suscripcion_premium(session, usuario_actual, codigo)
+    return await Suscripcion.activar_suscripcion_premium(session, usuario_actual(), codigo)
 
-@app.get("/api/suscripcion/ver_estado_suscripcion", tags=["Suscripcion"])
+@app.get("/api/suscripcion/ver_estado_suscripcion", tags=["Suscripcion"], response_model=Union[EstadoSuscripcionOut, str], response_model_exclude_none=True)
 @role_required(allowed_roles=[0, 1, 2])
-async def api_ver_estado_suscripcion(request: Request, session: AsyncSession = Depends(get_session)):
-    return await Suscripcion.ver_estado_suscripcion(session, usuario_actual)
+async def api_ver_estado_suscripcion(request: Request, session: AsyncSession = Depends(get_session_lectura)):
+    usuario = usuario_actual()
+    # El rol y el mes van en la clave: al activar o cancelar la suscripción la cookie cambia y con ella la entrada.
+    clave = ("suscripcion", usuario.id_usuario, usuario.rol, usuario.mes_suscripcion)
+    return await almacen_lecturas.servir(clave, lambda s: Suscripcion.ver_estado_suscripcion(s, usuario), session)
@@ -0,0 +1,118 @@
+"""
+Cubetas de tokens de `app/admision.py` con el reloj inyectable de `BackendMemoria`: el tiempo solo avanza cuando
+la prueba lo mueve, así que cada admisión y cada `Retry-After` es determinista.
+"""
+import asyncio
+
+import pytest
+
+from app.admision import (
+    ADMIN, READ, SEARCH, WRITE, BackendMemoria, ControlAdmision, PeticionRechazada, clasificar_ruta,
+    identidad_peticion,
+)
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+def _control(reloj: Reloj, usuario=(3, 1), ruta=(100, 100), concurrencia=10) -> ControlAdmision:
+    return ControlAdmision(
+        BackendMemoria(reloj),
+        limites_usuario={READ: usuario},
+        limites_ruta={READ: ruta},
+        concurrencia={READ: concurrencia},
+    )
+
+
+async def _admitir(control: ControlAdmision, usuario: str, ruta: str = "/api/user/catalogo") -> None:
+    async with control.admitir(READ, ruta, usuario):
+        pass
+
+
+def test_cubeta_vacia_y_se_rellena_con_el_reloj():
+    reloj = Reloj()
+    backend = BackendMemoria(reloj)
+
+    async def escenario():
+        assert [await backend.consumir("c", 3, 1) for _ in range(3)] == [0, 0, 0]
+        assert await backend.consumir("c", 3, 1) == pytest.approx(1.0)
+        reloj.ahora += 0.5
+        assert await backend.consumir("c", 3, 1) == pytest.approx(0.5)
+        reloj.ahora += 0.5
+        assert await backend.consumir("c", 3, 1) == 0
+        # Tras mucho tiempo la cubeta no pasa de su capacidad.
+        reloj.ahora += 60
+        assert [await backend.consumir("c", 3, 1) for _ in range(4)][-1] == pytest.approx(1.0)
+
+    asyncio.run(escenario())
+
+
+def test_limite_por_usuario_con_retry_after():
+    reloj = Reloj()
+    control = _control(reloj)
+
+    async def escenario():
+        for _ in range(3):
+            await _admitir(control, "id:1")
+        with pytest.raises(PeticionRechazada) as e:
+            await _admitir(control, "id:1")
+        assert (e.value.status_code, e.value.reintentar_en) == (429, 1)
+        # Otro usuario tiene su propia cubeta.
+        await _admitir(control, "id:2")
+        reloj.ahora += 1
+        await _admitir(control, "id:1")
+
+    asyncio.run(escenario())
+    assert control.rechazos == {"429": 1, "503": 0}
+
+
+def test_limite_por_ruta_comparte_cubeta_entre_ids():
+    reloj = Reloj()
+    control = _control(reloj, usuario=(100, 100), ruta=(2, 1))
+
+    async def escenario():
+        await _admitir(control, "id:1", "/api/admin/consultar_libro/1")
+        await _admitir(control, "id:2", "/api/admin/consultar_libro/2")
+        with pytest.raises(PeticionRechazada) as e:
+            await _admitir(control, "id:3", "/api/admin/consultar_libro/3")
+        assert e.value.status_code == 503
+
+    asyncio.run(escenario())
+
+
+def test_concurrencia_por_clase():
+    control = _control(Reloj(), concurrencia=1)
+
+    async def escenario():
+        async with control.admitir(READ, "/api/user/catalogo", "id:1"):
+            with pytest.raises(PeticionRechazada) as e:
+                await _admitir(control, "id:2")
+            assert e.value.status_code == 503
+        await _admitir(control, "id:2")
+
+    asyncio.run(escenario())
+    assert control.estado()["en_curso"] == {READ: 0}
+
+
+def test_identidad_de_la_sesion_o_del_cliente():
+    assert identidad_peticion(7, "10.0.0.1") == "id:7"
+    assert identidad_peticion(None, "10.0.0.1") == "ip:10.0.0.1"
+    assert identidad_peticion(None, None) == "ip:anonimo"
+    # Un id de usuario y una dirección nunca comparten cubeta.
+    assert identidad_peticion(1, None) != identidad_peticion(None, "1")
+
+
+@pytest.mark.parametrize("metodo, ruta, clase", [
+    ("GET", "/api/user/catalogo", READ),
+    ("POST", "/api/user/buscar_libro", SEARCH),
+    ("POST", "/api/review/subir_review/3", WRITE),
+    ("GET", "/api/admin/trabajos", ADMIN),
+    ("GET", "/login", None),
+])
+def test_clasificar_ruta(metodo, ruta, clase):
+    assert clasificar_ruta(metodo, ruta) == clase
@@ -0,0 +1,87 @@
+"""
+`IndicePrefijos` (`app/autocompletar.py`) tras altas, bajas y reviews debe sugerir lo mismo que recorrer todos los
+libros vivos: la lista de recientes, las versiones retiradas y los rankings memorizados no cambian el resultado.
+"""
+import random
+
+import pytest
+
+pytest.importorskip("sqlmodel")
+
+from app.autocompletar import CAMPOS_AUTOCOMPLETAR, IndicePrefijos, _claves, normalizar
+
+AUTORES = ["Gabriel García Márquez", "Isabel Allende", "Julio Cortázar", "Jorge Luis Borges", "Juan Rulfo"]
+PALABRAS = ["amor", "casa", "cien", "ciudad", "cronica", "de", "el", "la", "los", "sombra", "soledad", "tiempo"]
+PREFIJOS = ["ca", "ci", "de", "el", "la", "lo", "so", "ga", "ju", "jo", "is", "de la", "cien a", "sombra d"]
+
+
+def _orden(prefijo, sugerencia):
+    campo, valor, puntaje = sugerencia
+    return puntaje, normalizar(valor).startswith(prefijo), -len(valor)
+
+
+def _referencia(libros, popularidad, prefijo):
+    prefijo = normalizar(prefijo)
+    vistos = {}
+    for id_libro in sorted(libros):
+        for campo, valor in zip(CAMPOS_AUTOCOMPLETAR, libros[id_libro]):
+            if any(clave.startswith(prefijo) for clave in _claves(valor)):
+                vistos[(campo, valor)] = vistos.get((campo, valor), 0) + popularidad.get(id_libro, 0)
+    return sorted(((c, v, p) for (c, v), p in vistos.items()), key=lambda s: _orden(prefijo, s), reverse=True)
+
+
+def _sin_ids(sugerencias):
+    return [(s["campo"], s["valor"], s["popularidad"]) for s in sugerencias]
+
+
+def _mismo_top(prefijo, obtenidas, todas, limite):
+    # Entre sugerencias empatadas en todo el criterio el orden es libre; fuera del último empate, no.
+    prefijo = normalizar(prefijo)
+    esperadas = todas[:limite]
+    assert [_orden(prefijo, s) for s in obtenidas] == [_orden(prefijo, s) for s in esperadas]
+    if esperadas:
+        corte = _orden(prefijo, esperadas[-1])
+        assert {s for s in obtenidas if _orden(prefijo, s) > corte} == {s for s in esperadas if _orden(prefijo, s) > corte}
+        assert set(obtenidas) <= set(todas)
+
+
+def _libro(azar: random.Random):
+    return " ".join(azar.choice(PALABRAS) for _ in range(azar.randint(1, 4))).capitalize(), azar.choice(AUTORES)
+
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_mismo_ranking_que_fuerza_bruta_tras_cambios(monkeypatch, semilla):
+    # Umbrales bajos para ejercitar fusiones y rankings memorizados con pocos libros.
+    monkeypatch.setattr(IndicePrefijos, "MAX_RECIENTES", 8)
+    monkeypatch.setattr(IndicePrefijos, "RANGO_MEMORIZADO", 3)
+    azar = random.Random(semilla)
+    libros = {i: _libro(azar) for i in range(1, 60)}
+    popularidad = {i: azar.randint(0, 5) for i in libros}
+    indice = IndicePrefijos()
+    indice.cargar(
+        [{"id_libro": i, "titulo": t, "autor": a} for i, (t, a) in libros.items()], popularidad
+    )
+
+    for paso in range(300):
+        accion = azar.random()
+        id_libro = azar.randint(1, 80)
+        if accion < 0.3:
+            libros[id_libro] = _libro(azar)
+            indice.agregar(id_libro, *libros[id_libro])
+        elif accion < 0.5:
+            libros.pop(id_libro, None)
+            indice.quitar(id_libro)
+        elif accion < 0.7 and id_libro in libros:
+            popularidad[id_libro] = popularidad.get(id_libro, 0) + 1
+            indice.sumar_popularidad(id_libro)
+        prefijo, limite = azar.choice(PREFIJOS), azar.choice([1, 5, 10, 20])
+        _mismo_top(prefijo, _sin_ids(indice.sugerir(prefijo, limite)), _referencia(libros, popularidad, prefijo), limite)
+
+    assert len(indice) == sum(len(_claves(v)) for t, a in libros.values() for v in (t, a))
+
+
+def test_prefijo_corto_no_sugiere():
+    indice = IndicePrefijos()
+    indice.cargar([{"id_libro": 1, "titulo": "Rayuela", "autor": "Julio Cortázar"}], {})
+    assert indice.sugerir("r") == []
+    assert _sin_ids(indice.sugerir("ray")) == [("titulo", "Rayuela", 0)]
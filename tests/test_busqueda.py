@@ -0,0 +1,98 @@
+"""
+El índice de trigramas en memoria (`app/busqueda.py`) debe elegir el mismo libro que `similarity()` de pg_trgm.
+
+La referencia es una búsqueda por fuerza bruta con `similitud` sobre todo el corpus, con las mismas reglas que
+las consultas de `design_patterns.py`: similitud mayor que el umbral y, a igual similitud, el id más bajo.
+"""
+import pytest
+
+pytest.importorskip("sqlmodel")
+
+from app.busqueda import UMBRAL_SIMILITUD, IndiceTrigramas, _IndiceCampo, similitud, trigramas
+
+CORPUS = {
+    1: ("Cien años de soledad", "Gabriel García Márquez", "Realismo mágico", 1967),
+    2: ("Don Quijote de la Mancha", "Miguel de Cervantes", "Novela", 1605),
+    3: ("El amor en los tiempos del cólera", "Gabriel García Márquez", "Novela", 1985),
+    4: ("La sombra del viento", "Carlos Ruiz Zafón", "Misterio", 2001),
+    5: ("Rayuela", "Julio Cortázar", "Novela", 1963),
+    6: ("Pedro Páramo", "Juan Rulfo", "Realismo mágico", 1955),
+    7: ("La casa de los espíritus", "Isabel Allende", "Realismo mágico", 1982),
+    8: ("Ficciones", "Jorge Luis Borges", "Cuento", 1944),
+    9: ("El túnel", "Ernesto Sabato", "Novela", 1948),
+    10: ("Crónica de una muerte anunciada", "Gabriel García Márquez", "Novela", 1981),
+    11: ("Los detectives salvajes", "Roberto Bolaño", "Novela", 1998),
+    12: ("La ciudad y los perros", "Mario Vargas Llosa", "Novela", 1963),
+}
+CONSULTAS = [
+    "soledad", "quijote", "garcia marquez", "gabriel", "novela", "realismo", "la casa", "el", "borjes",
+    "cortazar", "bolano", "vargas", "cronica muerte", "perros ciudad", "zzz", "", "1963",
+]
+
+
+def _referencia(campo: int, consulta: str):
+    mejor_id, mejor_sim = None, UMBRAL_SIMILITUD
+    for id_libro in sorted(CORPUS):
+        sim = similitud(CORPUS[id_libro][campo], consulta)
+        if sim > mejor_sim:
+            mejor_id, mejor_sim = id_libro, sim
+    return mejor_id
+
+
+def _indice() -> IndiceTrigramas:
+    indice = IndiceTrigramas()
+    indice.cargar(
+        {"id_libro": i, "titulo": t, "autor": a, "categoria": c, "anio_publicacion": y}
+        for i, (t, a, c, y) in CORPUS.items()
+    )
+    return indice
+
+
+def test_trigramas_como_pg_trgm():
+    # SELECT show_trgm('word'): {"  w"," wo","ord","rd ","wor"}
+    assert trigramas("word") == {"  w", " wo", "wor", "ord", "rd "}
+    assert trigramas("Cat, cat!") == {"  c", " ca", "cat", "at "}
+    assert trigramas("a_b") == {"  a", " a ", "  b", " b "}
+    assert trigramas("") == frozenset()
+
+
+def test_similitud_como_pg_trgm():
+    # SELECT similarity('word', 'words'): 4 comunes / (5 + 6 - 4) = 0.571429
+    assert similitud("word", "words") == pytest.approx(4 / 7)
+    assert similitud("Rayuela", "rayuela") == 1.0
+    assert similitud("", "algo") == 0.0
+    assert similitud("abc", "xyz") == 0.0
+
+
+@pytest.mark.parametrize("consulta", CONSULTAS)
+@pytest.mark.parametrize("campo", ["titulo", "autor", "categoria"])
+def test_mismo_resultado_que_fuerza_bruta(campo, consulta):
+    posicion = ("titulo", "autor", "categoria").index(campo)
+    assert _indice().mejor_por_campo(campo, consulta) == _referencia(posicion, consulta)
+
+
+def test_quitar_y_volver_a_agregar_mantiene_la_paridad(monkeypatch):
+    # Con un umbral bajo de compactación también se ejercita la limpieza de entradas muertas.
+    monkeypatch.setattr(_IndiceCampo, "COMPACTAR_DESDE", 1)
+    indice = _indice()
+    for id_libro in (3, 10):
+        indice.quitar(id_libro)
+    titulo, autor, categoria, anio = CORPUS[1]
+    indice.agregar(1, "Otro título", autor, categoria, anio)
+    indice.agregar(1, titulo, autor, categoria, anio)
+
+    assert len(indice) == len(CORPUS) - 2
+    assert indice.mejor_por_campo("titulo", "cronica muerte") is None
+    assert indice.mejor_por_campo("titulo", "soledad") == 1
+    assert indice.mejor_por_campo("autor", "garcia marquez") == 1
+
+
+def test_primero_por_anio_tras_bajas():
+    indice = _indice()
+    assert indice.primero_por_anio(1963) == 5
+    indice.quitar(5)
+    assert indice.primero_por_anio(1963) == 12
+    indice.quitar(12)
+    assert indice.primero_por_anio(1963) is None
+    indice.agregar(5, *CORPUS[5])
+    assert indice.primero_por_anio(1963) == 5
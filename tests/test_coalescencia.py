@@ -0,0 +1,149 @@
+"""
+`UnSoloVuelo` (`app/coalescencia.py`): llamadas simultáneas con la misma clave y el mismo motor comparten una
+consulta; los errores y los límites de tiempo llegan a todos los que esperaban, y las lecturas pegajosas no se
+agrupan nunca.
+"""
+import asyncio
+
+import pytest
+
+from app.coalescencia import EsperaAgotada, UnSoloVuelo
+
+
+class Sesion:
+    def __init__(self, bind):
+        self.bind = bind
+
+
+PRIMARIO, REPLICA = Sesion("primario"), Sesion("replica")
+
+
+def _vuelo(pegajosa: bool = False, **kwargs) -> UnSoloVuelo:
+    return UnSoloVuelo("prueba", sin_agrupar=lambda: pegajosa, **kwargs)
+
+
+def _consulta(liberar: asyncio.Event, llamadas: list, resultado="libro"):
+    async def consulta():
+        llamadas.append(resultado)
+        await liberar.wait()
+        return resultado
+    return consulta
+
+
+def test_llamadas_simultaneas_comparten_una_consulta():
+    vuelo = _vuelo()
+
+    async def escenario():
+        liberar, llamadas = asyncio.Event(), []
+        tareas = [asyncio.create_task(vuelo.hacer(1, _consulta(liberar, llamadas), PRIMARIO)) for _ in range(10)]
+        await asyncio.sleep(0)
+        liberar.set()
+        return await asyncio.gather(*tareas), llamadas
+
+    resultados, llamadas = asyncio.run(escenario())
+    assert resultados == ["libro"] * 10
+    assert llamadas == ["libro"]
+    assert vuelo.metricas() == {"en_vuelo": 0, "consultas": 1, "agrupadas": 9, "directas": 0}
+
+
+def test_claves_y_motores_distintos_no_se_agrupan():
+    vuelo = _vuelo()
+
+    async def escenario():
+        liberar, llamadas = asyncio.Event(), []
+        tareas = [
+            asyncio.create_task(vuelo.hacer(1, _consulta(liberar, llamadas, "p1"), PRIMARIO)),
+            asyncio.create_task(vuelo.hacer(1, _consulta(liberar, llamadas, "r1"), REPLICA)),
+            asyncio.create_task(vuelo.hacer(2, _consulta(liberar, llamadas, "p2"), PRIMARIO)),
+        ]
+        await asyncio.sleep(0)
+        liberar.set()
+        return await asyncio.gather(*tareas)
+
+    assert asyncio.run(escenario()) == ["p1", "r1", "p2"]
+    assert vuelo.consultas == 3 and vuelo.agrupadas == 0
+
+
+def test_lectura_pegajosa_consulta_por_su_cuenta():
+    vuelo = _vuelo(pegajosa=True)
+
+    async def escenario():
+        liberar, llamadas = asyncio.Event(), []
+        tareas = [asyncio.create_task(vuelo.hacer(1, _consulta(liberar, llamadas), PRIMARIO)) for _ in range(3)]
+        await asyncio.sleep(0)
+        liberar.set()
+        await asyncio.gather(*tareas)
+        return llamadas
+
+    assert len(asyncio.run(escenario())) == 3
+    assert vuelo.metricas()["directas"] == 3
+
+
+def test_el_error_llega_a_todos_y_libera_la_clave():
+    vuelo = _vuelo()
+
+    async def escenario():
+        liberar = asyncio.Event()
+
+        async def falla():
+            await liberar.wait()
+            raise RuntimeError("BD caída")
+
+        tareas = [asyncio.create_task(vuelo.hacer(1, falla, PRIMARIO)) for _ in range(3)]
+        await asyncio.sleep(0)
+        liberar.set()
+        errores = await asyncio.gather(*tareas, return_exceptions=True)
+        # Con la clave libre, la siguiente llamada vuelve a consultar.
+        return errores, await vuelo.hacer(1, _consulta(liberar, []), PRIMARIO)
+
+    errores, despues = asyncio.run(escenario())
+    assert [str(e) for e in errores] == ["BD caída"] * 3
+    assert all(isinstance(e, RuntimeError) for e in errores)
+    assert despues == "libro"
+
+
+def test_la_consulta_del_lider_esta_acotada():
+    vuelo = _vuelo(consulta_max_s=0.05, espera_max_s=5)
+
+    async def escenario():
+        bloqueada = asyncio.Event()
+        tareas = [asyncio.create_task(vuelo.hacer(1, _consulta(bloqueada, []), PRIMARIO)) for _ in range(3)]
+        return await asyncio.gather(*tareas, return_exceptions=True)
+
+    errores = asyncio.run(escenario())
+    assert all(isinstance(e, EsperaAgotada) for e in errores)
+    assert vuelo.metricas()["en_vuelo"] == 0
+
+
+def test_espera_agotada_no_cancela_la_consulta_del_lider():
+    vuelo = _vuelo(espera_max_s=0.01)
+
+    async def escenario():
+        liberar = asyncio.Event()
+        lider = asyncio.create_task(vuelo.hacer(1, _consulta(liberar, []), PRIMARIO))
+        await asyncio.sleep(0)
+        with pytest.raises(EsperaAgotada):
+            await vuelo.hacer(1, _consulta(liberar, []), PRIMARIO)
+        liberar.set()
+        return await lider
+
+    assert asyncio.run(escenario()) == "libro"
+
+
+def test_si_cancelan_al_lider_el_que_espera_consulta_solo():
+    vuelo = _vuelo()
+
+    async def escenario():
+        bloqueada, llamadas = asyncio.Event(), []
+        lider = asyncio.create_task(vuelo.hacer(1, _consulta(bloqueada, llamadas, "lider"), PRIMARIO))
+        await asyncio.sleep(0)
+
+        async def rapida():
+            return "propia"
+
+        seguidor = asyncio.create_task(vuelo.hacer(1, rapida, PRIMARIO))
+        await asyncio.sleep(0)
+        lider.cancel()
+        return await seguidor
+
+    assert asyncio.run(escenario()) == "propia"
@@ -0,0 +1,28 @@
+"""
+Las consultas calientes deben usar índices (EXPLAIN con `enable_seqscan = off`, ver `benchmarks/explicar_consultas.py`).
+
+Necesita una BD de pruebas sembrada: `python -m benchmarks.bench_api seed --database-url ...` y
+BENCH_DATABASE_URL apuntando a ella. Sin esa variable, o si la BD no responde, la prueba se omite.
+"""
+import asyncio
+import os
+
+import pytest
+
+URL = os.getenv("BENCH_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not URL, reason="BENCH_DATABASE_URL no está definida: no hay BD de pruebas.")
+
+
+def test_consultas_calientes_usan_indices():
+    pytest.importorskip("sqlalchemy")
+    from sqlalchemy.exc import InterfaceError, OperationalError
+    from benchmarks.explicar_consultas import analizar
+
+    try:
+        resultados = asyncio.run(analizar(URL))
+    except (OperationalError, InterfaceError, OSError) as e:
+        pytest.skip(f"La BD de pruebas no responde: {e}")
+
+    sin_indice = {nombre: recorridas for nombre, recorridas, _ in resultados if recorridas}
+    assert not sin_indice, f"Consultas con Seq Scan: {sin_indice}"
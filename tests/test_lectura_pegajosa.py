@@ -0,0 +1,68 @@
+"""
+Marca de la última escritura (`database/connection_db.py`): la cookie que la trae se interpreta sin confiar en ella
+y `lectura_pegajosa` solo manda al primario durante `LECTURA_PEGAJOSA_S` tras una escritura.
+
+Importar el módulo crea el motor (sin conectarse), así que hace falta el stack de la BD y una `DATABASE_URL`.
+"""
+import os
+import time
+
+import pytest
+
+pytest.importorskip("sqlmodel")
+pytest.importorskip("asyncpg")
+pytest.importorskip("dotenv")
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://pruebas@localhost/pruebas")
+
+from database.connection_db import LECTURA_PEGAJOSA_S, MarcaEscritura, lectura_pegajosa, marca_peticion, marcar_escritura
+
+
+@pytest.fixture
+def marca():
+    def fijar(valor):
+        nueva = MarcaEscritura.desde_cookie(valor)
+        token = marca_peticion.set(nueva)
+        tokens.append(token)
+        return nueva
+
+    tokens = []
+    yield fijar
+    for token in reversed(tokens):
+        marca_peticion.reset(token)
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    (None, None), ("", None), ("abc", None), ("1700000000.5", 1700000000.5), ("12", 12.0),
+])
+def test_desde_cookie(valor, esperado):
+    nueva = MarcaEscritura.desde_cookie(valor)
+    assert nueva.en == esperado
+    assert not nueva.renovada
+
+
+def test_fuera_de_una_peticion_no_es_pegajosa():
+    assert marca_peticion.get() is None
+    assert not lectura_pegajosa()
+    # Sin marca de la petición no hay a quién avisar: no falla.
+    marcar_escritura()
+
+
+def test_pegajosa_solo_dentro_de_la_ventana(marca):
+    ahora = time.time()
+    marca(None)
+    assert not lectura_pegajosa()
+    marca(str(ahora - LECTURA_PEGAJOSA_S / 2))
+    assert lectura_pegajosa()
+    marca(str(ahora - LECTURA_PEGAJOSA_S - 1))
+    assert not lectura_pegajosa()
+    # Una marca del futuro es una cookie alterada: no cuenta.
+    marca(str(ahora + 60))
+    assert not lectura_pegajosa()
+
+
+def test_escribir_renueva_la_marca(marca):
+    actual = marca("basura")
+    marcar_escritura()
+    assert actual.renovada
+    assert abs(actual.en - time.time()) < 1
+    assert lectura_pegajosa()
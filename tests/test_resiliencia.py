@@ -0,0 +1,207 @@
+"""
+`CircuitoBD` y `AlmacenLecturas` (`app/resiliencia.py`) con relojes inyectados: las transiciones del circuito y la
+vigencia de cada lectura guardada dependen solo del tiempo que la prueba hace avanzar.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.resiliencia import ABIERTO, CERRADO, SEMIABIERTO, AlmacenLecturas, CircuitoAbierto, CircuitoBD
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 100.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+def _circuito(reloj: Reloj, **kwargs) -> CircuitoBD:
+    opciones = dict(ventana_s=10, min_muestras=4, umbral_errores=0.5, latencia_lenta_s=1.0, umbral_lentas=0.5,
+                    enfriamiento_s=5, exitos_para_cerrar=2, reloj=reloj)
+    opciones.update(kwargs)
+    return CircuitoBD(**opciones)
+
+
+# --- CircuitoBD ---
+
+def test_no_abre_con_pocas_muestras():
+    circuito = _circuito(Reloj())
+    for _ in range(3):
+        circuito.registrar(False, 0.01)
+    assert circuito.estado == CERRADO
+    circuito.verificar()
+
+
+def test_abre_por_errores_y_pide_esperar_el_enfriamiento():
+    reloj = Reloj()
+    circuito = _circuito(reloj)
+    for exito in (True, False, True, False):
+        circuito.registrar(exito, 0.01)
+    assert circuito.estado == ABIERTO
+    reloj.ahora += 1.5
+    with pytest.raises(CircuitoAbierto) as e:
+        circuito.verificar()
+    assert e.value.reintentar_en == 4
+
+
+def test_abre_por_consultas_lentas():
+    circuito = _circuito(Reloj())
+    for duracion in (0.1, 2.0, 0.1, 3.0):
+        circuito.registrar(True, duracion)
+    assert circuito.estado == ABIERTO
+
+
+def test_las_muestras_viejas_salen_de_la_ventana():
+    reloj = Reloj()
+    circuito = _circuito(reloj)
+    circuito.registrar(False, 0.01)
+    circuito.registrar(False, 0.01)
+    reloj.ahora += 11
+    for _ in range(3):
+        circuito.registrar(True, 0.01)
+    circuito.registrar(False, 0.01)
+    # Con los dos errores vencidos quedan 1 de 4: por debajo del umbral.
+    assert circuito.estado == CERRADO
+
+
+def test_semiabierto_cierra_tras_exitos_o_reabre_con_un_fallo():
+    reloj = Reloj()
+    circuito = _circuito(reloj)
+    for _ in range(4):
+        circuito.registrar(False, 0.01)
+    reloj.ahora += 5
+    assert not circuito.abierto()
+    assert circuito.estado == SEMIABIERTO
+    circuito.registrar(False, 0.01)
+    assert circuito.estado == ABIERTO
+
+    reloj.ahora += 5
+    circuito.abierto()
+    circuito.registrar(True, 0.01)
+    circuito.registrar(True, 0.01)
+    assert circuito.estado == CERRADO
+    assert circuito.transiciones == {
+        (CERRADO, ABIERTO): 1, (ABIERTO, SEMIABIERTO): 2, (SEMIABIERTO, ABIERTO): 1, (SEMIABIERTO, CERRADO): 1,
+    }
+
+
+# --- AlmacenLecturas ---
+
+class Consulta:
+    def __init__(self):
+        self.valor = 0
+        self.llamadas = 0
+
+    async def __call__(self, session):
+        self.llamadas += 1
+        self.valor += 1
+        return self.valor
+
+
+@asynccontextmanager
+async def _sesion():
+    yield None
+
+
+def _almacen(reloj: Reloj, circuito=None, pegajosa=False, **kwargs) -> AlmacenLecturas:
+    return AlmacenLecturas(
+        circuito or _circuito(reloj), fabrica_sesiones=_sesion, fresco_s=5, max_obsoleto_s=60,
+        reloj=reloj, directa=lambda: pegajosa, **kwargs,
+    )
+
+
+def test_fresco_no_consulta_y_obsoleto_se_refresca_en_segundo_plano():
+    reloj = Reloj()
+    almacen, consulta = _almacen(reloj), Consulta()
+
+    async def escenario():
+        assert await almacen.servir("k", consulta, None) == 1
+        reloj.ahora += 4
+        assert await almacen.servir("k", consulta, None) == 1
+        reloj.ahora += 2
+        # Obsoleto: se sirve el valor anterior y el nuevo llega con el refresco.
+        assert await almacen.servir("k", consulta, None) == 1
+        await asyncio.sleep(0)
+        return await almacen.servir("k", consulta, None)
+
+    assert asyncio.run(escenario()) == 2
+    assert consulta.llamadas == 2
+    assert almacen.resultados == {"fresco": 2, "obsoleto": 1, "consulta": 1, "sin_datos": 0}
+
+
+def test_circuito_abierto_sirve_lo_guardado_o_rechaza():
+    reloj = Reloj()
+    circuito = _circuito(reloj, enfriamiento_s=60)
+    almacen, consulta = _almacen(reloj, circuito), Consulta()
+
+    async def escenario():
+        await almacen.servir("k", consulta, None)
+        for _ in range(4):
+            circuito.registrar(False, 0.01)
+        # Obsoleto y con el circuito abierto: se sirve sin intentar refrescarlo.
+        reloj.ahora += 30
+        assert await almacen.servir("k", consulta, None) == 1
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitoAbierto):
+            await almacen.servir("otra", consulta, None)
+
+    asyncio.run(escenario())
+    assert consulta.llamadas == 1
+    assert almacen.resultados["sin_datos"] == 1
+
+
+def test_demasiado_viejo_vuelve_a_consultar():
+    reloj = Reloj()
+    almacen, consulta = _almacen(reloj), Consulta()
+
+    async def escenario():
+        await almacen.servir("k", consulta, None)
+        reloj.ahora += 61
+        return await almacen.servir("k", consulta, None)
+
+    assert asyncio.run(escenario()) == 2
+
+
+def test_capacidad_descarta_lo_menos_usado():
+    reloj = Reloj()
+    almacen = _almacen(reloj, capacidad=2)
+    almacen.guardar("a", 1)
+    almacen.guardar("b", 2)
+    asyncio.run(almacen.servir("a", Consulta(), None))
+    almacen.guardar("c", 3)
+    assert len(almacen) == 2
+    assert set(almacen._datos) == {"a", "c"}
+
+
+def test_invalidar_arrastra_las_entradas_que_dependen():
+    reloj = Reloj()
+    almacen = _almacen(reloj)
+
+    async def escenario():
+        await almacen.servir(("busqueda", "soledad"), Consulta(), None, lambda _: [("libro", 1)])
+        await almacen.servir(("busqueda", "otra"), Consulta(), None, lambda _: [("libro", 2)])
+        almacen.guardar(("libro", 1), "libro")
+
+    asyncio.run(escenario())
+    almacen.invalidar(("libro", 1))
+    assert set(almacen._datos) == {("busqueda", "otra")}
+    assert almacen._dependientes == {("libro", 2): {("busqueda", "otra")}}
+
+
+def test_lectura_pegajosa_consulta_salvo_con_el_circuito_abierto():
+    reloj = Reloj()
+    circuito = _circuito(reloj)
+    almacen, consulta = _almacen(reloj, circuito, pegajosa=True), Consulta()
+
+    async def escenario():
+        assert await almacen.servir("k", consulta, None) == 1
+        assert await almacen.servir("k", consulta, None) == 2
+        for _ in range(4):
+            circuito.registrar(False, 0.01)
+        return await almacen.servir("k", consulta, None)
+
+    assert asyncio.run(escenario()) == 2
+    assert consulta.llamadas == 2
@@ -0,0 +1,53 @@
+"""
+Cookie de sesión firmada (`app/sesion.py`): cualquier worker reconstruye al usuario sin BD y sin memoria
+compartida, y una cookie alterada, ajena o vencida no abre sesión.
+"""
+import pytest
+
+pytest.importorskip("sqlmodel")
+
+from app import sesion
+from app.sesion import SESION_DURACION_S, SesionPeticion, emitir, leer
+from app.usuario import Usuario
+
+
+def _usuario() -> Usuario:
+    return Usuario(id_usuario=7, rol=2, username="ana", email_usuario="ana@ejemplo.com", password="secreta", mes_suscripcion=3)
+
+
+def test_ida_y_vuelta_sin_contrasena():
+    usuario = leer(emitir(_usuario()))
+    assert usuario.como_dict() == {**_usuario().como_dict(), "password": ""}
+    assert "secreta" not in emitir(_usuario())
+
+
+def test_alterada_o_ajena_no_vale(monkeypatch):
+    cookie = emitir(_usuario())
+    carga, firma = cookie.rsplit(".", 1)
+    assert leer(carga + "x." + firma) is None
+    assert leer(carga) is None
+    assert leer("") is None
+    monkeypatch.setattr(sesion, "SECRETO", b"otro secreto")
+    assert leer(cookie) is None
+
+
+def test_vence():
+    cookie = emitir(_usuario(), ahora=1000)
+    assert leer(cookie, ahora=1000 + SESION_DURACION_S - 1) is not None
+    assert leer(cookie, ahora=1000 + SESION_DURACION_S + 1) is None
+
+
+def test_cambio_detecta_inicio_cambio_y_cierre():
+    vacia = SesionPeticion()
+    assert not vacia.cambio()
+    vacia.usuario = _usuario()
+    assert vacia.cambio()
+
+    activa = SesionPeticion.desde_cookie(emitir(_usuario()))
+    assert not activa.cambio()
+    activa.usuario.username = "ana2"
+    assert activa.cambio()
+
+    cerrada = SesionPeticion.desde_cookie(emitir(_usuario()))
+    cerrada.usuario = None
+    assert cerrada.cambio()